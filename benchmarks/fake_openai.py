@@ -0,0 +1,377 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Serves ``POST /v1/chat/completions`` (plain and ``stream: true``) with a
+configurable latency distribution, server error rate and 429 injection, so
+throughput and latency of the service can be measured without paying for
+real calls. Point workers at it with ``OPENAI_BASE_URL=http://host:8100/v1``.
+
+The batch API is stood in for too (file upload and content, batch create
+and retrieve). A batch reports completed ``--batch-delay`` seconds after it
+was created; each of its requests fails with the configured error rate.
+    
+    python benchmarks/fake_openai.py --port 8100 --latency-ms 800 --rate-limit-rate 0.02
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import math
+import random
+import ssl
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+@dataclass
+class FakeOpenAIConfig:
+    """Behaviour of the fake API."""
+    
+    # Median response latency and lognormal spread (0 = constant latency)
+    latency_ms: float = 500.0
+    latency_sigma: float = 0.5
+    # Fraction of requests answered with 500 and with 429
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_ms: int = 1000
+    # Delay between streamed chunks
+    stream_chunk_ms: float = 20.0
+    # Seconds until a created batch reports completed
+    batch_delay_s: float = 0.0
+    seed: Optional[int] = None
+
+
+def sample_latency(config: FakeOpenAIConfig, rng: random.Random) -> float:
+    """Draw one response latency in seconds."""
+    if config.latency_sigma <= 0:
+        return config.latency_ms / 1000
+    return rng.lognormvariate(math.log(max(config.latency_ms, 0.001)), config.latency_sigma) / 1000
+
+
+SUMMARY = (
+    "The guideline sets out who it applies to, the required procedures, "
+    "the documentation to keep and the escalation path for exceptions."
+)
+CHECKLIST = [
+    {"item": f"Step {i + 1}", "description": f"Carry out requirement {i + 1} of the guideline."}
+    for i in range(5)
+]
+
+
+def fake_content(request: dict) -> str:
+    """Return a plausible completion for the service's prompts."""
+    if request.get('response_format'):
+        return json.dumps({'summary': SUMMARY, 'checklist': CHECKLIST})
+    messages = request.get('messages', [])
+    system = ' '.join(m.get('content', '') for m in messages if m.get('role') == 'system')
+    if 'checklist' in system:
+        return json.dumps(CHECKLIST)
+    return SUMMARY
+
+
+def completion_body(request: dict, content: str) -> dict:
+    prompt_chars = sum(len(m.get('content') or '') for m in request.get('messages', []))
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(content) // 4
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'gpt-3.5-turbo'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop',
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def stream_chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> bytes:
+    chunk = {
+        'id': completion_id,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode('utf-8')
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """HTTP server holding the fake API's configuration and counters."""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, config: FakeOpenAIConfig):
+        super().__init__(address, FakeOpenAIHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'batches': 0}
+        self.files = {}
+        self.batches = {}
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        scheme = 'https' if isinstance(self.socket, ssl.SSLSocket) else 'http'
+        return f'{scheme}://{host}:{port}/v1'
+    
+    def draw(self):
+        """Return (outcome, latency) for the next request."""
+        with self.lock:
+            self.counts['requests'] += 1
+            roll = self.rng.random()
+            latency = sample_latency(self.config, self.rng)
+            if roll < self.config.rate_limit_rate:
+                self.counts['rate_limited'] += 1
+                return 'rate_limited', 0.0
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                self.counts['errors'] += 1
+                return 'error', latency
+            return 'ok', latency
+    
+    def store_file(self, filename: str, data: bytes, purpose: str) -> dict:
+        file = {
+            'id': f'file-{uuid.uuid4().hex}',
+            'object': 'file',
+            'bytes': len(data),
+            'created_at': int(time.time()),
+            'filename': filename,
+            'purpose': purpose,
+            'status': 'processed',
+        }
+        with self.lock:
+            self.files[file['id']] = (file, data)
+        return file
+    
+    def run_batch(self, request: dict) -> dict:
+        """Answer every request in a batch input file and store the output file."""
+        _, data = self.files[request['input_file_id']]
+        output = []
+        failed = 0
+        for line in data.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            with self.lock:
+                error = self.rng.random() < self.config.error_rate
+            if error:
+                failed += 1
+                response = {'status_code': 500, 'body': {'error': {'message': 'Injected server error'}}}
+            else:
+                body = item['body']
+                response = {'status_code': 200, 'body': completion_body(body, fake_content(body))}
+            output.append(json.dumps({
+                'id': f'batch_req_{uuid.uuid4().hex}',
+                'custom_id': item['custom_id'],
+                'response': response,
+                'error': None,
+            }))
+        output_file = self.store_file('batch_output.jsonl', ('\n'.join(output) + '\n').encode('utf-8'), 'batch_output')
+        
+        now = int(time.time())
+        batch = {
+            'id': f'batch_{uuid.uuid4().hex}',
+            'object': 'batch',
+            'endpoint': request['endpoint'],
+            'input_file_id': request['input_file_id'],
+            'completion_window': request.get('completion_window', '24h'),
+            'status': 'in_progress',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': now,
+            'metadata': request.get('metadata'),
+            'request_counts': {'total': len(output), 'completed': len(output) - failed, 'failed': failed},
+        }
+        with self.lock:
+            self.counts['batches'] += 1
+            self.batches[batch['id']] = (batch, output_file['id'], time.monotonic() + self.config.batch_delay_s)
+        return self.batch_state(batch['id'])
+    
+    def batch_state(self, batch_id: str) -> Optional[dict]:
+        with self.lock:
+            if batch_id not in self.batches:
+                return None
+            batch, output_file_id, ready_at = self.batches[batch_id]
+        batch = dict(batch)
+        if time.monotonic() >= ready_at:
+            batch.update(status='completed', output_file_id=output_file_id, completed_at=int(time.time()))
+        return batch
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; with Nagle on, a reused
+    # connection holds the body back until the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, body: dict, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _not_found(self):
+        self._send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+    
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if parts[:2] == ['v1', 'batches'] and len(parts) == 3:
+            batch = self.server.batch_state(parts[2])
+            if batch is None:
+                return self._not_found()
+            self._send_json(200, batch)
+        elif parts[:2] == ['v1', 'files'] and len(parts) == 4 and parts[3] == 'content':
+            if parts[2] not in self.server.files:
+                return self._not_found()
+            _, data = self.server.files[parts[2]]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._not_found()
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        path = self.path.rstrip('/')
+        if path == '/v1/files':
+            return self._upload(raw)
+        
+        try:
+            request = json.loads(raw or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON', 'type': 'invalid_request_error'}})
+            return
+        
+        if path == '/v1/batches':
+            if request.get('input_file_id') not in self.server.files:
+                return self._not_found()
+            return self._send_json(200, self.server.run_batch(request))
+        if path != '/v1/chat/completions':
+            return self._not_found()
+        
+        outcome, latency = self.server.draw()
+        if outcome == 'rate_limited':
+            retry_after_ms = self.server.config.retry_after_ms
+            self._send_json(
+                429,
+                {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                headers={'retry-after-ms': str(retry_after_ms), 'retry-after': str(math.ceil(retry_after_ms / 1000))}
+            )
+            return
+        
+        time.sleep(latency)
+        if outcome == 'error':
+            self._send_json(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+            return
+        
+        content = fake_content(request)
+        if request.get('stream'):
+            self._stream(request, content)
+        else:
+            self._send_json(200, completion_body(request, content))
+    
+    def _upload(self, raw: bytes):
+        """Store a multipart file upload."""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + raw)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        if 'file' not in fields:
+            self._send_json(400, {'error': {'message': 'Missing file', 'type': 'invalid_request_error'}})
+            return
+        filename, data = fields['file']
+        purpose = fields.get('purpose', (None, b''))[1].decode('utf-8')
+        self._send_json(200, self.server.store_file(filename or 'upload.jsonl', data, purpose))
+    
+    def _stream(self, request: dict, content: str):
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        model = request.get('model', 'gpt-3.5-turbo')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        def write(data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+        
+        write(stream_chunk(completion_id, model, {'role': 'assistant', 'content': ''}))
+        for start in range(0, len(content), 40):
+            time.sleep(self.server.config.stream_chunk_ms / 1000)
+            write(stream_chunk(completion_id, model, {'content': content[start:start + 40]}))
+        write(stream_chunk(completion_id, model, {}, finish_reason='stop'))
+        write(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_fake_openai(config: FakeOpenAIConfig, host: str = '127.0.0.1', port: int = 0) -> FakeOpenAIServer:
+    """Start the fake API on a background thread and return the server."""
+    server = FakeOpenAIServer((host, port), config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency-ms', type=float, default=500.0, help="Median latency per call")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="Lognormal spread of latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls failing with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument('--retry-after-ms', type=int, default=1000, help="Retry-After sent with 429s")
+    parser.add_argument('--batch-delay', type=float, default=0.0, help="Seconds until a batch completes")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--certfile', default=None, help="Serve HTTPS with this certificate (PEM)")
+    parser.add_argument('--keyfile', default=None, help="Private key of --certfile, if not in the same file")
+    args = parser.parse_args()
+    
+    config = FakeOpenAIConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_ms=args.retry_after_ms,
+        batch_delay_s=args.batch_delay,
+        seed=args.seed,
+    )
+    server = FakeOpenAIServer((args.host, args.port), config)
+    if args.certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(args.certfile, args.keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    print(f"Fake OpenAI API listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Drive the API at a target submission rate and report latency and throughput.
+
+Jobs are submitted open-loop at ``--rate`` per second (a slow response does
+not delay the next submission), then polled until they finish. The report
+covers submit and status-read latency, end-to-end job latency, jobs/sec
+per worker and, when the server runs with QUERY_COUNT_HEADER_ENABLED=true,
+database queries per request. It is written as JSON so runs can be
+compared; ``--baseline`` prints the change against an earlier report.
+    
+    python benchmarks/load_test.py --base-url http://localhost:8000 --rate 20 --duration 60 \\
+        --workers 2 --output benchmarks/results/run.json --baseline benchmarks/results/main.json
+
+With ``--closed-loop N`` the API itself is measured instead: N clients each
+create a job and read its status back-to-back for ``--duration`` seconds,
+and the report adds requests per second (the job flow is not followed).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+TERMINAL_STATUSES = ('completed', 'failed')
+SUBMIT_P99_TARGET_MS = 200
+
+# Metrics compared against a baseline; True where higher is better
+COMPARED_METRICS = [
+    ('submit', 'p50_ms', False),
+    ('submit', 'p99_ms', False),
+    ('status_read', 'p50_ms', False),
+    ('status_read', 'p99_ms', False),
+    ('end_to_end', 'p50_s', False),
+    ('end_to_end', 'p99_s', False),
+    ('throughput', 'jobs_per_sec_per_worker', True),
+    ('requests', 'per_sec', True),
+    ('submit', 'db_queries_mean', False),
+    ('status_read', 'db_queries_mean', False),
+]
+
+WORDS = (
+    "patient staff hand hygiene procedure record review escalate document "
+    "equipment sterile consent audit training incident report protocol"
+).split()
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Return the pct-th percentile (nearest rank) of the samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples_ms: List[float], queries: List[int], errors: int) -> Dict:
+    return {
+        'count': len(samples_ms),
+        'errors': errors,
+        'p50_ms': percentile(samples_ms, 50),
+        'p90_ms': percentile(samples_ms, 90),
+        'p99_ms': percentile(samples_ms, 99),
+        'max_ms': max(samples_ms) if samples_ms else None,
+        'db_queries_mean': statistics.mean(queries) if queries else None,
+    }
+
+
+def guideline_text(chars: int) -> str:
+    """Return a unique guideline text of roughly ``chars`` characters."""
+    parts = [f"Benchmark guideline {uuid.uuid4()}."]
+    length = len(parts[0])
+    while length < chars:
+        sentence = ' '.join(random.choice(WORDS) for _ in range(12)).capitalize() + '.'
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(parts)[:max(chars, len(parts[0]))]
+
+
+class LoadTest:
+    """Submits jobs at a fixed rate and follows each one to completion."""
+    
+    def __init__(self, args):
+        self.args = args
+        self.submit_ms: List[float] = []
+        self.submit_queries: List[int] = []
+        self.submit_errors = 0
+        self.read_ms: List[float] = []
+        self.read_queries: List[int] = []
+        self.read_errors = 0
+        self.end_to_end_s: List[float] = []
+        self.outcomes = {'completed': 0, 'failed': 0, 'timed_out': 0}
+        self.first_submit = None
+        self.last_finish = None
+        self.requests = 0
+        self.requests_window = None
+    
+    def _record_queries(self, response: httpx.Response, target: List[int]):
+        if 'X-DB-Queries' in response.headers:
+            target.append(int(response.headers['X-DB-Queries']))
+    
+    def job_payload(self) -> Dict:
+        payload = {'guideline_text': guideline_text(self.args.text_chars), 'use_cache': self.args.use_cache}
+        if self.args.priority:
+            payload['priority'] = self.args.priority
+        if self.args.pipeline:
+            payload['pipeline'] = self.args.pipeline
+        return payload
+    
+    async def timed_request(self, client: httpx.AsyncClient, method: str, url: str, **kwargs):
+        """Send one request, recording its latency; return the response or None."""
+        submit = method == 'POST'
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        else:
+            (self.submit_ms if submit else self.read_ms).append((time.perf_counter() - started) * 1000)
+            self._record_queries(response, self.submit_queries if submit else self.read_queries)
+            self.requests += 1
+        
+        if response is None or response.status_code != (201 if submit else 200):
+            if submit:
+                self.submit_errors += 1
+            else:
+                self.read_errors += 1
+            return None
+        return response
+    
+    async def api_client(self, client: httpx.AsyncClient, deadline: float):
+        """Closed loop: create a job, read its status, repeat until the deadline."""
+        while time.perf_counter() < deadline:
+            response = await self.timed_request(client, 'POST', '/api/jobs/', json=self.job_payload())
+            if response is not None:
+                await self.timed_request(client, 'GET', f"/api/jobs/{response.json()['event_id']}/")
+    
+    async def job_flow(self, client: httpx.AsyncClient):
+        payload = self.job_payload()
+        
+        submitted = time.perf_counter()
+        self.first_submit = self.first_submit or submitted
+        try:
+            response = await client.post('/api/jobs/', json=payload)
+        except httpx.HTTPError:
+            self.submit_errors += 1
+            return
+        self.submit_ms.append((time.perf_counter() - submitted) * 1000)
+        self._record_queries(response, self.submit_queries)
+        if response.status_code != 201:
+            self.submit_errors += 1
+            return
+        
+        event_id = response.json()['event_id']
+        deadline = submitted + self.args.job_timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.poll_interval)
+            started = time.perf_counter()
+            try:
+                response = await client.get(f'/api/jobs/{event_id}/')
+            except httpx.HTTPError:
+                self.read_errors += 1
+                continue
+            self.read_ms.append((time.perf_counter() - started) * 1000)
+            self._record_queries(response, self.read_queries)
+            if response.status_code != 200:
+                self.read_errors += 1
+                continue
+            
+            job_status = response.json()['status']
+            if job_status in TERMINAL_STATUSES:
+                finished = time.perf_counter()
+                self.end_to_end_s.append(finished - submitted)
+                self.outcomes[job_status] += 1
+                self.last_finish = max(self.last_finish or finished, finished)
+                return
+        self.outcomes['timed_out'] += 1
+    
+    async def run(self):
+        total = int(self.args.rate * self.args.duration)
+        limits = httpx.Limits(max_connections=self.args.max_connections)
+        async with httpx.AsyncClient(base_url=self.args.base_url, limits=limits, timeout=30.0) as client:
+            start = time.perf_counter()
+            if self.args.closed_loop:
+                deadline = start + self.args.duration
+                await asyncio.gather(*(self.api_client(client, deadline) for _ in range(self.args.closed_loop)))
+                self.requests_window = time.perf_counter() - start
+                return
+            tasks = []
+            for i in range(total):
+                delay = start + i / self.args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.job_flow(client)))
+            await asyncio.gather(*tasks)
+    
+    def report(self) -> Dict:
+        window = None
+        jobs_per_sec = None
+        if self.first_submit and self.last_finish:
+            window = self.last_finish - self.first_submit
+            jobs_per_sec = self.outcomes['completed'] / window if window > 0 else None
+        submit = latency_summary(self.submit_ms, self.submit_queries, self.submit_errors)
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'config': {
+                'base_url': self.args.base_url,
+                'rate': self.args.rate,
+                'duration': self.args.duration,
+                'text_chars': self.args.text_chars,
+                'workers': self.args.workers,
+                'use_cache': self.args.use_cache,
+                'priority': self.args.priority,
+                'pipeline': self.args.pipeline,
+                'label': self.args.label,
+                'closed_loop': self.args.closed_loop,
+            },
+            'submit': submit,
+            'status_read': latency_summary(self.read_ms, self.read_queries, self.read_errors),
+            'end_to_end': {
+                **self.outcomes,
+                'p50_s': percentile(self.end_to_end_s, 50),
+                'p90_s': percentile(self.end_to_end_s, 90),
+                'p99_s': percentile(self.end_to_end_s, 99),
+            },
+            'throughput': {
+                'window_s': window,
+                'jobs_per_sec': jobs_per_sec,
+                'jobs_per_sec_per_worker': jobs_per_sec / self.args.workers if jobs_per_sec else None,
+            },
+            'requests': {
+                'total': self.requests,
+                'per_sec': self.requests / self.requests_window if self.requests_window else None,
+            },
+            'slo': {
+                'submit_p99_target_ms': SUBMIT_P99_TARGET_MS,
+                'submit_p99_met': submit['p99_ms'] is not None and submit['p99_ms'] < SUBMIT_P99_TARGET_MS,
+            },
+        }
+
+
+def compare(report: Dict, baseline: Dict, max_regression: Optional[float]) -> bool:
+    """Print each compared metric against the baseline; return False on a regression."""
+    ok = True
+    for section, key, higher_is_better in COMPARED_METRICS:
+        old = baseline.get(section, {}).get(key)
+        new = report.get(section, {}).get(key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        regressed = -change if higher_is_better else change
+        flag = ''
+        if max_regression is not None and regressed > max_regression:
+            flag = '  REGRESSION'
+            ok = False
+        print(f"{section}.{key}: {old:.3f} -> {new:.3f} ({change:+.1f}%){flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--rate', type=float, default=10.0, help="Job submissions per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to keep submitting")
+    parser.add_argument('--text-chars', type=int, default=2000, help="Length of each guideline text")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes serving the run")
+    parser.add_argument('--poll-interval', type=float, default=0.5, help="Seconds between status reads")
+    parser.add_argument('--job-timeout', type=float, default=300.0, help="Give up on a job after this long")
+    parser.add_argument('--max-connections', type=int, default=200)
+    parser.add_argument('--priority', choices=['high', 'normal', 'low'], default=None)
+    parser.add_argument('--pipeline', choices=['chain', 'single'], default=None, help="Pipeline to request per job")
+    parser.add_argument('--use-cache', action='store_true', help="Allow result cache hits")
+    parser.add_argument(
+        '--closed-loop',
+        type=int,
+        default=None,
+        metavar='N',
+        help="Measure API requests/sec with N clients creating and reading jobs back-to-back"
+    )
+    parser.add_argument('--label', default=None, help="Free-form label stored in the report")
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    parser.add_argument('--baseline', default=None, help="Earlier JSON report to compare against")
+    parser.add_argument(
+        '--max-regression',
+        type=float,
+        default=None,
+        help="Exit non-zero if a compared metric is worse than the baseline by more than this percent"
+    )
+    args = parser.parse_args()
+    
+    load_test = LoadTest(args)
+    asyncio.run(load_test.run())
+    report = load_test.report()
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
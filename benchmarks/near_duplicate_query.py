@@ -0,0 +1,153 @@
+"""
+Measure the near-duplicate candidate query on PostgreSQL with a skewed band key.
+
+Creates a throwaway test database next to the configured one, fills it with
+completed jobs whose signatures have 16 band keys each, where a share of
+the jobs (``--skew``) all carry one "hot" key, as a boilerplate opening
+shared by many guidelines would, and a share are not reusable (failed).
+It then looks up batches of band keys that include the hot key with
+recent_band_jobs, as the API does, and with the ROW_NUMBER window query
+it replaced, which ranks every row of a key before keeping the first ones.
+Needs the PostgreSQL server of the Django settings.
+    
+    python benchmarks/near_duplicate_query.py --jobs 200000 --skew 0.5 --batch 100 \\
+        --output benchmarks/results/near_duplicate_query.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'guideline_ingest.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import F, Window  # noqa: E402
+from django.db.models.functions import RowNumber  # noqa: E402
+
+from jobs import minhash  # noqa: E402
+from jobs.models import JobSignatureBand, JobStatus  # noqa: E402
+from jobs.result_cache import recent_band_jobs  # noqa: E402
+
+HOT_KEY = 1
+KEY_SPACE = 2 ** 62
+
+
+def window_band_jobs(keys, limit):
+    """The previous candidate query: rank every reusable band of each key by job update time."""
+    return list(
+        JobSignatureBand.objects.filter(
+            key__in=keys,
+            signature__job__status=JobStatus.COMPLETED,
+            signature__job__source_job__isnull=True,
+            signature__job__payload__compressed_result__isnull=False,
+        ).annotate(
+            rank=Window(RowNumber(), partition_by=[F('key')], order_by=F('signature__job__updated_at').desc())
+        ).filter(rank__lte=limit).values_list('key', 'signature_id', 'signature__job__updated_at')
+    )
+
+
+def populate(jobs: int, skew: float, failed: float) -> None:
+    """Insert the jobs, their payloads, signatures and band keys with generate_series."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO jobs (id, status, created_at, updated_at, queue, completion_tokens, prompt_tokens,
+                              pipeline, deferred, attempts)
+            SELECT md5(n::text)::uuid, CASE WHEN random() < %s THEN 'failed' ELSE 'completed' END,
+                   now() - (%s - n) * interval '1 second', now() - (%s - n) * interval '1 second',
+                   'default', 0, 0, 'chain', false, 1
+            FROM generate_series(1, %s) AS n
+        """, [failed, jobs, jobs, jobs])
+        cursor.execute("""
+            INSERT INTO job_payloads (job_id, compressed_text, compressed_result, updated_at)
+            SELECT id, '\\x00'::bytea, '\\x00'::bytea, updated_at FROM jobs
+        """)
+        cursor.execute("""
+            INSERT INTO job_signatures (job_id, minhash, created_at)
+            SELECT id, '\\x00'::bytea, created_at FROM jobs
+        """)
+        cursor.execute("""
+            INSERT INTO job_signature_bands (signature_id, key)
+            SELECT j.id, CASE WHEN b = 0 AND random() < %s THEN %s
+                              ELSE (random() * %s)::bigint END
+            FROM (SELECT id, created_at FROM jobs ORDER BY created_at) j
+            CROSS JOIN generate_series(0, %s) AS b
+        """, [skew, HOT_KEY, KEY_SPACE, minhash.BANDS - 1])
+        cursor.execute("ANALYZE")
+
+
+def measure(lookup, batches, limit, repeat):
+    times = []
+    rows = 0
+    for _ in range(repeat):
+        for keys in batches:
+            start = time.perf_counter()
+            rows = len(lookup(keys, limit))
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {
+        'p50_ms': round(statistics.median(times), 2),
+        'p95_ms': round(times[int(len(times) * 0.95) - 1], 2),
+        'rows_last_batch': rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--jobs', type=int, default=200000, help="Completed or failed jobs in the index")
+    parser.add_argument('--skew', type=float, default=0.5, help="Share of jobs carrying the hot band key")
+    parser.add_argument('--failed', type=float, default=0.1, help="Share of jobs that are not reusable")
+    parser.add_argument('--batch', type=int, default=100, help="Texts per lookup")
+    parser.add_argument('--batches', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-candidates', type=int, default=settings.NEAR_DUPLICATE_MAX_CANDIDATES)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+    if connection.vendor != 'postgresql':
+        parser.error("the configured database is not PostgreSQL")
+    
+    rng = random.Random(args.seed)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        start = time.perf_counter()
+        populate(args.jobs, args.skew, args.failed)
+        populate_s = time.perf_counter() - start
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM job_signature_bands WHERE key = %s", [HOT_KEY])
+            hot_rows = cursor.fetchone()[0]
+        # Each batch has the hot key and the other band keys of its texts, none stored yet
+        batches = [
+            [HOT_KEY] + [rng.randrange(KEY_SPACE) for _ in range(args.batch * minhash.BANDS - 1)]
+            for _ in range(args.batches)
+        ]
+        report = {
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'band_rows': args.jobs * minhash.BANDS,
+            'hot_key_rows': hot_rows,
+            'populate_s': round(populate_s, 1),
+            'window': measure(window_band_jobs, batches, args.max_candidates, args.repeat),
+            'lateral': measure(recent_band_jobs, batches, args.max_candidates, args.repeat),
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Measure recall and lookup cost of the near-duplicate index offline.
+
+Builds a synthetic corpus of guideline texts, then queries it with edited
+revisions of some of them (a share of words replaced, inserted or
+deleted) and with unrelated texts. Each query is answered by the banded
+LSH index, as the API does, and by comparing its signature with every
+signature in the corpus. The report gives, per banding, the recall of
+pairs whose true shingle Jaccard similarity reaches the threshold, the
+false matches, the candidates compared per query and the lookup time;
+no database or Django setup is needed.
+    
+    python benchmarks/near_duplicates.py --corpus 20000 --queries 500 --threshold 0.9 \\
+        --bandings 16x8,32x4,8x16 --output benchmarks/results/near_duplicates.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import minhash  # noqa: E402
+
+VOCABULARY_SIZE = 5000
+
+
+def random_text(rng: random.Random, words: int) -> List[str]:
+    return [f"w{rng.randrange(VOCABULARY_SIZE)}" for _ in range(words)]
+
+
+def revise(rng: random.Random, words: List[str], edit_rate: float) -> List[str]:
+    """Return a copy of ``words`` with about ``edit_rate`` of them replaced, inserted or deleted."""
+    revised = list(words)
+    for _ in range(max(1, int(len(words) * edit_rate))):
+        position = rng.randrange(len(revised))
+        operation = rng.random()
+        if operation < 0.5:
+            revised[position] = f"w{rng.randrange(VOCABULARY_SIZE)}"
+        elif operation < 0.75:
+            revised.insert(position, f"w{rng.randrange(VOCABULARY_SIZE)}")
+        elif len(revised) > minhash.SHINGLE_SIZE:
+            del revised[position]
+    return revised
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def band_keys(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """Return the (n, bands) band keys of a signature matrix for any banding."""
+    used = signatures[:, :bands * rows].astype(np.uint64).reshape(len(signatures), bands, rows)
+    multipliers = np.random.default_rng(rows).integers(1, 1 << 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    offsets = np.arange(bands, dtype=np.uint64) << np.uint64(56)
+    return (used * multipliers).sum(axis=2) + offsets
+
+
+def parse_banding(value: str) -> Tuple[int, int]:
+    bands, rows = (int(part) for part in value.split('x'))
+    if bands * rows > minhash.NUM_PERM:
+        raise argparse.ArgumentTypeError(f"{value} needs more than {minhash.NUM_PERM} permutations")
+    return bands, rows
+
+
+def run_banding(
+    bands: int,
+    rows: int,
+    corpus_signatures: np.ndarray,
+    query_signatures: np.ndarray,
+    truth: List[set],
+    threshold: float,
+    max_candidates: int
+) -> Dict:
+    """Index the corpus with one banding and answer every query through it."""
+    index = defaultdict(list)
+    for doc_id, keys in enumerate(band_keys(corpus_signatures, bands, rows)):
+        for key in keys.tolist():
+            index[key].append(doc_id)
+    
+    found = 0
+    false_matches = 0
+    candidate_counts = []
+    lookup_us = []
+    for query_id, keys in enumerate(band_keys(query_signatures, bands, rows)):
+        start = time.perf_counter()
+        candidates = list({doc_id for key in keys.tolist() for doc_id in index.get(key, ())})[:max_candidates]
+        matches = set()
+        if candidates:
+            scores = minhash.similarities(query_signatures[query_id], corpus_signatures[candidates])
+            matches = {candidates[i] for i in np.flatnonzero(scores >= threshold)}
+        lookup_us.append((time.perf_counter() - start) * 1e6)
+        candidate_counts.append(len(candidates))
+        found += len(matches & truth[query_id])
+        false_matches += len(matches - truth[query_id])
+    
+    expected = sum(len(pairs) for pairs in truth)
+    return {
+        'banding': f'{bands}x{rows}',
+        'collision_probability_at_threshold': round(1 - (1 - threshold ** rows) ** bands, 4),
+        'recall': round(found / expected, 4) if expected else None,
+        'false_matches': false_matches,
+        'candidates_mean': round(statistics.mean(candidate_counts), 1),
+        'candidates_max': max(candidate_counts),
+        'lookup_us_p50': round(statistics.median(lookup_us), 1),
+        'lookup_us_mean': round(statistics.mean(lookup_us), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--corpus', type=int, default=5000, help="Texts in the index")
+    parser.add_argument('--queries', type=int, default=300, help="Revised texts to look up")
+    parser.add_argument('--unrelated', type=int, default=100, help="Unrelated texts to look up")
+    parser.add_argument('--words', type=int, default=300, help="Words per text")
+    parser.add_argument(
+        '--edit-rates',
+        default='0.005,0.01,0.02,0.05',
+        help="Comma-separated shares of words edited in revisions"
+    )
+    parser.add_argument('--threshold', type=float, default=0.9)
+    parser.add_argument('--max-candidates', type=int, default=100)
+    parser.add_argument(
+        '--bandings',
+        type=lambda value: [parse_banding(item) for item in value.split(',')],
+        default=[(minhash.BANDS, minhash.ROWS)],
+        help="Comma-separated BANDSxROWS settings to compare"
+    )
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    edit_rates = [float(rate) for rate in args.edit_rates.split(',')]
+    corpus = [random_text(rng, args.words) for _ in range(args.corpus)]
+    queries = [
+        revise(rng, corpus[rng.randrange(args.corpus)], edit_rates[i % len(edit_rates)])
+        for i in range(args.queries)
+    ] + [random_text(rng, args.words) for _ in range(args.unrelated)]
+    
+    start = time.perf_counter()
+    corpus_signatures = np.stack([minhash.signature(' '.join(words)) for words in corpus])
+    signature_us = (time.perf_counter() - start) / len(corpus) * 1e6
+    query_signatures = np.stack([minhash.signature(' '.join(words)) for words in queries])
+    
+    # Ground truth from exact shingle sets; revisions can also match other corpus texts
+    # by chance, so every pair is checked rather than only the revised original
+    corpus_shingles = [set(minhash.shingle_hashes(' '.join(words)).tolist()) for words in corpus]
+    truth = []
+    brute_force_us = []
+    brute_force_found = 0
+    brute_force_false = 0
+    for query_id, words in enumerate(queries):
+        shingles = set(minhash.shingle_hashes(' '.join(words)).tolist())
+        start = time.perf_counter()
+        scores = minhash.similarities(query_signatures[query_id], corpus_signatures)
+        matches = set(np.flatnonzero(scores >= args.threshold).tolist())
+        brute_force_us.append((time.perf_counter() - start) * 1e6)
+        # Exact Jaccard only for pairs that share any shingle at all
+        truth.append({
+            doc_id for doc_id, doc_shingles in enumerate(corpus_shingles)
+            if not shingles.isdisjoint(doc_shingles) and jaccard(shingles, doc_shingles) >= args.threshold
+        })
+        brute_force_found += len(matches & truth[-1])
+        brute_force_false += len(matches - truth[-1])
+    expected = sum(len(pairs) for pairs in truth)
+    
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'bandings')},
+        'pairs_at_threshold': expected,
+        'signature_us_mean': round(signature_us, 1),
+        # Every signature compared: the ceiling on recall set by the estimate itself
+        'brute_force': {
+            'recall': round(brute_force_found / expected, 4) if expected else None,
+            'false_matches': brute_force_false,
+            'lookup_us_p50': round(statistics.median(brute_force_us), 1),
+        },
+        'bandings': [
+            run_banding(
+                bands, rows, corpus_signatures, query_signatures, truth, args.threshold, args.max_candidates
+            )
+            for bands, rows in args.bandings
+        ],
+    }
+    
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
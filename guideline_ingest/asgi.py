@@ -0,0 +1,11 @@
+"""
+ASGI config for guideline_ingest project.
+
+Served by uvicorn workers under gunicorn; set API_ASYNC_VIEWS so the hot
+endpoints run as async views.
+"""
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'guideline_ingest.settings')
+application = get_asgi_application()
\ No newline at end of file
@@ -3,6 +3,7 @@ Celery configuration for the guideline ingest project.
 """
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'guideline_ingest.settings')
@@ -16,15 +17,15 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
-# Configure task routing and execution
-""" app.conf.update(
-    task_routes={
-        'jobs.tasks.process_guideline_task': {'queue': 'guideline_processing'},
-    },
-    worker_prefetch_multiplier=1,
-    task_acks_late=True,
-    worker_max_tasks_per_child=1000,
-) """
+# Queue routing, prefetch and acks_late are configured in settings.py (CELERY_*)
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    """Serve worker metrics on METRICS_WORKER_PORT, if set."""
+    from jobs.metrics import start_worker_exporter
+    start_worker_exporter()
+
 
 @app.task(bind=True)
 def debug_task(self):
@@ -38,6 +38,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Report per-request database query counts in X-DB-Queries (benchmarks only)
+QUERY_COUNT_HEADER_ENABLED = os.environ.get('QUERY_COUNT_HEADER_ENABLED', 'False').lower() == 'true'
+if QUERY_COUNT_HEADER_ENABLED:
+    MIDDLEWARE.insert(0, 'jobs.middleware.QueryCountMiddleware')
+
 ROOT_URLCONF = 'guideline_ingest.urls'
 
 TEMPLATES = [
@@ -57,6 +62,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'guideline_ingest.wsgi.application'
+ASGI_APPLICATION = 'guideline_ingest.asgi.application'
 
 # Database
 DATABASES = {
@@ -129,5 +135,207 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Jobs are routed to the 'interactive' or 'bulk' queue (see jobs/routing.py);
+# each queue has its own worker pool. Worker options below are read per
+# process, so every pool sets its own through the environment.
+CELERY_TASK_DEFAULT_QUEUE = 'interactive'
+CELERY_TASK_ROUTES = {
+    'jobs.tasks.retire_expired_jobs_task': {'queue': 'bulk'},
+    'jobs.tasks.submit_deferred_jobs_task': {'queue': 'bulk'},
+    'jobs.tasks.poll_provider_batches_task': {'queue': 'bulk'},
+}
+# Acknowledge after the task finishes so a crashed worker's jobs are redelivered
+CELERY_TASK_ACKS_LATE = os.environ.get('CELERY_TASK_ACKS_LATE', 'True').lower() == 'true'
+CELERY_TASK_REJECT_ON_WORKER_LOST = CELERY_TASK_ACKS_LATE
+# Messages reserved per worker process beyond the one it runs
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_WORKER_PREFETCH_MULTIPLIER', 1))
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(os.environ.get('CELERY_WORKER_MAX_TASKS_PER_CHILD', 1000))
+
+# Periodic tasks, run by `celery -A guideline_ingest beat`
+CELERY_BEAT_SCHEDULE = {
+    'retire-expired-jobs': {
+        'task': 'jobs.tasks.retire_expired_jobs_task',
+        'schedule': float(os.environ.get('JOB_RETENTION_INTERVAL', 15 * 60)),
+    },
+    'submit-deferred-jobs': {
+        'task': 'jobs.tasks.submit_deferred_jobs_task',
+        'schedule': float(os.environ.get('GPT_BATCH_SUBMIT_INTERVAL', 5 * 60)),
+    },
+    'poll-provider-batches': {
+        'task': 'jobs.tasks.poll_provider_batches_task',
+        'schedule': float(os.environ.get('GPT_BATCH_POLL_INTERVAL', 60)),
+    },
+}
+
 # OpenAI Configuration
-OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
\ No newline at end of file
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 60.0))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5.0))
+
+# Per-process OpenAI connection pool (shared by every job a worker runs)
+OPENAI_POOL_MAX_CONNECTIONS = int(os.environ.get('OPENAI_POOL_MAX_CONNECTIONS', 20))
+OPENAI_POOL_MAX_KEEPALIVE = int(os.environ.get('OPENAI_POOL_MAX_KEEPALIVE', 10))
+OPENAI_POOL_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_POOL_KEEPALIVE_EXPIRY', 60.0))
+
+# Cluster-wide OpenAI rate limiting shared through Redis (0 = no limit).
+# Set these slightly below the account quota.
+OPENAI_RATE_LIMIT_RPM = int(os.environ.get('OPENAI_RATE_LIMIT_RPM', 0))
+OPENAI_RATE_LIMIT_TPM = int(os.environ.get('OPENAI_RATE_LIMIT_TPM', 0))
+# Upper bound for the adaptive concurrency limit across all workers
+OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 0))
+OPENAI_RATE_LIMIT_REDIS_URL = os.environ.get('OPENAI_RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
+# Longest a call waits for a slot before failing the step
+OPENAI_RATE_LIMIT_MAX_WAIT = float(os.environ.get('OPENAI_RATE_LIMIT_MAX_WAIT', 300))
+# Concurrency slots held by crashed workers expire after this many seconds
+OPENAI_RATE_LIMIT_LEASE_TTL = int(os.environ.get('OPENAI_RATE_LIMIT_LEASE_TTL', 120))
+# Times a call re-queues for a slot after a 429 before failing the step
+OPENAI_RATE_LIMIT_RETRIES = int(os.environ.get('OPENAI_RATE_LIMIT_RETRIES', 3))
+
+# Job retries back off exponentially with jitter: the delay before retry n is
+# between half and all of min(GPT_RETRY_BACKOFF_MAX, GPT_RETRY_BACKOFF_BASE * 2**n)
+GPT_RETRY_BACKOFF_BASE = float(os.environ.get('GPT_RETRY_BACKOFF_BASE', 30))
+GPT_RETRY_BACKOFF_MAX = float(os.environ.get('GPT_RETRY_BACKOFF_MAX', 600))
+
+# Rendered status responses of completed/failed jobs, cached in the events Redis
+JOB_STATUS_CACHE_ENABLED = os.environ.get('JOB_STATUS_CACHE_ENABLED', 'True').lower() == 'true'
+JOB_STATUS_CACHE_TTL = int(os.environ.get('JOB_STATUS_CACHE_TTL', 24 * 60 * 60))
+
+# Result cache for identical guideline texts
+JOB_RESULT_CACHE_ENABLED = os.environ.get('JOB_RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+# Completed results older than this many seconds are not reused (0 = never expire)
+JOB_RESULT_CACHE_TTL = int(os.environ.get('JOB_RESULT_CACHE_TTL', 7 * 24 * 60 * 60))
+# In-flight jobs older than this many seconds are not joined by new submissions
+JOB_SINGLE_FLIGHT_TIMEOUT = int(os.environ.get('JOB_SINGLE_FLIGHT_TIMEOUT', 15 * 60))
+
+# Maximum number of guideline texts accepted by the batch submission endpoint
+JOB_BATCH_MAX_SIZE = int(os.environ.get('JOB_BATCH_MAX_SIZE', 500))
+
+# Guidelines longer than this go to the bulk queue unless sent with priority=high
+JOB_INTERACTIVE_MAX_CHARS = int(os.environ.get('JOB_INTERACTIVE_MAX_CHARS', 8000))
+
+# Job listing page sizes (GET /api/jobs/)
+JOB_LIST_PAGE_SIZE = int(os.environ.get('JOB_LIST_PAGE_SIZE', 50))
+JOB_LIST_MAX_PAGE_SIZE = int(os.environ.get('JOB_LIST_MAX_PAGE_SIZE', 200))
+
+# NDJSON export of completed jobs: rows fetched per round trip of the server-side cursor
+JOB_EXPORT_CHUNK_SIZE = int(os.environ.get('JOB_EXPORT_CHUNK_SIZE', 2000))
+# Seconds an incremental export's updated_after is moved back, to catch jobs
+# whose update committed after the previous pull had passed their timestamp
+JOB_EXPORT_WATERMARK_OVERLAP = int(os.environ.get('JOB_EXPORT_WATERMARK_OVERLAP', 300))
+
+# Retention: completed/failed jobs older than JOB_RETENTION_DAYS leave the hot
+# tables, either moved to jobs_archive ('archive') or deleted ('purge')
+JOB_RETENTION_MODE = os.environ.get('JOB_RETENTION_MODE', 'archive')
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 30))
+# Jobs per transaction, and batches per periodic run
+JOB_RETENTION_BATCH_SIZE = int(os.environ.get('JOB_RETENTION_BATCH_SIZE', 1000))
+JOB_RETENTION_MAX_BATCHES = int(os.environ.get('JOB_RETENTION_MAX_BATCHES', 50))
+
+# Job status events (Server-Sent Events and long-poll)
+JOB_EVENTS_REDIS_URL = os.environ.get('JOB_EVENTS_REDIS_URL', CELERY_BROKER_URL)
+JOB_EVENTS_LONG_POLL_MAX_TIMEOUT = int(os.environ.get('JOB_EVENTS_LONG_POLL_MAX_TIMEOUT', 30))
+JOB_EVENTS_STREAM_MAX_DURATION = int(os.environ.get('JOB_EVENTS_STREAM_MAX_DURATION', 300))
+JOB_EVENTS_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_EVENTS_HEARTBEAT_INTERVAL', 15))
+
+# GPT chain execution mode: 'celery' (one prefork slot per job) or 'async'
+# (jobs are claimed from the database by `manage.py run_async_worker`)
+GPT_EXECUTION_MODE = os.environ.get('GPT_EXECUTION_MODE', 'celery')
+ASYNC_WORKER_CONCURRENCY = int(os.environ.get('ASYNC_WORKER_CONCURRENCY', 50))
+ASYNC_WORKER_POLL_INTERVAL = float(os.environ.get('ASYNC_WORKER_POLL_INTERVAL', 1.0))
+# Seconds a claimed job stays leased to its async worker without a renewal;
+# jobs of a worker that died are claimed again after this
+ASYNC_WORKER_LEASE_SECONDS = int(os.environ.get('ASYNC_WORKER_LEASE_SECONDS', 300))
+
+# Map-reduce summarization for long guidelines
+GPT_CHUNK_THRESHOLD_CHARS = int(os.environ.get('GPT_CHUNK_THRESHOLD_CHARS', 12000))
+GPT_CHUNK_SIZE_CHARS = int(os.environ.get('GPT_CHUNK_SIZE_CHARS', 6000))
+GPT_CHUNK_CONCURRENCY = int(os.environ.get('GPT_CHUNK_CONCURRENCY', 4))
+
+# Stream completions and expose partial results while a job is processing
+GPT_STREAMING_ENABLED = os.environ.get('GPT_STREAMING_ENABLED', 'False').lower() == 'true'
+# Minimum seconds between partial result writes for one job
+GPT_STREAM_FLUSH_INTERVAL = float(os.environ.get('GPT_STREAM_FLUSH_INTERVAL', 1.0))
+
+# Prometheus metrics: served at /metrics by the web process and, if a port is
+# set, by each worker (set PROMETHEUS_MULTIPROC_DIR for multi-process servers)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_WORKER_PORT = int(os.environ.get('METRICS_WORKER_PORT', 0))
+# Seconds the completed/failed job counts of the guideline_jobs gauge are
+# reused between scrapes; pending and processing are counted every scrape
+METRICS_TERMINAL_COUNT_TTL = float(os.environ.get('METRICS_TERMINAL_COUNT_TTL', 300))
+
+# Default pipeline for new jobs: 'chain' (summary, then checklist) or 'single'
+# (one structured-output call returning both); jobs can override it
+GPT_PIPELINE_MODE = os.environ.get('GPT_PIPELINE_MODE', 'chain')
+# The single-call pipeline needs a model with JSON schema response formats
+GPT_STRUCTURED_MODEL = os.environ.get('GPT_STRUCTURED_MODEL', 'gpt-4o-mini')
+
+# Hedged OpenAI calls: a call still running after the GPT_HEDGE_PERCENTILE of
+# recent latencies for its kind of request (at least GPT_HEDGE_MIN_DELAY
+# seconds, once GPT_HEDGE_MIN_SAMPLES are known) is duplicated, on
+# GPT_HEDGE_MODEL if set, and the first answer wins. Each call earns
+# GPT_HEDGE_BUDGET hedges, up to GPT_HEDGE_BUDGET_BURST saved, per process
+GPT_HEDGE_ENABLED = os.environ.get('GPT_HEDGE_ENABLED', 'False').lower() == 'true'
+GPT_HEDGE_PERCENTILE = float(os.environ.get('GPT_HEDGE_PERCENTILE', 95))
+GPT_HEDGE_MIN_DELAY = float(os.environ.get('GPT_HEDGE_MIN_DELAY', 2.0))
+GPT_HEDGE_MODEL = os.environ.get('GPT_HEDGE_MODEL', '')
+GPT_HEDGE_BUDGET = float(os.environ.get('GPT_HEDGE_BUDGET', 0.05))
+GPT_HEDGE_BUDGET_BURST = float(os.environ.get('GPT_HEDGE_BUDGET_BURST', 10))
+GPT_HEDGE_WINDOW = int(os.environ.get('GPT_HEDGE_WINDOW', 500))
+GPT_HEDGE_MIN_SAMPLES = int(os.environ.get('GPT_HEDGE_MIN_SAMPLES', 50))
+# Threads running hedged calls of the sync workers
+GPT_HEDGE_THREADS = int(os.environ.get('GPT_HEDGE_THREADS', 16))
+
+# Deferred jobs go through the provider's batch API. A batch is submitted once
+# GPT_BATCH_MIN_JOBS are waiting or the oldest has waited GPT_BATCH_MAX_WAIT seconds
+GPT_BATCH_MIN_JOBS = int(os.environ.get('GPT_BATCH_MIN_JOBS', 100))
+GPT_BATCH_MAX_WAIT = int(os.environ.get('GPT_BATCH_MAX_WAIT', 60 * 60))
+GPT_BATCH_MAX_JOBS = int(os.environ.get('GPT_BATCH_MAX_JOBS', 10000))
+GPT_BATCH_COMPLETION_WINDOW = os.environ.get('GPT_BATCH_COMPLETION_WINDOW', '24h')
+
+# Completion webhooks, delivered by `manage.py run_webhook_dispatcher`. Failed
+# attempts are retried with jittered backoff up to WEBHOOK_MAX_ATTEMPTS times;
+# with a signing secret each POST carries an X-Webhook-Signature HMAC-SHA256
+WEBHOOK_CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', 50))
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 200))
+WEBHOOK_POLL_INTERVAL = float(os.environ.get('WEBHOOK_POLL_INTERVAL', 1.0))
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 5.0))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 8))
+WEBHOOK_BACKOFF_BASE = float(os.environ.get('WEBHOOK_BACKOFF_BASE', 10.0))
+WEBHOOK_BACKOFF_MAX = float(os.environ.get('WEBHOOK_BACKOFF_MAX', 60 * 60))
+WEBHOOK_SIGNING_SECRET = os.environ.get('WEBHOOK_SIGNING_SECRET', '')
+# Callback hosts must resolve to public addresses; these host names and
+# networks (comma-separated, e.g. "localhost,10.0.0.0/8") are exempt, for
+# local receivers in development and tests
+WEBHOOK_ALLOWED_HOSTS = [
+    entry.strip() for entry in os.environ.get('WEBHOOK_ALLOWED_HOSTS', '').split(',') if entry.strip()
+]
+
+# Serve job creation, status reads and event streams with async views. Meant
+# for the ASGI deployment (gunicorn with uvicorn workers on guideline_ingest.asgi);
+# under WSGI each async view would run in its own event loop
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS', 'False').lower() == 'true'
+
+# Near-duplicate detection over MinHash signatures of the guideline text:
+# 'off', 'flag' (record the most similar completed job on the new job) or
+# 'reuse' (also reuse its result, unless the job was sent with use_cache=false)
+NEAR_DUPLICATE_MODE = os.environ.get('NEAR_DUPLICATE_MODE', 'off')
+# Minimum estimated Jaccard similarity of the texts' word shingles
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.9))
+# Most candidate jobs compared per lookup
+NEAR_DUPLICATE_MAX_CANDIDATES = int(os.environ.get('NEAR_DUPLICATE_MAX_CANDIDATES', 100))
+# Most recent bands read per band key when collecting candidates, which
+# bounds the cost of keys shared by a large part of the corpus
+NEAR_DUPLICATE_MAX_SCAN = int(os.environ.get('NEAR_DUPLICATE_MAX_SCAN', 1000))
+
+# Bulk corpus ingest (`manage.py ingest_corpus`): items read per chunk and
+# reader threads, then processing tasks published per group, at most
+# INGEST_ENQUEUE_RATE jobs per second (0: unpaced) and only while the broker
+# queue holds fewer than INGEST_MAX_QUEUE_DEPTH tasks (0: unchecked)
+INGEST_CHUNK_SIZE = int(os.environ.get('INGEST_CHUNK_SIZE', 1000))
+INGEST_READERS = int(os.environ.get('INGEST_READERS', 8))
+INGEST_ENQUEUE_CHUNK_SIZE = int(os.environ.get('INGEST_ENQUEUE_CHUNK_SIZE', 500))
+INGEST_ENQUEUE_RATE = float(os.environ.get('INGEST_ENQUEUE_RATE', 200))
+INGEST_MAX_QUEUE_DEPTH = int(os.environ.get('INGEST_MAX_QUEUE_DEPTH', 5000))
@@ -2,9 +2,12 @@
 URL configuration for the guideline ingest project.
 """
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from jobs.views import metrics
+
 # Main project URLs
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +15,9 @@ urlpatterns = [
     # OpenAPI schema
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-]
\ No newline at end of file
+    # Prometheus scrape endpoint
+    path('metrics', metrics, name='metrics'),
+]
+
+# Static files for the admin and API docs when DEBUG is on (runserver did this)
+urlpatterns += staticfiles_urlpatterns()
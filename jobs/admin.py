@@ -3,9 +3,9 @@ from .models import Job
 
 @admin.register(Job)
 class JobAdmin(admin.ModelAdmin):
-    list_display = ('id', 'status', 'created_at', 'updated_at')
+    list_display = ('id', 'status', 'created_at', 'updated_at', 'prompt_tokens', 'completion_tokens')
     list_filter = ('status', 'created_at')
-    search_fields = ('id',)
+    search_fields = ('id', 'content_hash')
     readonly_fields = ('id', 'created_at', 'updated_at')
 
 # jobs/apps.py
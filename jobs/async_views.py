@@ -0,0 +1,196 @@
+"""
+Async versions of the hot API views, for the ASGI deployment.
+
+With API_ASYNC_VIEWS set, jobs/urls.py routes job creation, status reads
+and the event stream here instead of to the DRF views. Under an ASGI
+server a request waiting on the database, Redis or the broker then yields
+the event loop rather than holding a thread. Requests and responses match
+those of the DRF views, so clients cannot tell the two apart.
+"""
+import json
+import logging
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from rest_framework.renderers import JSONRenderer
+
+from . import views
+from .events import (
+    TERMINAL_STATUSES,
+    acache_job_status,
+    aget_cached_job_status,
+    aiter_job_events,
+    asubscribe,
+    serialize_job_event,
+)
+from .export import JobExport, accepts_gzip, astream_export, export_response
+from .models import Job, JobArchive
+from .result_cache import needs_processing
+from .serializers import JobCreateSerializer, JobExportQuerySerializer, JobSerializer, missing_parent_errors
+from .status_cache import etag_matches, job_etag, render_job_status
+from .tasks import aenqueue_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _json_response(data, status: int, **kwargs) -> HttpResponse:
+    """Render data exactly as the DRF views do."""
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status, **kwargs)
+
+
+def _method_not_allowed(request, allowed) -> HttpResponse:
+    return _json_response(
+        {'detail': f'Method "{request.method}" not allowed.'},
+        405,
+        headers={'Allow': ', '.join(allowed)}
+    )
+
+
+def _not_modified(etag: str) -> HttpResponse:
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+async def create_job(request):
+    """
+    Create a new guideline ingest job (async variant of views.create_job).
+    
+    GET requests list jobs through the DRF view.
+    """
+    if request.method == 'GET':
+        return await sync_to_async(views.create_job)(request)
+    if request.method != 'POST':
+        return _method_not_allowed(request, ['GET', 'POST'])
+    
+    if request.content_type != 'application/json':
+        return _json_response({'detail': f'Unsupported media type "{request.content_type}" in request.'}, 415)
+    try:
+        data = json.loads(request.body)
+    except ValueError as e:
+        return _json_response({'detail': f'JSON parse error - {str(e)}'}, 400)
+    
+    serializer = JobCreateSerializer(data=data)
+    # Validation resolves the callback host, which must not block the event loop
+    if not await sync_to_async(serializer.is_valid, thread_sensitive=False)():
+        return _json_response(serializer.errors, 400)
+    errors = await sync_to_async(missing_parent_errors)([serializer.validated_data])
+    if errors:
+        return _json_response(errors[0], 400)
+    
+    # The async ORM has no transactions, so the cache lookup and the inserts
+    # of the job and its payload run together in one hop to the ORM thread
+    job = await sync_to_async(views.save_new_job)(serializer.validated_data)
+    
+    if needs_processing(job) and not job.deferred:
+        await aenqueue_jobs([job.id], queue=job.queue)
+    
+    return _json_response({'event_id': job.id, 'status': job.status}, 201)
+
+
+# Django 4.2's csrf_exempt decorator does not support async views; DRF
+# views are exempt from the CSRF middleware too
+create_job.csrf_exempt = True
+
+
+async def get_job_status(request, event_id):
+    """Get the status and results of a job (async variant of views.get_job_status)."""
+    if request.method not in ('GET', 'HEAD'):
+        return _method_not_allowed(request, ['GET'])
+    if_none_match = request.headers.get('If-None-Match')
+    
+    cached = await aget_cached_job_status(event_id)
+    if cached is not None:
+        etag, body = cached
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+        return HttpResponse(body, content_type='application/json', headers={'ETag': etag})
+    
+    job = await Job.objects.select_related('payload').filter(id=event_id).afirst()
+    if job is None:
+        # Jobs retired by the retention task are still served, read-only
+        job = await JobArchive.objects.filter(id=event_id).afirst()
+    if job is None:
+        return _json_response({'detail': 'Not found.'}, 404)
+    etag = job_etag(job)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    
+    data = JobSerializer(job).data
+    await acache_job_status(job, data)
+    return HttpResponse(render_job_status(data), content_type='application/json', headers={'ETag': etag})
+
+
+async def _asubscribe_or_none(event_id):
+    """Subscribe to a job's events, or return None if Redis is unavailable."""
+    try:
+        return await asubscribe(event_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not subscribe to events for job {event_id}: {str(e)}")
+        return None
+
+
+async def _job_event_stream(pubsub, initial_event):
+    """Yield the current job state, then every transition until it finishes."""
+    try:
+        yield 'retry: 2000\n\n'
+        yield views._format_sse(initial_event)
+        if pubsub is None or initial_event['status'] in TERMINAL_STATUSES:
+            return
+        
+        events = aiter_job_events(
+            pubsub,
+            heartbeat=settings.JOB_EVENTS_HEARTBEAT_INTERVAL,
+            max_duration=settings.JOB_EVENTS_STREAM_MAX_DURATION
+        )
+        async for event in events:
+            yield views._format_sse(event) if event else ': keep-alive\n\n'
+    finally:
+        if pubsub is not None:
+            await pubsub.aclose()
+
+
+async def stream_job_events(request, event_id):
+    """
+    Stream job status transitions as Server-Sent Events.
+    
+    An ASGI server only streams async iterators; the sync view's generator
+    would be buffered in full before anything is sent.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    pubsub = await _asubscribe_or_none(event_id)
+    job = await Job.objects.select_related('payload').filter(id=event_id).afirst()
+    if job is None:
+        if pubsub is not None:
+            await pubsub.aclose()
+        raise Http404
+    
+    response = StreamingHttpResponse(
+        _job_event_stream(pubsub, serialize_job_event(job)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def export_jobs(request):
+    """Stream completed job results as NDJSON (async variant of views.export_jobs)."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    query = JobExportQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _json_response(query.errors, 400)
+    compress = accepts_gzip(request)
+    return export_response(astream_export(JobExport(**query.validated_data), compress), compress)
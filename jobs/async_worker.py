@@ -0,0 +1,274 @@
+"""
+Asyncio execution mode for the GPT chain.
+
+Instead of tying up a prefork Celery slot for the whole duration of two
+OpenAI calls, an async worker claims pending jobs directly from the database
+and multiplexes their chains over the async OpenAI client in one process.
+Status transitions and the retry policy match process_guideline_task.
+
+A claimed job is leased for ASYNC_WORKER_LEASE_SECONDS and the worker
+renews the leases of the jobs it holds every third of that. If a worker
+crashes or is killed, its jobs are claimed again by another worker once
+their leases run out and resume after their last completed step, as
+Celery's late acknowledgement redelivers the tasks of a lost worker. The
+attempt lost with the worker counts towards the job's retries.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .chunking import JobChunkStore
+from .events import publish_job_events
+from .metrics import TokenUsage, observe_queue_wait, track_job_usage
+from .models import Job, JobPipeline, JobStatus
+from .routing import QUEUE_INTERACTIVE
+from .steps import CHECKLIST_STEP, COMBINED_STEP, SUMMARY_STEP, JobStepStore
+from .tasks import (
+    MAX_RETRIES,
+    AsyncGPTChainProcessor,
+    complete_job,
+    fail_job,
+    retry_backoff,
+    start_job,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def lease_expiry(now: Optional[datetime] = None) -> datetime:
+    """Return when a lease taken or renewed now runs out."""
+    return (now or timezone.now()) + timedelta(seconds=settings.ASYNC_WORKER_LEASE_SECONDS)
+
+
+class Claim(NamedTuple):
+    """A job taken by claim_pending_jobs."""
+    
+    job_id: str
+    # Attempts started on the job before this claim
+    attempts: int
+    # The job was processing under a lease that ran out, not pending
+    reclaimed: bool
+
+
+def claim_pending_jobs(limit: int) -> List[Claim]:
+    """
+    Atomically move up to ``limit`` pending jobs to processing and lease them.
+    
+    Processing jobs whose lease ran out are claimed again; jobs run by
+    Celery workers have no lease and are never taken over. Rows locked by
+    another worker are skipped, so several async workers can claim from the
+    same table without handing out a job twice. Interactive jobs are
+    claimed before bulk ones. Each claim starts an attempt.
+    """
+    if limit <= 0:
+        return []
+    
+    close_old_connections()
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=JobStatus.PENDING) | Q(status=JobStatus.PROCESSING, lease_expires_at__lt=now),
+                source_job__isnull=True,
+                deferred=False
+            )
+            .order_by(
+                Case(
+                    When(queue=QUEUE_INTERACTIVE, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField()
+                ),
+                'created_at'
+            )
+            .values_list('id', 'attempts', 'status')[:limit]
+        )
+        job_ids = [job_id for job_id, _, _ in rows]
+        Job.objects.filter(id__in=job_ids).update(
+            status=JobStatus.PROCESSING,
+            updated_at=now,
+            lease_expires_at=lease_expiry(now),
+            attempts=F('attempts') + 1
+        )
+    
+    if job_ids:
+        publish_job_events(Job.objects.filter(id__in=job_ids))
+    return [
+        Claim(str(job_id), attempts, reclaimed=status == JobStatus.PROCESSING)
+        for job_id, attempts, status in rows
+    ]
+
+
+def renew_leases(job_ids: Iterable[str]) -> int:
+    """Extend the leases of the given jobs that are still processing; return how many."""
+    close_old_connections()
+    return Job.objects.filter(id__in=list(job_ids), status=JobStatus.PROCESSING).update(
+        lease_expires_at=lease_expiry()
+    )
+
+
+class AsyncJobRunner:
+    """Runs many GPT chains concurrently, bounded by a concurrency limit."""
+    
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        retry_countdown: Optional[float] = None,
+        processor: Optional[AsyncGPTChainProcessor] = None
+    ):
+        self.concurrency = concurrency or settings.ASYNC_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.ASYNC_WORKER_POLL_INTERVAL
+        self.retry_countdown = retry_countdown
+        self.processor = processor or AsyncGPTChainProcessor()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._busy = 0
+        self._tasks = set()
+        # Claimed jobs not yet finished, retries waiting included
+        self._held = set()
+    
+    async def process_job(
+        self,
+        job_id: str,
+        restart: bool = False,
+        reclaimed: bool = False,
+        usage: Optional[TokenUsage] = None
+    ) -> None:
+        """Run the two-step chain for one claimed job."""
+        job = await Job.objects.select_related('payload').aget(id=job_id)
+        if restart:
+            job.attempts += 1
+            await sync_to_async(start_job)(job)
+        elif not reclaimed:
+            # Claimed straight from pending; a reclaimed job waited on a lost worker
+            observe_queue_wait(job)
+        steps = JobStepStore(job)
+        
+        if job.pipeline == JobPipeline.SINGLE:
+            logger.info(f"Summarizing guideline with checklist for job {job_id}")
+            result = await steps.arun(COMBINED_STEP, lambda: self.processor.summarize_with_checklist(
+                job.guideline_text,
+                chunk_store=JobChunkStore(job)
+            ))
+            summary, checklist = result['summary'], result['checklist']
+        else:
+            logger.info(f"Summarizing guideline for job {job_id}")
+            summary = await steps.arun(SUMMARY_STEP, lambda: self.processor.summarize_guideline(
+                job.guideline_text,
+                chunk_store=JobChunkStore(job)
+            ))
+            
+            logger.info(f"Generating checklist for job {job_id}")
+            checklist = await steps.arun(
+                CHECKLIST_STEP,
+                lambda: self.processor.generate_checklist(summary)
+            )
+        
+        await sync_to_async(complete_job)(job, summary, checklist, usage)
+        logger.info(f"Successfully completed processing for job {job_id}")
+    
+    async def run_job(self, claim: Claim) -> None:
+        """
+        Process a claimed job, retrying failures like process_guideline_task.
+        
+        Attempts lost with a previous worker count towards the retry limit.
+        The job counts as busy from the moment it is claimed until it
+        finishes, except while it sleeps before a retry.
+        """
+        job_id = claim.job_id
+        try:
+            if claim.attempts > MAX_RETRIES:
+                logger.error(f"Max retries exceeded for job {job_id}")
+                error = RuntimeError("Every attempt was lost with the worker running it")
+                await sync_to_async(fail_job)(job_id, error, True)
+                return
+            for attempt in range(claim.attempts, MAX_RETRIES + 1):
+                async with self._slots:
+                    try:
+                        with track_job_usage() as usage:
+                            await self.process_job(
+                                job_id,
+                                restart=attempt > claim.attempts,
+                                reclaimed=claim.reclaimed,
+                                usage=usage
+                            )
+                        return
+                    except Job.DoesNotExist:
+                        logger.error(f"Job {job_id} not found")
+                        return
+                    except Exception as e:
+                        logger.error(f"Error processing job {job_id}: {str(e)}")
+                        final = attempt >= MAX_RETRIES
+                        await sync_to_async(fail_job)(job_id, e, final, usage)
+                        if final:
+                            logger.error(f"Max retries exceeded for job {job_id}")
+                            return
+                        logger.info(f"Retrying job {job_id} (attempt {attempt + 1})")
+                
+                # Wait outside the semaphore so the slot serves other jobs meanwhile
+                countdown = self.retry_countdown
+                if countdown is None:
+                    countdown = retry_backoff(attempt)
+                self._busy -= 1
+                await asyncio.sleep(countdown)
+                self._busy += 1
+        finally:
+            self._busy -= 1
+            self._held.discard(job_id)
+    
+    async def run_once(self) -> int:
+        """Claim as many jobs as there are free slots and start them."""
+        claims = await sync_to_async(claim_pending_jobs)(self.concurrency - self._busy)
+        self._busy += len(claims)
+        self._held.update(claim.job_id for claim in claims)
+        for claim in claims:
+            task = asyncio.create_task(self.run_job(claim))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(claims)
+    
+    async def renew_leases(self) -> None:
+        """Extend the leases of every job this worker holds."""
+        if not self._held:
+            return
+        try:
+            await sync_to_async(renew_leases)(list(self._held))
+        except Exception as e:
+            # Leases are long enough to survive a missed renewal
+            logger.warning(f"Could not renew job leases: {str(e)}")
+    
+    async def heartbeat(self) -> None:
+        """Renew the held leases every third of the lease, until cancelled."""
+        while True:
+            await asyncio.sleep(settings.ASYNC_WORKER_LEASE_SECONDS / 3)
+            await self.renew_leases()
+    
+    async def drain(self) -> None:
+        """Wait for every started job, including pending retries."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+    
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Poll for pending jobs until ``stop_event`` is set, then drain."""
+        logger.info(f"Async worker started with concurrency {self.concurrency}")
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            while not stop_event.is_set():
+                claimed = await self.run_once()
+                if claimed == 0 or self._busy >= self.concurrency:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            
+            logger.info("Async worker stopping, waiting for in-flight jobs")
+            await self.drain()
+        finally:
+            heartbeat.cancel()
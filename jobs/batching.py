@@ -0,0 +1,335 @@
+"""
+Deferred processing through the provider's batch API.
+
+Jobs created with ``"deferred": true`` are not queued for a worker. A
+periodic task collects them into a JSONL file of chat completion requests,
+uploads it and creates a batch; another periodic task polls open batches
+and writes the results back to the jobs in bulk. Batched requests are
+cheaper and draw on a separate rate limit, at the cost of latency up to
+the completion window, which suits overnight backfills.
+
+Chain jobs go through two batches (summaries, then checklists built from
+them) and single-call jobs through one. Each batch holds a single phase,
+since a batch file may only target one model. Jobs whose request fails
+in a batch, or whose text needs map-reduce, continue on the synchronous
+bulk queue, resuming from any step the batch already completed.
+"""
+import json
+import logging
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .clients import get_openai_client
+from .events import publish_job_events
+from .metrics import observe_job_finished, observe_queue_wait, record_token_usage
+from .models import Job, JobPipeline, JobStatus, JobStep, ProviderBatch, ProviderBatchStatus
+from .result_cache import resolve_followers
+from .routing import QUEUE_BULK
+from .steps import CHECKLIST_STEP, COMBINED_STEP, SUMMARY_STEP
+from .structured import StructuredOutputError, parse_result
+from .tasks import BaseGPTChainProcessor, enqueue_jobs
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+# Provider statuses of a batch that has not finished yet
+OPEN_PROVIDER_STATUSES = ('validating', 'in_progress', 'finalizing', 'cancelling')
+
+
+def build_batch_file(requests: Dict[Any, Dict[str, Any]]) -> bytes:
+    """Return the JSONL input file for chat completion requests keyed by job id."""
+    lines = [
+        json.dumps(
+            {'custom_id': str(job_id), 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': request},
+            separators=(',', ':')
+        )
+        for job_id, request in requests.items()
+    ]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def read_batch_output(content: str) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """Return the successful results of a batch output file as {job id: (content, body)}."""
+    results = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get('response') or {}
+        if item.get('error') or response.get('status_code') != 200:
+            continue
+        body = response.get('body') or {}
+        try:
+            text = body['choices'][0]['message']['content'].strip()
+        except (KeyError, IndexError, AttributeError):
+            continue
+        results[item['custom_id']] = (text, body)
+    return results
+
+
+def create_provider_batch(client, phase: str, requests: Dict[Any, Dict[str, Any]]) -> ProviderBatch:
+    """Upload the requests of one phase and create a provider batch for them."""
+    upload = client.files.create(file=(f'{phase}.jsonl', build_batch_file(requests)), purpose='batch')
+    batch = client.batches.create(
+        input_file_id=upload.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=settings.GPT_BATCH_COMPLETION_WINDOW,
+        metadata={'phase': phase}
+    )
+    provider_batch = ProviderBatch.objects.create(
+        provider_batch_id=batch.id,
+        phase=phase,
+        provider_status=batch.status,
+        input_file_id=upload.id,
+        job_count=len(requests)
+    )
+    Job.objects.filter(id__in=list(requests)).update(batch=provider_batch, updated_at=timezone.now())
+    logger.info(f"Submitted {phase} batch {batch.id} with {len(requests)} jobs")
+    return provider_batch
+
+
+def run_synchronously(job_ids: Iterable) -> None:
+    """Hand deferred jobs to the synchronous bulk queue."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+    Job.objects.filter(id__in=job_ids).update(
+        deferred=False,
+        batch=None,
+        status=JobStatus.PENDING,
+        updated_at=timezone.now()
+    )
+    # Publish only once workers can see the jobs as pending
+    transaction.on_commit(lambda: enqueue_jobs(job_ids, queue=QUEUE_BULK))
+
+
+def add_usage(job: Job, body: Dict[str, Any]) -> None:
+    """Count a batched response's usage for the metrics and the job."""
+    usage = body.get('usage')
+    if not usage:
+        return
+    usage = SimpleNamespace(**{'prompt_tokens': 0, 'completion_tokens': 0, **usage})
+    record_token_usage(usage, body.get('model', ''))
+    job.prompt_tokens += usage.prompt_tokens
+    job.completion_tokens += usage.completion_tokens
+
+
+def submit_phase(client, phase: str, requests: Dict[Any, Dict[str, Any]]) -> Optional[ProviderBatch]:
+    """
+    Submit the deferred jobs of one phase as a provider batch, in its own transaction.
+    
+    Only the jobs still waiting once their rows are locked are submitted.
+    The batch row and the jobs' assignment commit as soon as the provider
+    has accepted the batch, so a later failure cannot roll back the record
+    of a batch the provider runs and bills.
+    """
+    with transaction.atomic():
+        job_ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(id__in=list(requests), status=JobStatus.PENDING, deferred=True, batch__isnull=True)
+            .values_list('id', flat=True)
+        )
+        if not job_ids:
+            return None
+        provider_batch = create_provider_batch(client, phase, {job_id: requests[job_id] for job_id in job_ids})
+        Job.objects.filter(id__in=job_ids).update(
+            status=JobStatus.PROCESSING,
+            updated_at=timezone.now()
+        )
+    
+    publish_job_events(Job.objects.filter(id__in=job_ids))
+    return provider_batch
+
+
+def submit_deferred_jobs(client=None) -> List[ProviderBatch]:
+    """
+    Submit waiting deferred jobs as provider batches.
+    
+    Nothing is submitted until GPT_BATCH_MIN_JOBS jobs are waiting or the
+    oldest has waited GPT_BATCH_MAX_WAIT seconds. Rows are locked with
+    SKIP LOCKED so overlapping runs never submit a job twice; each phase's
+    batch is submitted and recorded in a transaction of its own.
+    """
+    client = client or get_openai_client()
+    processor = BaseGPTChainProcessor()
+    
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('payload')
+            .filter(status=JobStatus.PENDING, deferred=True, batch__isnull=True, source_job__isnull=True)
+            .order_by('created_at')[:settings.GPT_BATCH_MAX_JOBS]
+        )
+        if not jobs:
+            return []
+        oldest_wait = timezone.now() - jobs[0].created_at
+        if len(jobs) < settings.GPT_BATCH_MIN_JOBS and oldest_wait < timedelta(seconds=settings.GPT_BATCH_MAX_WAIT):
+            return []
+        
+        # Long texts need map-reduce, which stays on the synchronous path
+        direct = []
+        requests = {SUMMARY_STEP: {}, COMBINED_STEP: {}}
+        for job in jobs:
+            if len(job.guideline_text) > settings.GPT_CHUNK_THRESHOLD_CHARS:
+                direct.append(job.id)
+            elif job.pipeline == JobPipeline.SINGLE:
+                requests[COMBINED_STEP][job.id] = processor.build_combined_request(job.guideline_text)
+            else:
+                requests[SUMMARY_STEP][job.id] = processor.build_summary_request(job.guideline_text)
+        
+        run_synchronously(direct)
+    
+    batches = []
+    for phase, phase_requests in requests.items():
+        provider_batch = submit_phase(client, phase, phase_requests) if phase_requests else None
+        if provider_batch is None:
+            continue
+        batches.append(provider_batch)
+        for job in jobs:
+            if job.id in phase_requests:
+                observe_queue_wait(job)
+    return batches
+
+
+def store_summaries(client, jobs: List[Job], results: Dict) -> None:
+    """Checkpoint batched summaries and submit the checklist batch built from them."""
+    processor = BaseGPTChainProcessor()
+    now = timezone.now()
+    steps = []
+    requests = {}
+    for job in jobs:
+        summary, body = results[str(job.id)]
+        add_usage(job, body)
+        steps.append(JobStep(job=job, name=SUMMARY_STEP, output=summary, attempts=1, completed_at=now))
+        requests[job.id] = processor.build_checklist_request(summary)
+    
+    JobStep.objects.bulk_create(
+        steps,
+        update_conflicts=True,
+        unique_fields=['job', 'name'],
+        update_fields=['output', 'error_message', 'completed_at', 'updated_at']
+    )
+    Job.objects.bulk_update(jobs, ['prompt_tokens', 'completion_tokens'], batch_size=500)
+    if requests:
+        create_provider_batch(client, CHECKLIST_STEP, requests)
+
+
+def complete_batched_jobs(phase: str, jobs: List[Job], results: Dict) -> List:
+    """
+    Write the results of a final-phase batch to its jobs in bulk.
+    
+    Returns the ids of jobs whose output could not be used.
+    """
+    processor = BaseGPTChainProcessor()
+    summaries = {}
+    if phase == CHECKLIST_STEP:
+        summaries = dict(
+            JobStep.objects.filter(job__in=jobs, name=SUMMARY_STEP, completed_at__isnull=False)
+            .values_list('job_id', 'output')
+        )
+    
+    completed = []
+    unusable = []
+    for job in jobs:
+        content, body = results[str(job.id)]
+        add_usage(job, body)
+        if phase == CHECKLIST_STEP:
+            summary = summaries.get(job.id)
+            if summary is None:
+                unusable.append(job.id)
+                continue
+            checklist = processor.parse_checklist(content)
+        else:
+            try:
+                result = parse_result(content)
+            except StructuredOutputError:
+                unusable.append(job.id)
+                continue
+            summary, checklist = result['summary'], result['checklist']
+        
+        job.summary = summary
+        job.checklist = checklist
+        job.partial_result = None
+        job.error_message = None
+        job.status = JobStatus.COMPLETED
+        completed.append(job)
+    
+    # Unusable jobs keep the usage of the request that produced nothing
+    Job.objects.bulk_update(
+        [job for job in jobs if job.id in unusable],
+        ['prompt_tokens', 'completion_tokens'],
+        batch_size=500
+    )
+    Job.bulk_save_results(
+        completed,
+        ['status', 'partial_result', 'error_message', 'prompt_tokens', 'completion_tokens']
+    )
+    publish_job_events(completed)
+    for job in completed:
+        observe_job_finished(job)
+        resolve_followers(job)
+    return unusable
+
+
+def collect_batch(client, provider_batch: ProviderBatch, batch) -> None:
+    """Fan a finished provider batch out to its jobs."""
+    results = {}
+    if batch.output_file_id:
+        results = read_batch_output(client.files.content(batch.output_file_id).text)
+    
+    jobs = list(provider_batch.jobs.select_related('payload').filter(status=JobStatus.PROCESSING))
+    done = [job for job in jobs if str(job.id) in results]
+    retry = [job.id for job in jobs if str(job.id) not in results]
+    
+    if provider_batch.phase == SUMMARY_STEP:
+        store_summaries(client, done, results)
+    else:
+        retry += complete_batched_jobs(provider_batch.phase, done, results)
+    
+    provider_batch.status = (
+        ProviderBatchStatus.COMPLETED if batch.status == 'completed' else ProviderBatchStatus.FAILED
+    )
+    provider_batch.provider_status = batch.status
+    provider_batch.output_file_id = batch.output_file_id
+    provider_batch.error_file_id = batch.error_file_id
+    provider_batch.completed_at = timezone.now()
+    provider_batch.save()
+    
+    if retry:
+        logger.warning(
+            f"{len(retry)} of {len(jobs)} jobs in batch {provider_batch.provider_batch_id} "
+            f"get no result, continuing them synchronously"
+        )
+    run_synchronously(retry)
+
+
+def poll_provider_batches(client=None) -> int:
+    """Collect every submitted batch the provider has finished; return how many."""
+    client = client or get_openai_client()
+    collected = 0
+    for batch_id in ProviderBatch.objects.filter(status=ProviderBatchStatus.SUBMITTED).values_list('id', flat=True):
+        with transaction.atomic():
+            provider_batch = (
+                ProviderBatch.objects.select_for_update(skip_locked=True)
+                .filter(id=batch_id, status=ProviderBatchStatus.SUBMITTED)
+                .first()
+            )
+            if provider_batch is None:
+                continue
+            
+            batch = client.batches.retrieve(provider_batch.provider_batch_id)
+            if batch.status in OPEN_PROVIDER_STATUSES:
+                if batch.status != provider_batch.provider_status:
+                    provider_batch.provider_status = batch.status
+                    provider_batch.save(update_fields=['provider_status', 'updated_at'])
+                continue
+            
+            collect_batch(client, provider_batch, batch)
+            collected += 1
+    return collected
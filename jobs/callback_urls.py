@@ -0,0 +1,108 @@
+"""
+Guard callback URLs against requests into the deployment's own network.
+
+Webhooks are POSTed from inside the cluster, so a callback URL naming a
+loopback, private, link-local or otherwise non-public address would let any
+client reach internal services and metadata endpoints through the
+dispatcher. A callback host is resolved and every address checked when the
+job is created, and again right before each delivery. The delivery then
+connects to the address it checked, so the name cannot be rebound to an
+internal address in between. Hosts and networks listed in
+WEBHOOK_ALLOWED_HOSTS are exempt, for local receivers in development and
+tests.
+"""
+import asyncio
+import ipaddress
+import socket
+from typing import Dict, List, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+
+class UnsafeCallbackURL(ValueError):
+    """The callback URL's host is not a public address."""
+
+
+def split_host(url: str) -> Tuple[str, int]:
+    """Return the host and port a URL connects to."""
+    parts = urlsplit(url)
+    return parts.hostname or '', parts.port or (443 if parts.scheme == 'https' else 80)
+
+
+def is_allowed_host(host: str) -> bool:
+    """Return True if the host is listed by name in WEBHOOK_ALLOWED_HOSTS."""
+    return host.lower() in {entry.lower() for entry in settings.WEBHOOK_ALLOWED_HOSTS}
+
+
+def allowed_networks() -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """Return the networks listed in WEBHOOK_ALLOWED_HOSTS."""
+    networks = []
+    for entry in settings.WEBHOOK_ALLOWED_HOSTS:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            continue
+    return networks
+
+
+def check_addresses(host: str, addresses: List[str]) -> None:
+    """Raise UnsafeCallbackURL unless every address of the host is public or allowed."""
+    if not addresses:
+        raise UnsafeCallbackURL(f"Callback host {host} does not resolve.")
+    networks = allowed_networks()
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if any(ip in network for network in networks):
+            continue
+        if not ip.is_global or ip.is_multicast:
+            raise UnsafeCallbackURL(f"Callback host {host} resolves to non-public address {ip}.")
+
+
+def resolve(host: str, port: int) -> List[str]:
+    """Return the addresses a host resolves to."""
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return []
+    return [info[4][0] for info in infos]
+
+
+async def aresolve(host: str, port: int) -> List[str]:
+    """Async variant of resolve, on the event loop's resolver."""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return []
+    return [info[4][0] for info in infos]
+
+
+def check_callback_url(url: str) -> None:
+    """Raise UnsafeCallbackURL if the URL's host resolves to a non-public address."""
+    host, port = split_host(url)
+    if is_allowed_host(host):
+        return
+    check_addresses(host, resolve(host, port))
+
+
+async def pin_callback_url(url: str) -> Tuple[str, Dict[str, str], Dict[str, str]]:
+    """
+    Resolve and check a callback URL for one delivery.
+    
+    Returns the URL to connect to, with the host replaced by its first
+    checked address, and the headers and request extensions that keep the
+    Host header and TLS server name of the original host. Raises
+    UnsafeCallbackURL like check_callback_url.
+    """
+    host, port = split_host(url)
+    if is_allowed_host(host):
+        return url, {}, {}
+    addresses = await aresolve(host, port)
+    check_addresses(host, addresses)
+    
+    original = httpx.URL(url)
+    pinned = original.copy_with(host=addresses[0].split('%')[0])
+    return str(pinned), {'Host': original.netloc.decode('ascii')}, {'sni_hostname': host}
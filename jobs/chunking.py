@@ -0,0 +1,244 @@
+"""
+Chunking helpers for map-reduce summarization of long guidelines.
+
+Long texts are split on section and paragraph boundaries, each chunk is
+summarized independently, and the chunk summaries are reduced into the final
+summary. Chunk summaries are persisted as they complete so a retry only
+redoes the chunks that failed.
+
+A job created as a revision of an earlier one (``parent_event_id``) is
+split along the parent's chunks: chunks whose text is unchanged keep the
+parent's stored summary, and only the edited parts are summarized again.
+"""
+import difflib
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from .metrics import CHUNK_SUMMARIES
+from .models import Job, JobChunk
+from .payloads import compress_text, decompress_text
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?;:])\s+')
+_HEADING_RE = re.compile(
+    r'^(#{1,6}\s'
+    r'|\d+(\.\d+)*[.)]?\s+\S'
+    r'|(section|article|chapter|part|appendix)\s+\w+'
+    r'|[A-Z][A-Z0-9 ,&/()-]{3,}$)',
+    re.IGNORECASE
+)
+
+
+def chunk_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_heading(paragraph: str) -> bool:
+    """Return True if a paragraph starts with something that looks like a heading."""
+    first_line = paragraph.lstrip().split('\n', 1)[0].strip()
+    return len(first_line) <= 120 and bool(_HEADING_RE.match(first_line))
+
+
+def _split_oversized(paragraph: str, max_chars: int) -> List[str]:
+    """Split a paragraph longer than max_chars on sentences, then hard-wrap."""
+    pieces = []
+    current = ''
+    for sentence in _SENTENCE_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_segments(text: str, max_chars: int) -> List[str]:
+    """Split text into paragraphs, breaking up any longer than max_chars."""
+    segments = []
+    for paragraph in _PARAGRAPH_RE.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        segments.extend([paragraph] if len(paragraph) <= max_chars else _split_oversized(paragraph, max_chars))
+    return segments
+
+
+def pack_segments(segments: List[str], max_chars: int) -> List[str]:
+    """
+    Pack segments greedily into chunks of at most max_chars characters.
+    
+    A heading starts a new chunk once the current one is at least half
+    full, so sections tend to stay together.
+    """
+    chunks = []
+    current = []
+    current_len = 0
+    
+    for segment in segments:
+        starts_section = is_heading(segment) and current_len >= max_chars // 2
+        if current and (current_len + 2 + len(segment) > max_chars or starts_section):
+            chunks.append('\n\n'.join(current))
+            current = []
+            current_len = 0
+        current.append(segment)
+        current_len += len(segment) + (2 if current_len else 0)
+    
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def split_into_chunks(text: str, max_chars: int) -> List[str]:
+    """Split text into chunks of at most max_chars characters."""
+    return pack_segments(split_into_segments(text, max_chars), max_chars)
+
+
+def split_revision(previous_chunks: List[str], text: str, max_chars: int) -> List[str]:
+    """
+    Split a revised text so chunks unchanged since the previous version stay intact.
+    
+    The segments of both versions are diffed. A previous chunk whose
+    segments all survive, in order and next to each other, is kept as one
+    chunk with exactly its old text; the segments in between are packed
+    into new chunks. Packing the revision from scratch instead would move
+    every chunk boundary after the first edit.
+    """
+    segments = split_into_segments(text, max_chars)
+    previous = [chunk.split('\n\n') for chunk in previous_chunks]
+    previous_segments = [segment for chunk in previous for segment in chunk]
+    
+    # Position in the revision of every previous segment that survived
+    moved_to = {}
+    matcher = difflib.SequenceMatcher(None, previous_segments, segments, autojunk=False)
+    for start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            moved_to[start + offset] = new_start + offset
+    
+    # Matches are in order, so a chunk whose segments all survived is intact
+    # unless something was inserted between them
+    kept = {}
+    start = 0
+    for chunk in previous:
+        end = start + len(chunk)
+        survived = all(position in moved_to for position in range(start, end))
+        if survived and moved_to[end - 1] - moved_to[start] == end - 1 - start:
+            kept[moved_to[start]] = (moved_to[end - 1] + 1, '\n\n'.join(chunk))
+        start = end
+    
+    chunks = []
+    edited = []
+    position = 0
+    while position < len(segments):
+        if position in kept:
+            chunks.extend(pack_segments(edited, max_chars))
+            edited = []
+            position, chunk = kept[position]
+            chunks.append(chunk)
+        else:
+            edited.append(segments[position])
+            position += 1
+    chunks.extend(pack_segments(edited, max_chars))
+    return chunks
+
+
+class JobChunkStore:
+    """
+    Persists chunk summaries for a job so retries can skip finished chunks.
+    
+    For a revision, summaries of the parent's chunks are reused by content
+    hash once previous_chunks has loaded them.
+    """
+    
+    def __init__(self, job: Job):
+        self.job = job
+        self.parent_summaries = {}
+        self.inherited = {}
+    
+    def previous_chunks(self) -> Optional[List[str]]:
+        """
+        Return the chunks of the parent version and load their summaries.
+        
+        Returns None if the job is not a revision or its parent stored no
+        chunk summaries (it was short, or is gone). The chunks are the ones
+        the parent was actually summarized in, which for a parent that was
+        itself a revision are not those a fresh split of its text gives.
+        """
+        if self.job.parent_id is None:
+            return None
+        rows = list(
+            JobChunk.objects.filter(job_id=self.job.parent_id)
+            .order_by('index')
+            .values_list('content_hash', 'summary', 'compressed_text')
+        )
+        if not rows:
+            return None
+        self.parent_summaries = {content_hash: summary for content_hash, summary, _ in rows}
+        if all(compressed is not None for _, _, compressed in rows):
+            return [decompress_text(compressed) for _, _, compressed in rows]
+        
+        # Chunks stored without their text: split the parent's text afresh
+        parent = Job.objects.select_related('payload').get(id=self.job.parent_id)
+        return split_into_chunks(parent.guideline_text, settings.GPT_CHUNK_SIZE_CHARS)
+    
+    def load(self) -> Dict[int, JobChunk]:
+        """Return the stored chunks of the job keyed by index."""
+        return {chunk.index: chunk for chunk in JobChunk.objects.filter(job=self.job)}
+    
+    def get_summary(self, stored: Dict[int, JobChunk], index: int, text: str):
+        """Return a stored summary for a chunk if its text is unchanged."""
+        content_hash = chunk_hash(text)
+        chunk = stored.get(index)
+        if chunk is not None and chunk.content_hash == content_hash:
+            return chunk.summary
+        summary = self.parent_summaries.get(content_hash)
+        if summary is not None:
+            self.inherited[index] = (text, summary)
+        return summary
+    
+    def save_inherited(self) -> None:
+        """
+        Store the summaries taken over from the parent as the job's own.
+        
+        Retries then find them like any finished chunk, and a later
+        revision of this job can reuse them in turn.
+        """
+        if not self.inherited:
+            return
+        JobChunk.objects.bulk_create(
+            [
+                JobChunk(
+                    job=self.job,
+                    index=index,
+                    content_hash=chunk_hash(text),
+                    compressed_text=compress_text(text),
+                    summary=summary
+                )
+                for index, (text, summary) in self.inherited.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['job', 'index'],
+            update_fields=['content_hash', 'compressed_text', 'summary']
+        )
+        CHUNK_SUMMARIES.labels('parent').inc(len(self.inherited))
+        self.inherited = {}
+    
+    def save(self, index: int, text: str, summary: str) -> None:
+        """Store the summary of one chunk as soon as it completes."""
+        JobChunk.objects.update_or_create(
+            job=self.job,
+            index=index,
+            defaults={'content_hash': chunk_hash(text), 'compressed_text': compress_text(text), 'summary': summary}
+        )
+        CHUNK_SUMMARIES.labels('model').inc()
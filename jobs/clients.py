@@ -0,0 +1,113 @@
+"""
+Process-wide OpenAI clients with pooled keep-alive connections.
+
+Building an OpenAI client creates a new httpx connection pool, so building
+one per job pays a fresh TCP and TLS handshake on every task. Workers instead
+share one client per process. The registry is fork-safe: a forked child (for
+example a Celery prefork worker) never reuses its parent's sockets and builds
+its own client on first use.
+"""
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+
+from .ratelimit import aobserve_response, observe_response
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.OPENAI_POOL_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT)
+
+
+def build_openai_client() -> OpenAI:
+    """Build a new client with its own connection pool."""
+    return OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        timeout=_timeout(),
+        http_client=httpx.Client(
+            limits=_pool_limits(),
+            timeout=_timeout(),
+            event_hooks={'response': [observe_response]}
+        )
+    )
+
+
+def build_async_openai_client() -> AsyncOpenAI:
+    """Build a new async client with its own connection pool."""
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        timeout=_timeout(),
+        http_client=httpx.AsyncClient(
+            limits=_pool_limits(),
+            timeout=_timeout(),
+            event_hooks={'response': [aobserve_response]}
+        )
+    )
+
+
+def get_openai_client() -> OpenAI:
+    """Return this process's shared client, building it on first use."""
+    global _client, _client_pid
+    
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = build_openai_client()
+                _client_pid = pid
+    return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Return the shared async client for the running event loop.
+    
+    Async connection pools are bound to the loop that created them, so each
+    loop gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = build_async_openai_client()
+        _async_clients[loop] = client
+    return client
+
+
+def reset_clients() -> None:
+    """
+    Forget the shared clients without closing them.
+    
+    Called in a forked child: the inherited sockets belong to the parent, so
+    they are dropped rather than closed and the child builds fresh pools.
+    """
+    global _client, _client_pid, _lock
+    
+    _lock = threading.Lock()
+    _client = None
+    _client_pid = None
+    _async_clients.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_clients)
@@ -0,0 +1,212 @@
+"""
+Job status events published over Redis pub/sub.
+
+Workers publish the serialized job on every status transition so that
+streaming and long-poll clients are pushed updates instead of polling the
+database, and jobs that reach a terminal status get their completion
+webhook scheduled. The ``a``-prefixed helpers are the asyncio counterparts
+used by the async views.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+from typing import AsyncIterator, Iterable, Iterator, Optional, Tuple
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Job
+from .serializers import JobSerializer
+from .status_cache import (
+    TERMINAL_STATUSES,
+    aread_job_status,
+    read_job_status,
+    status_cache_key,
+    store_job_status,
+)
+from .webhooks import schedule_webhooks
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+_async_redis_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis_client() -> redis.Redis:
+    """Return the process-wide Redis client used for job events."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.JOB_EVENTS_REDIS_URL)
+    return _redis_client
+
+
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    Return the asyncio Redis client for the running event loop.
+    
+    Async connection pools are bound to the loop that created them, so each
+    loop gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_redis_clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(settings.JOB_EVENTS_REDIS_URL)
+        _async_redis_clients[loop] = client
+    return client
+
+
+def job_channel(job_id) -> str:
+    """Return the pub/sub channel name for a job."""
+    return f'jobs:events:{job_id}'
+
+
+def serialize_job_event(job: Job) -> dict:
+    """Return the event payload for a job (same shape as the status endpoint)."""
+    return JobSerializer(job).data
+
+
+def publish_job_events(jobs: Iterable[Job]) -> None:
+    """
+    Publish the current state of each job to its channel.
+    
+    The cached status response of each job is refreshed in the same round
+    trip. Publishing is best effort: a Redis outage must never fail job
+    processing, since clients can always fall back to the status endpoint.
+    Webhooks are scheduled in the database, so they survive such an outage.
+    """
+    jobs = list(jobs)
+    schedule_webhooks(jobs)
+    try:
+        pipeline = get_redis_client().pipeline(transaction=False)
+        for job in jobs:
+            data = serialize_job_event(job)
+            pipeline.publish(job_channel(job.id), json.dumps(data, cls=DjangoJSONEncoder))
+            store_job_status(pipeline, job, data)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish job events: {str(e)}")
+
+
+def publish_job_event(job: Job) -> None:
+    """Publish the current state of a single job."""
+    publish_job_events([job])
+
+
+def get_cached_job_status(job_id) -> Optional[Tuple[str, bytes]]:
+    """Return a job's cached (etag, body) status response, or None."""
+    try:
+        return read_job_status(get_redis_client(), job_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read cached status for job {job_id}: {str(e)}")
+        return None
+
+
+async def aget_cached_job_status(job_id) -> Optional[Tuple[str, bytes]]:
+    """Async variant of get_cached_job_status."""
+    try:
+        return await aread_job_status(get_async_redis_client(), job_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read cached status for job {job_id}: {str(e)}")
+        return None
+
+
+def drop_cached_job_statuses(job_ids) -> None:
+    """Remove cached status responses, e.g. after jobs were purged."""
+    keys = [status_cache_key(job_id) for job_id in job_ids]
+    if not keys:
+        return
+    try:
+        get_redis_client().delete(*keys)
+    except redis.RedisError as e:
+        logger.warning(f"Could not drop cached job statuses: {str(e)}")
+
+
+def cache_job_status(job: Job, data: dict) -> None:
+    """Write a terminal job's status response to the cache after a miss."""
+    if job.status not in TERMINAL_STATUSES:
+        return
+    try:
+        pipeline = get_redis_client().pipeline(transaction=False)
+        store_job_status(pipeline, job, data)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not cache status for job {job.id}: {str(e)}")
+
+
+async def acache_job_status(job: Job, data: dict) -> None:
+    """Async variant of cache_job_status."""
+    if job.status not in TERMINAL_STATUSES:
+        return
+    try:
+        pipeline = get_async_redis_client().pipeline(transaction=False)
+        store_job_status(pipeline, job, data)
+        await pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not cache status for job {job.id}: {str(e)}")
+
+
+def subscribe(job_id):
+    """Subscribe to a job's channel and return the pub/sub handle."""
+    pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(job_channel(job_id))
+    return pubsub
+
+
+def next_job_event(pubsub, timeout: float) -> Optional[dict]:
+    """Wait up to ``timeout`` seconds for the next event on a subscription."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        message = pubsub.get_message(timeout=remaining)
+        if message and message.get('type') == 'message':
+            return json.loads(message['data'])
+
+
+def iter_job_events(pubsub, heartbeat: float, max_duration: float) -> Iterator[Optional[dict]]:
+    """
+    Yield events from a subscription until a terminal status or max_duration.
+    
+    Yields None every ``heartbeat`` seconds without an event so callers can
+    keep the connection alive.
+    """
+    deadline = time.monotonic() + max_duration
+    while time.monotonic() < deadline:
+        event = next_job_event(pubsub, min(heartbeat, deadline - time.monotonic()))
+        yield event
+        if event and event.get('status') in TERMINAL_STATUSES:
+            return
+
+
+async def asubscribe(job_id):
+    """Async variant of subscribe."""
+    pubsub = get_async_redis_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(job_channel(job_id))
+    return pubsub
+
+
+async def anext_job_event(pubsub, timeout: float) -> Optional[dict]:
+    """Async variant of next_job_event."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        message = await pubsub.get_message(timeout=remaining)
+        if message and message.get('type') == 'message':
+            return json.loads(message['data'])
+
+
+async def aiter_job_events(pubsub, heartbeat: float, max_duration: float) -> AsyncIterator[Optional[dict]]:
+    """Async variant of iter_job_events."""
+    deadline = time.monotonic() + max_duration
+    while time.monotonic() < deadline:
+        event = await anext_job_event(pubsub, min(heartbeat, deadline - time.monotonic()))
+        yield event
+        if event and event.get('status') in TERMINAL_STATUSES:
+            return
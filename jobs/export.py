@@ -0,0 +1,167 @@
+"""
+Streaming NDJSON export of completed job results.
+
+Completed jobs are read through a server-side cursor (``.iterator()``) in
+chunks of JOB_EXPORT_CHUNK_SIZE rows and written out one JSON object per
+line, gzip-compressed on the fly if asked, so memory use stays flat however
+many rows are exported. Only the narrow job columns and the compressed
+result are read; guideline texts are never loaded.
+
+Lines are ordered by (updated_at, id). For incremental pulls, pass the
+``updated_at`` of the last line received as ``updated_after`` next time.
+A job's updated_at is taken before its transaction commits, so a job can
+become visible after a pull that already went past its timestamp. The
+lower bound is therefore moved back by JOB_EXPORT_WATERMARK_OVERLAP
+seconds: jobs from the overlap are sent again and should be deduplicated
+on (event_id, updated_at), while a job updated since its last line comes
+back with a newer updated_at. Jobs already moved to the archive by the
+retention task are not exported.
+"""
+import json
+import re
+import zlib
+from datetime import timedelta
+from itertools import islice
+from typing import AsyncIterator, Iterator, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.fields import DateTimeField
+
+from .models import Job, JobStatus
+from .payloads import decompress_result
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Lines are sent in chunks of about this size rather than one write per line
+BUFFER_BYTES = 64 * 1024
+
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+_timestamp = DateTimeField().to_representation
+
+
+def accepts_gzip(request) -> bool:
+    return bool(_ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')))
+
+
+class JobExport:
+    """Completed jobs matching the watermarks, rendered as NDJSON lines."""
+    
+    def __init__(
+        self,
+        created_after=None,
+        created_before=None,
+        updated_after=None,
+        updated_before=None,
+        chunk_size: Optional[int] = None
+    ):
+        jobs = Job.objects.filter(status=JobStatus.COMPLETED, payload__compressed_result__isnull=False)
+        if created_after is not None:
+            jobs = jobs.filter(created_at__gte=created_after)
+        if created_before is not None:
+            jobs = jobs.filter(created_at__lt=created_before)
+        if updated_after is not None:
+            overlap = timedelta(seconds=settings.JOB_EXPORT_WATERMARK_OVERLAP)
+            jobs = jobs.filter(updated_at__gte=updated_after - overlap)
+        if updated_before is not None:
+            jobs = jobs.filter(updated_at__lt=updated_before)
+        self.queryset: QuerySet = jobs.order_by('updated_at', 'id').values_list(
+            'id', 'created_at', 'updated_at', 'payload__compressed_result'
+        )
+        self.chunk_size = chunk_size or settings.JOB_EXPORT_CHUNK_SIZE
+        self.count = 0
+        self.watermark = None
+    
+    def render(self, row) -> bytes:
+        """Return one job as a line shaped like its status response."""
+        job_id, created_at, updated_at, compressed_result = row
+        summary, checklist = decompress_result(compressed_result)
+        self.count += 1
+        self.watermark = updated_at
+        line = {
+            'event_id': str(job_id),
+            'status': JobStatus.COMPLETED,
+            'result': {'summary': summary, 'checklist': checklist},
+            'created_at': _timestamp(created_at),
+            'updated_at': _timestamp(updated_at),
+        }
+        return json.dumps(line, separators=(',', ':')).encode('utf-8') + b'\n'
+    
+    def lines(self) -> Iterator[bytes]:
+        for row in self.queryset.iterator(chunk_size=self.chunk_size):
+            yield self.render(row)
+    
+    async def alines(self) -> AsyncIterator[bytes]:
+        # QuerySet.aiterator() starts values_list queries on the event loop in
+        # Django 4.2, so the sync cursor is advanced one chunk per ORM-thread hop
+        rows = self.queryset.iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = await sync_to_async(_next_chunk)(rows, self.chunk_size)
+            for row in chunk:
+                yield self.render(row)
+            if len(chunk) < self.chunk_size:
+                return
+
+
+def _next_chunk(rows: Iterator, size: int) -> List:
+    return list(islice(rows, size))
+
+
+class ExportWriter:
+    """Buffers lines into chunks of about BUFFER_BYTES, gzip-compressing them if asked."""
+    
+    def __init__(self, compress: bool = False):
+        # wbits 16 + MAX_WBITS writes a gzip header and trailer
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+        self._buffer = []
+        self._size = 0
+    
+    def write(self, line: bytes) -> bytes:
+        """Add a line; return the data ready to send, possibly nothing."""
+        self._buffer.append(line)
+        self._size += len(line)
+        return self._drain() if self._size >= BUFFER_BYTES else b''
+    
+    def close(self) -> bytes:
+        """Return everything still buffered, with the gzip trailer."""
+        data = self._drain()
+        return data + self._compressor.flush() if self._compressor else data
+    
+    def _drain(self) -> bytes:
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        return self._compressor.compress(data) if self._compressor else data
+
+
+def stream_export(export: JobExport, compress: bool = False) -> Iterator[bytes]:
+    """Yield the export as NDJSON chunks."""
+    writer = ExportWriter(compress)
+    for line in export.lines():
+        data = writer.write(line)
+        if data:
+            yield data
+    yield writer.close()
+
+
+async def astream_export(export: JobExport, compress: bool = False) -> AsyncIterator[bytes]:
+    """Async variant of stream_export; an ASGI server buffers sync iterators in full."""
+    writer = ExportWriter(compress)
+    async for line in export.alines():
+        data = writer.write(line)
+        if data:
+            yield data
+    yield writer.close()
+
+
+def export_response(content, compress: bool) -> StreamingHttpResponse:
+    """Wrap an export stream in a response, gzip-encoded if ``compress``."""
+    response = StreamingHttpResponse(content, content_type=NDJSON_CONTENT_TYPE)
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,291 @@
+"""
+Hedged OpenAI requests to cut the tail latency of GPT steps.
+
+A call that has not answered after the GPT_HEDGE_PERCENTILE of recent
+latencies for calls like it (same model and output size, so chunk
+summaries, reduce passes and checklists each have their own) gets a
+duplicate, sent to GPT_HEDGE_MODEL if one is set. The first successful
+answer is used and the other request is cancelled; if one of them fails,
+the other's answer is still taken. A sync request cannot be interrupted,
+so a losing one gives its rate limiter slot back as soon as the winner
+answers and settles its token usage once it finishes.
+
+Hedges are paid for from a budget: every call earns GPT_HEDGE_BUDGET of a
+hedge, and up to GPT_HEDGE_BUDGET_BURST unspent hedges are kept. Hedges
+therefore stay a fixed share of traffic even when the provider slows down
+as a whole and every call would cross the threshold.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .metrics import HEDGED_REQUESTS
+
+LatencyKey = Tuple[str, Any]
+
+
+class AbandonedCall(Exception):
+    """Raised in a sync hedged request that lost before it was sent."""
+
+
+class HedgedCall:
+    """One request of a sync hedge, seen from the thread sending it."""
+    
+    def __init__(self):
+        self.abandoned = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+    
+    def on_abandon(self, callback: Callable[[], None]) -> None:
+        """Run ``callback`` once the request loses, or now if it already has."""
+        with self._lock:
+            if not self.abandoned:
+                self._callbacks.append(callback)
+                return
+        callback()
+    
+    def abandon(self) -> None:
+        """Mark the request as lost and run its callbacks."""
+        with self._lock:
+            self.abandoned = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+_current_call: contextvars.ContextVar = contextvars.ContextVar('hedged_call', default=None)
+
+
+def raise_if_abandoned() -> None:
+    """Stop a sync hedged request whose twin already answered."""
+    call = _current_call.get()
+    if call is not None and call.abandoned:
+        raise AbandonedCall("The other request of the hedge already answered")
+
+
+def on_abandon(callback: Callable[[], None]) -> None:
+    """Run ``callback`` if the current sync hedged request loses; no-op outside a hedge."""
+    call = _current_call.get()
+    if call is not None:
+        call.on_abandon(callback)
+
+
+def latency_key(request: Dict[str, Any]) -> LatencyKey:
+    """Return the key of the latency distribution a request belongs to."""
+    return request['model'], request.get('max_tokens')
+
+
+class LatencyTracker:
+    """Recent latencies of successful calls, per kind of request."""
+    
+    def __init__(self, window: int, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[LatencyKey, deque] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, key: LatencyKey, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+    
+    def percentile(self, key: LatencyKey, pct: float) -> Optional[float]:
+        """Return the pct-th percentile of the key's latencies, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class HedgeBudget:
+    """Token bucket that limits hedges to a share of all calls."""
+    
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._balance = burst
+        self._lock = threading.Lock()
+    
+    def deposit(self) -> None:
+        """Credit one call."""
+        with self._lock:
+            self._balance = min(self.burst, self._balance + self.ratio)
+    
+    def withdraw(self) -> bool:
+        """Take one hedge from the budget, if it has one left."""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class Hedger:
+    """
+    Runs calls with a hedge after the tracked latency percentile.
+    
+    ``send`` performs one complete call, rate limiter slot included, for
+    the request it is given. On the sync path the call runs on a thread
+    pool; a losing sync request cannot be interrupted, so it finishes in
+    the background and its answer is dropped. ``send`` frees its slot
+    early through on_abandon and stops at raise_if_abandoned if it has not
+    been sent yet. Async losers are cancelled.
+    """
+    
+    def __init__(
+        self,
+        percentile: Optional[float] = None,
+        min_delay: Optional[float] = None,
+        model: Optional[str] = None,
+        tracker: Optional[LatencyTracker] = None,
+        budget: Optional[HedgeBudget] = None,
+        threads: Optional[int] = None
+    ):
+        self.percentile = percentile or settings.GPT_HEDGE_PERCENTILE
+        self.min_delay = settings.GPT_HEDGE_MIN_DELAY if min_delay is None else min_delay
+        self.model = model if model is not None else settings.GPT_HEDGE_MODEL
+        self.tracker = tracker or LatencyTracker(settings.GPT_HEDGE_WINDOW, settings.GPT_HEDGE_MIN_SAMPLES)
+        self.budget = budget or HedgeBudget(settings.GPT_HEDGE_BUDGET, settings.GPT_HEDGE_BUDGET_BURST)
+        self.threads = threads or settings.GPT_HEDGE_THREADS
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Created on first use, so forked worker processes each get their own
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='gpt-hedge')
+            return self._executor
+    
+    def delay(self, key: LatencyKey) -> Optional[float]:
+        """Return how long to wait before hedging, or None until enough latencies are known."""
+        threshold = self.tracker.percentile(key, self.percentile)
+        return None if threshold is None else max(threshold, self.min_delay)
+    
+    def hedge_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the duplicate of a request, on the fallback model if one is set."""
+        return {**request, 'model': self.model} if self.model else request
+    
+    def _recorder(self, key: LatencyKey, started: float) -> Callable[[Any], None]:
+        """
+        Return a done callback recording the primary call's latency.
+        
+        A cancelled primary is recorded with the time it ran, a lower bound
+        of its latency, so cancelled slow calls still raise the percentile.
+        """
+        def record(future) -> None:
+            if future.cancelled() or future.exception() is None:
+                self.tracker.record(key, time.monotonic() - started)
+        return record
+    
+    def run(self, request: Dict[str, Any], send: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Send a request, hedging it if it is slow, and return the first answer."""
+        self.budget.deposit()
+        key = latency_key(request)
+        delay = self.delay(key)
+        started = time.monotonic()
+        if delay is None:
+            result = send(request)
+            self.tracker.record(key, time.monotonic() - started)
+            return result
+        
+        primary, primary_call = self._submit(send, request)
+        primary.add_done_callback(self._recorder(key, started))
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._start_hedge():
+            return primary.result()
+        
+        hedge, hedge_call = self._submit(send, self.hedge_request(request))
+        calls = {primary: primary_call, hedge: hedge_call}
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = self._first_success(done, primary)
+            if winner is not None or not pending:
+                for future in pending:
+                    calls[future].abandon()
+                return self._finish(winner, primary, pending)
+    
+    def _submit(self, send: Callable[[Dict[str, Any]], Any], request: Dict[str, Any]):
+        """Start one sync request on the pool; return its future and HedgedCall."""
+        call = HedgedCall()
+        # Copy the context so the call counts towards the job's usage
+        context = contextvars.copy_context()
+        context.run(_current_call.set, call)
+        return self.executor.submit(context.run, send, request), call
+    
+    async def arun(self, request: Dict[str, Any], send: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        """Async variant of run; the losing request is cancelled."""
+        self.budget.deposit()
+        key = latency_key(request)
+        delay = self.delay(key)
+        started = time.monotonic()
+        if delay is None:
+            result = await send(request)
+            self.tracker.record(key, time.monotonic() - started)
+            return result
+        
+        primary = asyncio.ensure_future(send(request))
+        primary.add_done_callback(self._recorder(key, started))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._start_hedge():
+                return await primary
+            
+            hedge = asyncio.ensure_future(send(self.hedge_request(request)))
+            pending = {primary, hedge}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = self._first_success(done, primary)
+                if winner is not None or not pending:
+                    return self._finish(winner, primary, pending)
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+    
+    def _start_hedge(self) -> bool:
+        """Take a hedge from the budget, counting calls that find it empty."""
+        if self.budget.withdraw():
+            return True
+        HEDGED_REQUESTS.labels('no_budget').inc()
+        return False
+    
+    @staticmethod
+    def _first_success(done, primary):
+        """Return a finished call that succeeded, preferring the primary, or None."""
+        for future in sorted(done, key=lambda future: future is not primary):
+            if future.exception() is None:
+                return future
+        return None
+    
+    def _finish(self, winner, primary, pending) -> Any:
+        """Return the winning answer, or raise the primary's error if both failed."""
+        for future in pending:
+            future.cancel()
+        if winner is not None:
+            HEDGED_REQUESTS.labels('primary_won' if winner is primary else 'hedge_won').inc()
+            return winner.result()
+        HEDGED_REQUESTS.labels('both_failed').inc()
+        return primary.result()
+
+
+_hedger = None
+
+
+def get_hedger() -> Optional[Hedger]:
+    """Return the process-wide hedger, or None when hedging is off."""
+    global _hedger
+    if not settings.GPT_HEDGE_ENABLED:
+        return None
+    if _hedger is None:
+        _hedger = Hedger()
+    return _hedger
@@ -0,0 +1,407 @@
+"""
+Bulk ingest of a guideline corpus from a directory or an NDJSON file.
+
+The corpus is read in chunks of INGEST_CHUNK_SIZE items, files through a
+pool of INGEST_READERS threads, and each chunk is validated like a batch
+request, resolved against the result cache and written in one transaction.
+On PostgreSQL the job and payload rows are streamed in with ``COPY``
+instead of multi-row INSERTs. Jobs that have to run their own chain are
+then published to their queue in groups of INGEST_ENQUEUE_CHUNK_SIZE, at
+most INGEST_ENQUEUE_RATE jobs per second and only while the broker queue
+holds fewer than INGEST_MAX_QUEUE_DEPTH tasks, so workers drain the corpus
+without it crowding out the broker.
+
+Every item gets a job id derived from the corpus name and the item's key
+(its path in the directory, or its line number or ``key`` in the NDJSON
+file; an item repeating an earlier item's key is skipped as invalid), and
+the number of items fully handled is checkpointed to a state
+file after each chunk. An interrupted run started again skips the chunks
+before the checkpoint, does not insert jobs that already exist, and
+queues the jobs of the interrupted chunk that are still pending; those
+may be queued twice if the interruption came between publishing them and
+writing the checkpoint.
+"""
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from fnmatch import fnmatch
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .metrics import JobStateCollector
+from .models import Job, JobPayload, JobStatus
+from .result_cache import apply_result_cache_bulk, index_signatures, needs_processing, resolve_late_followers
+from .routing import PRIORITY_LOW
+from .serializers import JobCreateSerializer, missing_parent_errors
+from .tasks import enqueue_jobs
+from .views import build_job
+from .webhooks import schedule_webhooks
+
+logger = logging.getLogger(__name__)
+
+# Job ids are uuid5(INGEST_NAMESPACE, "<corpus>:<item key>")
+INGEST_NAMESPACE = uuid.UUID('5b0e6f7c-3f0a-4c55-9d5e-2a4b8f61c0d1')
+
+# Seconds between broker queue depth checks while it is over the limit
+QUEUE_DEPTH_POLL_INTERVAL = 1.0
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+CorpusItem = Tuple[str, Callable[[], dict]]
+
+
+def ingest_job_id(corpus: str, key: str) -> uuid.UUID:
+    """Return the id of the job ingested for an item of a corpus."""
+    return uuid.uuid5(INGEST_NAMESPACE, f"{corpus}:{key}")
+
+
+def copy_value(model_field: models.Field, value) -> str:
+    """Encode a model value as a field of PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(model_field, models.JSONField):
+        value = json.dumps(value, cls=model_field.encoder)
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea hex input; the backslash itself is escaped for COPY
+        return '\\\\x' + bytes(value).hex()
+    elif isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_rows(model, objs: List[models.Model]) -> Tuple[List[str], io.StringIO]:
+    """Return the columns of a model and its objects' rows as COPY text data."""
+    fields = model._meta.concrete_fields
+    data = io.StringIO()
+    for obj in objs:
+        # pre_save fills auto_now timestamps, as an INSERT through the ORM would
+        data.write('\t'.join(copy_value(model_field, model_field.pre_save(obj, True)) for model_field in fields))
+        data.write('\n')
+    data.seek(0)
+    return [model_field.column for model_field in fields], data
+
+
+def copy_into(model, objs: List[models.Model]) -> None:
+    """Insert new objects of a model with one COPY ... FROM STDIN."""
+    columns, data = copy_rows(model, objs)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote(model._meta.db_table)} ({', '.join(quote(column) for column in columns)}) FROM STDIN",
+            data
+        )
+
+
+def insert_jobs(jobs: List[Job]) -> None:
+    """Insert new jobs and their payloads, with COPY on PostgreSQL."""
+    if connection.vendor != 'postgresql':
+        Job.bulk_create_with_payloads(jobs)
+        return
+    payloads = [job.build_payload() for job in jobs]
+    with transaction.atomic():
+        copy_into(Job, jobs)
+        copy_into(JobPayload, payloads)
+    for job in jobs:
+        job._payload_dirty.clear()
+
+
+def directory_items(root: str, pattern: str = '*') -> Iterator[CorpusItem]:
+    """Yield the files under ``root`` matching ``pattern``, in path order, keyed by relative path."""
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+        for name in files:
+            if not name.startswith('.') and fnmatch(name, pattern):
+                paths.append(os.path.relpath(os.path.join(directory, name), root))
+    for path in sorted(paths):
+        yield path, _file_reader(os.path.join(root, path))
+
+
+def _file_reader(path: str) -> Callable[[], dict]:
+    def read() -> dict:
+        with open(path, encoding='utf-8') as f:
+            return {'guideline_text': f.read()}
+    return read
+
+
+def ndjson_items(path: str) -> Iterator[CorpusItem]:
+    """
+    Yield the objects of an NDJSON file, keyed by their ``key`` or line number.
+    
+    Each object holds the fields of a job creation request; blank lines are skipped.
+    """
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                yield _ndjson_key(line, number), _line_reader(line)
+
+
+def _ndjson_key(line: str, number: int) -> str:
+    try:
+        key = json.loads(line).get('key')
+    except (ValueError, AttributeError):
+        key = None
+    return f"key:{key}" if key is not None else f"line:{number}"
+
+
+def _line_reader(line: str) -> Callable[[], dict]:
+    def read() -> dict:
+        item = json.loads(line)
+        if not isinstance(item, dict):
+            raise ValueError("not a JSON object")
+        item.pop('key', None)
+        return item
+    return read
+
+
+@dataclass
+class IngestReport:
+    """Counts and timings of one ingest run."""
+    
+    items: int = 0
+    created: int = 0
+    # Created already completed from a cached result
+    cached: int = 0
+    # Skipped: ingested by an earlier run
+    existing: int = 0
+    invalid: int = 0
+    enqueued: int = 0
+    chunks: int = 0
+    read_seconds: float = 0.0
+    write_seconds: float = 0.0
+    enqueue_seconds: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+    
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+    
+    @property
+    def rate(self) -> float:
+        """Items handled per second."""
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+
+class EnqueueThrottle:
+    """Publishes processing tasks in chunks, paced by rate and broker queue depth."""
+    
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        rate: Optional[float] = None,
+        max_queue_depth: Optional[int] = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.chunk_size = chunk_size or settings.INGEST_ENQUEUE_CHUNK_SIZE
+        self.rate = settings.INGEST_ENQUEUE_RATE if rate is None else rate
+        self.max_queue_depth = settings.INGEST_MAX_QUEUE_DEPTH if max_queue_depth is None else max_queue_depth
+        self.sleep = sleep
+        self._next_publish = time.monotonic()
+        self._depth_reader = JobStateCollector()
+    
+    def wait_for_queue(self, queue: str) -> None:
+        """Wait while the broker queue is over the depth limit."""
+        if not self.max_queue_depth:
+            return
+        while True:
+            depth = self._depth_reader.queue_depth()
+            if depth is None or depth.get(queue, 0) < self.max_queue_depth:
+                return
+            self.sleep(QUEUE_DEPTH_POLL_INTERVAL)
+    
+    def publish(self, job_ids: List, queue: str) -> int:
+        """Queue the jobs, one group per chunk; return how many were queued."""
+        for start in range(0, len(job_ids), self.chunk_size):
+            chunk = job_ids[start:start + self.chunk_size]
+            self.wait_for_queue(queue)
+            if self.rate:
+                delay = self._next_publish - time.monotonic()
+                if delay > 0:
+                    self.sleep(delay)
+                self._next_publish = max(self._next_publish, time.monotonic()) + len(chunk) / self.rate
+            enqueue_jobs(chunk, queue=queue)
+        return len(job_ids)
+
+
+class CorpusIngest:
+    """Loads a corpus into the jobs table chunk by chunk, resumably."""
+    
+    def __init__(
+        self,
+        items: Iterable[CorpusItem],
+        corpus: str,
+        state_path: str,
+        chunk_size: Optional[int] = None,
+        readers: Optional[int] = None,
+        throttle: Optional[EnqueueThrottle] = None,
+        progress: Optional[Callable[[IngestReport], None]] = None
+    ):
+        self.items = iter(items)
+        self.corpus = corpus
+        self.state_path = state_path
+        self.chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+        self.readers = readers or settings.INGEST_READERS
+        self.throttle = throttle or EnqueueThrottle()
+        self.progress = progress
+        self.report = IngestReport()
+        # Keys seen so far; a repeated key would map to the same job id
+        self._keys = set()
+    
+    def load_state(self) -> Optional[int]:
+        """Return the number of items handled by earlier runs of this corpus, or None on a first run."""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state.get('corpus') != self.corpus:
+            raise ValueError(f"State file {self.state_path} belongs to corpus {state.get('corpus')!r}")
+        return state['done']
+    
+    def save_state(self, done: int) -> None:
+        # Replaced atomically, so an interruption never leaves a torn checkpoint
+        temporary = f"{self.state_path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'corpus': self.corpus, 'done': done}, f)
+        os.replace(temporary, self.state_path)
+    
+    def run(self) -> IngestReport:
+        previous = self.load_state()
+        done = previous or 0
+        # Fail on an unwritable state file before any row is inserted
+        self.save_state(done)
+        
+        position = 0
+        with ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix='ingest-reader') as pool:
+            while True:
+                chunk = list(islice(self.items, self.chunk_size))
+                if not chunk:
+                    break
+                if position + len(chunk) > done:
+                    unique = self.first_occurrences(chunk)
+                    self.report.invalid += len(chunk) - len(unique)
+                    # Only the chunk an earlier run stopped in can hold jobs it never queued
+                    self.ingest_chunk(unique, pool, resumed=previous is not None and position <= done)
+                    self.save_state(position + len(chunk))
+                else:
+                    # Repeats in these chunks were reported by the run that ingested them
+                    self.report.existing += len(self.first_occurrences(chunk, warn=False))
+                position += len(chunk)
+                self.report.items = position
+                self.report.chunks += 1
+                if self.progress is not None:
+                    self.progress(self.report)
+        return self.report
+    
+    def first_occurrences(self, chunk: List[CorpusItem], warn: bool = True) -> List[CorpusItem]:
+        """Return the items whose key no earlier item had, warning about the others."""
+        unique = []
+        for item in chunk:
+            key = item[0]
+            if key in self._keys:
+                if warn:
+                    logger.warning(f"Skipping corpus item {key}: the key is used by an earlier item")
+                continue
+            self._keys.add(key)
+            unique.append(item)
+        return unique
+    
+    def ingest_chunk(self, chunk: List[CorpusItem], pool: ThreadPoolExecutor, resumed: bool) -> None:
+        """Create the chunk's missing jobs and queue the ones that need processing."""
+        ids = [ingest_job_id(self.corpus, key) for key, _ in chunk]
+        existing = set(Job.objects.filter(id__in=ids).values_list('id', flat=True))
+        self.report.existing += len(existing)
+        todo = [(job_id, item) for job_id, item in zip(ids, chunk) if job_id not in existing]
+        
+        started = time.monotonic()
+        loaded = list(pool.map(self._read, todo))
+        self.report.read_seconds += time.monotonic() - started
+        
+        started = time.monotonic()
+        valid = []
+        for job_id, key, data in loaded:
+            data = self._validate(key, data)
+            if data is None:
+                self.report.invalid += 1
+                continue
+            valid.append((job_id, key, data))
+        # One query checks the parents of the whole chunk
+        errors = missing_parent_errors([data for _, _, data in valid]) or [{}] * len(valid)
+        
+        jobs, use_cache = [], []
+        for (job_id, key, data), error in zip(valid, errors):
+            if error:
+                logger.warning(f"Skipping corpus item {key}: {error}")
+                self.report.invalid += 1
+                continue
+            job = build_job(data, PRIORITY_LOW)
+            job.id = job_id
+            jobs.append(job)
+            use_cache.append(data['use_cache'])
+        if jobs:
+            with transaction.atomic():
+                apply_result_cache_bulk(jobs, use_cache)
+                insert_jobs(jobs)
+                index_signatures(jobs)
+                schedule_webhooks(jobs)
+            # Only committed followers are visible to a finishing leader
+            resolve_late_followers(jobs)
+        self.report.created += len(jobs)
+        self.report.cached += sum(1 for job in jobs if job.status == JobStatus.COMPLETED)
+        self.report.write_seconds += time.monotonic() - started
+        
+        by_queue: Dict[str, List] = {}
+        for job in jobs:
+            if needs_processing(job) and not job.deferred:
+                by_queue.setdefault(job.queue, []).append(job.id)
+        if resumed and existing:
+            # The interrupted run may have stopped before queueing these
+            leftovers = Job.objects.filter(
+                id__in=existing,
+                status=JobStatus.PENDING,
+                source_job__isnull=True,
+                deferred=False
+            ).values_list('id', 'queue')
+            for job_id, queue in leftovers:
+                by_queue.setdefault(queue, []).append(job_id)
+        
+        if settings.GPT_EXECUTION_MODE == 'async':
+            # Async workers claim pending jobs from the database themselves
+            return
+        started = time.monotonic()
+        for queue, job_ids in by_queue.items():
+            self.report.enqueued += self.throttle.publish(job_ids, queue)
+        self.report.enqueue_seconds += time.monotonic() - started
+    
+    @staticmethod
+    def _read(todo: Tuple[uuid.UUID, CorpusItem]) -> Tuple[uuid.UUID, str, Optional[dict]]:
+        """Read one item on a reader thread; None stands for an unreadable item."""
+        job_id, (key, read) = todo
+        try:
+            return job_id, key, read()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping corpus item {key}: {str(e)}")
+            return job_id, key, None
+    
+    @staticmethod
+    def _validate(key: str, data: Optional[dict]) -> Optional[dict]:
+        """Validate an item like a batch request item; None if it is not a valid job."""
+        if data is None:
+            return None
+        data.setdefault('priority', PRIORITY_LOW)
+        serializer = JobCreateSerializer(data=data)
+        if not serializer.is_valid():
+            logger.warning(f"Skipping corpus item {key}: {serializer.errors}")
+            return None
+        return serializer.validated_data
@@ -0,0 +1,109 @@
+"""
+Load a corpus of guidelines from a directory or an NDJSON file as jobs.
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.ingest import CorpusIngest, EnqueueThrottle, directory_items, ndjson_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a job per file of a directory (or per line of an NDJSON file of job requests) "
+        "and queue them in throttled chunks; run it again to resume after an interruption"
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help="Directory of guideline text files, or an .ndjson/.jsonl file of job requests"
+        )
+        parser.add_argument(
+            '--pattern',
+            default='*',
+            help="Only ingest files whose name matches this glob (directories only)"
+        )
+        parser.add_argument(
+            '--corpus',
+            default=None,
+            help="Name the job ids are derived from (default: the source's absolute path)"
+        )
+        parser.add_argument(
+            '--state',
+            default=None,
+            help="Checkpoint file for resuming (default: <source>.ingest-state.json)"
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help="Items read and inserted per transaction (default: INGEST_CHUNK_SIZE)"
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=None,
+            help="Threads reading files (default: INGEST_READERS)"
+        )
+        parser.add_argument(
+            '--enqueue-chunk',
+            type=int,
+            default=None,
+            help="Tasks published per group (default: INGEST_ENQUEUE_CHUNK_SIZE)"
+        )
+        parser.add_argument(
+            '--enqueue-rate',
+            type=float,
+            default=None,
+            help="Most jobs queued per second, 0 for no limit (default: INGEST_ENQUEUE_RATE)"
+        )
+        parser.add_argument(
+            '--max-queue-depth',
+            type=int,
+            default=None,
+            help="Wait while the broker queue holds this many tasks, 0 to never wait (default: INGEST_MAX_QUEUE_DEPTH)"
+        )
+    
+    def handle(self, *args, **options):
+        source = os.path.abspath(options['source'])
+        if os.path.isdir(source):
+            items = directory_items(source, options['pattern'])
+        elif os.path.isfile(source):
+            items = ndjson_items(source)
+        else:
+            raise CommandError(f"No such file or directory: {options['source']}")
+        
+        ingest = CorpusIngest(
+            items,
+            corpus=options['corpus'] or source,
+            state_path=options['state'] or f"{source.rstrip(os.sep)}.ingest-state.json",
+            chunk_size=options['chunk_size'],
+            readers=options['readers'],
+            throttle=EnqueueThrottle(
+                chunk_size=options['enqueue_chunk'],
+                rate=options['enqueue_rate'],
+                max_queue_depth=options['max_queue_depth']
+            ),
+            progress=self.write_progress if options['verbosity'] > 0 else None
+        )
+        try:
+            report = ingest.run()
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        
+        self.stdout.write(
+            f"Ingested {report.items} items in {report.elapsed:.1f}s ({report.rate:.0f} items/s): "
+            f"{report.created} jobs created ({report.cached} from cached results), "
+            f"{report.existing} already ingested, {report.invalid} invalid; {report.enqueued} queued"
+        )
+        self.stdout.write(
+            f"  read {report.read_seconds:.1f}s, write {report.write_seconds:.1f}s, "
+            f"enqueue {report.enqueue_seconds:.1f}s"
+        )
+    
+    def write_progress(self, report):
+        self.stdout.write(
+            f"  {report.items} items, {report.created} created, {report.enqueued} queued "
+            f"({report.rate:.0f} items/s)"
+        )
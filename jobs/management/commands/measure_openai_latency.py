@@ -0,0 +1,56 @@
+"""
+Compare OpenAI call latency on a cold connection versus a pooled warm one.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.clients import build_openai_client, get_openai_client
+
+
+class Command(BaseCommand):
+    help = "Measure per-call latency with a fresh client per call versus the pooled client"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=10, help="Calls per mode")
+        parser.add_argument('--model', default="gpt-3.5-turbo", help="Model to call")
+    
+    def handle(self, *args, **options):
+        request = {
+            'model': options['model'],
+            'messages': [{"role": "user", "content": "Reply with OK."}],
+            'max_tokens': 1,
+        }
+        
+        cold = []
+        for _ in range(options['calls']):
+            # A fresh client pays DNS, TCP and TLS setup on every call
+            client = build_openai_client()
+            cold.append(self._timed_call(client, request))
+            client.close()
+        
+        warm_client = get_openai_client()
+        # Open the pooled connection before measuring
+        self._timed_call(warm_client, request)
+        warm = [self._timed_call(warm_client, request) for _ in range(options['calls'])]
+        
+        self._report('cold (new client per call)', cold)
+        self._report('warm (pooled keep-alive client)', warm)
+        saved = statistics.median(cold) - statistics.median(warm)
+        self.stdout.write(f"Median saved per call by connection reuse: {saved:.1f} ms")
+    
+    def _timed_call(self, client, request) -> float:
+        start = time.perf_counter()
+        client.chat.completions.create(**request)
+        return (time.perf_counter() - start) * 1000
+    
+    def _report(self, label, samples):
+        ordered = sorted(samples)
+        p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+        self.stdout.write(
+            f"{label}: n={len(samples)} "
+            f"p50={statistics.median(samples):.1f} ms "
+            f"p90={p90:.1f} ms "
+            f"mean={statistics.mean(samples):.1f} ms"
+        )
@@ -0,0 +1,68 @@
+"""
+Archive or purge expired terminal jobs, or report what would be retired.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.retention import retire_expired_jobs
+
+
+class Command(BaseCommand):
+    help = "Move completed/failed jobs older than the retention window out of the hot tables"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report how many jobs would be retired"
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help="Retire jobs created more than this many days ago (default: JOB_RETENTION_DAYS)"
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['archive', 'purge'],
+            default=None,
+            help="Move jobs to jobs_archive or delete them (default: JOB_RETENTION_MODE)"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help="Jobs per transaction (default: JOB_RETENTION_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help="Stop after this many batches (default: JOB_RETENTION_MAX_BATCHES)"
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            report = retire_expired_jobs(
+                days=options['days'],
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+                mode=options['mode'],
+                dry_run=options['dry_run']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        if report.dry_run:
+            self.stdout.write(
+                f"Would {report.mode} {report.processed} jobs created before {report.cutoff.isoformat()}"
+            )
+            for job_status, count in report.by_status.items():
+                self.stdout.write(f"  {job_status}: {count}")
+            if report.processed:
+                self.stdout.write(f"  oldest: {report.oldest.isoformat()}")
+                self.stdout.write(f"  newest: {report.newest.isoformat()}")
+            return
+        
+        self.stdout.write(
+            f"Retired ({report.mode}) {report.processed} jobs in {report.batches} batches"
+        )
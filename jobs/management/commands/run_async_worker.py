@@ -0,0 +1,47 @@
+"""
+Run the asyncio GPT chain worker.
+"""
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.async_worker import AsyncJobRunner
+from jobs.metrics import start_worker_exporter
+
+
+class Command(BaseCommand):
+    help = "Process pending jobs concurrently on the async OpenAI client"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help="Maximum number of chains in flight (default: ASYNC_WORKER_CONCURRENCY)"
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=None,
+            help="Seconds between polls when idle (default: ASYNC_WORKER_POLL_INTERVAL)"
+        )
+    
+    def handle(self, *args, **options):
+        if settings.GPT_EXECUTION_MODE != 'async':
+            # The API would still publish every job to Celery workers as well
+            raise CommandError(
+                "GPT_EXECUTION_MODE must be 'async' for the API, Celery workers and this worker alike"
+            )
+        start_worker_exporter()
+        asyncio.run(self._run(options['concurrency'], options['poll_interval']))
+    
+    async def _run(self, concurrency, poll_interval):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        
+        runner = AsyncJobRunner(concurrency=concurrency, poll_interval=poll_interval)
+        await runner.run(stop_event)
@@ -0,0 +1,41 @@
+"""
+Run the completion webhook dispatcher.
+"""
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from jobs.metrics import start_worker_exporter
+from jobs.webhooks import WebhookDispatcher
+
+
+class Command(BaseCommand):
+    help = "Deliver completion webhooks concurrently over pooled connections"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=None,
+            help="Maximum number of deliveries in flight (default: WEBHOOK_CONCURRENCY)"
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=None,
+            help="Seconds between polls when idle (default: WEBHOOK_POLL_INTERVAL)"
+        )
+    
+    def handle(self, *args, **options):
+        start_worker_exporter()
+        asyncio.run(self._run(options['concurrency'], options['poll_interval']))
+    
+    async def _run(self, concurrency, poll_interval):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        
+        dispatcher = WebhookDispatcher(concurrency=concurrency, poll_interval=poll_interval)
+        await dispatcher.run(stop_event)
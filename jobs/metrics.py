@@ -0,0 +1,251 @@
+"""
+Prometheus metrics for job processing.
+
+Workers record queue wait, step and end-to-end latency, token usage,
+retries, checklist parse fallbacks, reused chunk summaries, hedged
+requests and failures; the webhook dispatcher
+records delivery attempts. The web process serves
+them at ``/metrics`` together with gauges read at scrape time (jobs per
+status and broker queue depth). Workers started with METRICS_WORKER_PORT
+also serve their own metrics on that port.
+
+With several processes per container (gunicorn workers, Celery prefork
+children), set PROMETHEUS_MULTIPROC_DIR to a shared, empty directory so
+the exposed values are aggregated across processes.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from .models import Job, JobStatus
+from .routing import QUEUE_BULK, QUEUE_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+
+QUEUE_WAIT = Histogram(
+    'guideline_job_queue_wait_seconds',
+    "Time from job creation until a worker starts processing it",
+    ['queue'],
+    buckets=LATENCY_BUCKETS
+)
+STEP_LATENCY = Histogram(
+    'guideline_job_step_seconds',
+    "Duration of a completed GPT chain step",
+    ['step'],
+    buckets=LATENCY_BUCKETS
+)
+JOB_LATENCY = Histogram(
+    'guideline_job_end_to_end_seconds',
+    "Time from job creation until it completes or fails",
+    ['queue', 'pipeline', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+TOKENS = Counter(
+    'guideline_openai_tokens',
+    "Tokens reported in OpenAI response usage",
+    ['kind', 'model']
+)
+RETRIES = Counter('guideline_job_retries', "Failed job attempts that will be retried")
+CHECKLIST_FALLBACKS = Counter(
+    'guideline_checklist_parse_fallbacks',
+    "Checklist responses that were not valid JSON"
+)
+FAILURES = Counter('guideline_job_failures', "Jobs that failed with no retry left")
+CHUNK_SUMMARIES = Counter(
+    'guideline_chunk_summaries',
+    "Chunk summaries of long guidelines, by source (model call or reused from the parent version)",
+    ['source']
+)
+HEDGED_REQUESTS = Counter(
+    'guideline_gpt_hedges',
+    "Slow GPT calls by hedge outcome (primary_won, hedge_won, both_failed, or no_budget when not hedged)",
+    ['outcome']
+)
+WEBHOOK_ATTEMPTS = Counter(
+    'guideline_webhook_attempts',
+    "Completion webhook delivery attempts by outcome",
+    ['outcome']
+)
+
+
+@dataclass
+class TokenUsage:
+    """Tokens used by one job attempt, summed across its GPT calls."""
+    
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        # Chunk summaries complete on several threads at once
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+
+_job_usage: contextvars.ContextVar[Optional[TokenUsage]] = contextvars.ContextVar('job_usage', default=None)
+
+
+@contextmanager
+def track_job_usage() -> Iterator[TokenUsage]:
+    """
+    Collect the token usage of the GPT calls made in this block.
+    
+    The usage is held in a context variable, so concurrent jobs on the
+    async worker each collect their own.
+    """
+    usage = TokenUsage()
+    token = _job_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _job_usage.reset(token)
+
+
+def record_token_usage(usage, model: str) -> None:
+    """Count the usage of one OpenAI response, for the metrics and the current job."""
+    prompt_tokens = getattr(usage, 'prompt_tokens', None)
+    completion_tokens = getattr(usage, 'completion_tokens', None)
+    if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+        return
+    TOKENS.labels('prompt', model).inc(prompt_tokens)
+    TOKENS.labels('completion', model).inc(completion_tokens)
+    
+    current = _job_usage.get()
+    if current is not None:
+        current.add(prompt_tokens, completion_tokens)
+
+
+def observe_queue_wait(job: Job) -> None:
+    QUEUE_WAIT.labels(job.queue).observe((timezone.now() - job.created_at).total_seconds())
+
+
+def observe_step(name: str, duration: float) -> None:
+    STEP_LATENCY.labels(name).observe(duration)
+
+
+def observe_job_finished(job: Job) -> None:
+    JOB_LATENCY.labels(job.queue, job.pipeline, job.status).observe((timezone.now() - job.created_at).total_seconds())
+    if job.status == JobStatus.FAILED:
+        FAILURES.inc()
+
+
+def count_by_status(statuses) -> Dict[str, int]:
+    """Return the number of jobs in each of the given statuses, read through the status index."""
+    counts = dict.fromkeys(statuses, 0)
+    rows = Job.objects.filter(status__in=statuses).values('status').annotate(count=Count('id')).order_by()
+    for row in rows:
+        counts[row['status']] = row['count']
+    return counts
+
+
+class JobStateCollector:
+    """
+    Gauges read at scrape time: jobs per status and broker queue depth.
+    
+    Pending and processing jobs are few and are counted on every scrape.
+    Completed and failed jobs make up nearly the whole table, so their
+    counts are refreshed at most every METRICS_TERMINAL_COUNT_TTL seconds
+    however often /metrics is scraped.
+    """
+    
+    def __init__(self):
+        self._terminal_counts = None
+        self._terminal_counted_at = 0.0
+        self._lock = threading.Lock()
+    
+    def terminal_counts(self) -> Dict[str, int]:
+        with self._lock:
+            if (
+                self._terminal_counts is None
+                or time.monotonic() - self._terminal_counted_at >= settings.METRICS_TERMINAL_COUNT_TTL
+            ):
+                self._terminal_counts = count_by_status([JobStatus.COMPLETED, JobStatus.FAILED])
+                self._terminal_counted_at = time.monotonic()
+            return self._terminal_counts
+    
+    def collect(self):
+        jobs = GaugeMetricFamily('guideline_jobs', "Jobs in the jobs table by status", labels=['status'])
+        counts = {
+            **count_by_status([JobStatus.PENDING, JobStatus.PROCESSING]),
+            **self.terminal_counts(),
+        }
+        for job_status, count in counts.items():
+            jobs.add_metric([job_status], count)
+        yield jobs
+        
+        depth = self.queue_depth()
+        if depth is not None:
+            queues = GaugeMetricFamily(
+                'guideline_queue_depth',
+                "Tasks waiting in the broker queue",
+                labels=['queue']
+            )
+            for queue, length in depth.items():
+                queues.add_metric([queue], length)
+            yield queues
+    
+    def queue_depth(self):
+        """Return the length of each Celery queue, or None if the broker is not Redis."""
+        if not settings.CELERY_BROKER_URL.startswith(('redis://', 'rediss://')):
+            return None
+        try:
+            client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+            pipeline = client.pipeline(transaction=False)
+            for queue in (QUEUE_INTERACTIVE, QUEUE_BULK):
+                pipeline.llen(queue)
+            return dict(zip((QUEUE_INTERACTIVE, QUEUE_BULK), pipeline.execute()))
+        except redis.RedisError as e:
+            logger.warning(f"Could not read queue depth: {str(e)}")
+            return None
+
+
+def process_registry() -> CollectorRegistry:
+    """Return the registry holding this process's (or all processes') metrics."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+_state_registry = CollectorRegistry(auto_describe=False)
+_state_registry.register(JobStateCollector())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Return the /metrics body and its content type."""
+    return generate_latest(process_registry()) + generate_latest(_state_registry), CONTENT_TYPE_LATEST
+
+
+def start_worker_exporter(port: Optional[int] = None) -> bool:
+    """Serve this worker's metrics over HTTP if a port is configured."""
+    port = port or settings.METRICS_WORKER_PORT
+    if not port:
+        return False
+    start_http_server(port, registry=process_registry())
+    logger.info(f"Serving worker metrics on port {port}")
+    return True
@@ -0,0 +1,34 @@
+"""
+Request instrumentation used by the benchmark suite.
+"""
+from contextlib import ExitStack
+
+from django.db import connections
+
+
+class QueryCountMiddleware:
+    """
+    Report the number of database queries a request ran in ``X-DB-Queries``.
+    
+    Counting uses execute wrappers, so it works without DEBUG. Enabled with
+    QUERY_COUNT_HEADER_ENABLED; meant for load tests, not production.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        count = 0
+        
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+        
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        
+        response['X-DB-Queries'] = str(count)
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='source_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='followers', to='jobs.job'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['content_hash', 'status'], name='jobs_content_592a67_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0003_jobchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='partial_result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
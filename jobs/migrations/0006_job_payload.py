@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from jobs.payloads import compress_result, compress_text, decompress_result, decompress_text
+
+BATCH_SIZE = 500
+
+
+def move_payloads_out(apps, schema_editor):
+    Job = apps.get_model('jobs', 'Job')
+    JobPayload = apps.get_model('jobs', 'JobPayload')
+
+    batch = []
+    jobs = Job.objects.only('id', 'guideline_text', 'summary', 'checklist')
+    for job in jobs.iterator(chunk_size=BATCH_SIZE):
+        batch.append(JobPayload(
+            job_id=job.id,
+            compressed_text=compress_text(job.guideline_text),
+            compressed_result=compress_result(job.summary, job.checklist)
+        ))
+        if len(batch) >= BATCH_SIZE:
+            JobPayload.objects.bulk_create(batch)
+            batch = []
+    JobPayload.objects.bulk_create(batch)
+
+
+def move_payloads_back(apps, schema_editor):
+    Job = apps.get_model('jobs', 'Job')
+    JobPayload = apps.get_model('jobs', 'JobPayload')
+
+    for payload in JobPayload.objects.iterator(chunk_size=BATCH_SIZE):
+        summary, checklist = decompress_result(payload.compressed_result)
+        Job.objects.filter(id=payload.job_id).update(
+            guideline_text=decompress_text(payload.compressed_text),
+            summary=summary,
+            checklist=checklist
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0005_jobstep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobPayload',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='jobs.job')),
+                ('compressed_text', models.BinaryField()),
+                ('compressed_result', models.BinaryField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'job_payloads',
+            },
+        ),
+        migrations.RunPython(move_payloads_out, move_payloads_back),
+        migrations.RemoveField(
+            model_name='job',
+            name='checklist',
+        ),
+        migrations.RemoveField(
+            model_name='job',
+            name='guideline_text',
+        ),
+        migrations.RemoveField(
+            model_name='job',
+            name='summary',
+        ),
+    ]
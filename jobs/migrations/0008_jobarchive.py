@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0007_job_status_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('content_hash', models.CharField(blank=True, max_length=64, null=True)),
+                ('source_job_id', models.UUIDField(blank=True, null=True)),
+                ('compressed_text', models.BinaryField()),
+                ('compressed_result', models.BinaryField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'jobs_archive',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0008_jobarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='queue',
+            field=models.CharField(default='interactive', max_length=20),
+        ),
+    ]
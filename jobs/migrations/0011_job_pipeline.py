@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0010_job_token_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='pipeline',
+            field=models.CharField(choices=[('chain', 'Two-step chain'), ('single', 'Single structured call')], default='chain', max_length=10),
+        ),
+    ]
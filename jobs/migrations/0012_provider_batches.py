@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0011_job_pipeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='deferred',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ProviderBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider_batch_id', models.CharField(max_length=100, unique=True)),
+                ('phase', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('submitted', 'Submitted'), ('completed', 'Completed'), ('failed', 'Failed')], default='submitted', max_length=20)),
+                ('provider_status', models.CharField(blank=True, default='', max_length=30)),
+                ('input_file_id', models.CharField(max_length=100)),
+                ('output_file_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('error_file_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('job_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'provider_batches',
+                'indexes': [models.Index(fields=['status'], name='provider_ba_status_c7597f_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='jobs.providerbatch'),
+        ),
+    ]
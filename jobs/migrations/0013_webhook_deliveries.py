@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0012_provider_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='callback_url',
+            field=models.URLField(blank=True, max_length=2048, null=True),
+        ),
+        migrations.CreateModel(
+            name='WebhookDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2048)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='webhook', to='jobs.job')),
+            ],
+            options={
+                'db_table': 'webhook_deliveries',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='webhook_del_status_20ffd3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0016_job_export_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobchunk',
+            name='compressed_text',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0019_job_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='jobsignatureband',
+            name='job_signatu_key_000505_idx',
+        ),
+        migrations.AddIndex(
+            model_name='jobsignatureband',
+            index=models.Index(fields=['key', 'id'], name='job_signatu_key_f3be39_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+"""
+MinHash signatures and LSH band keys for near-duplicate guideline texts.
+
+A text is reduced to the set of its word shingles (runs of SHINGLE_SIZE
+normalized words). NUM_PERM hash permutations of that set, each keeping
+its minimum, form the signature; the fraction of equal positions between
+two signatures estimates the Jaccard similarity of their shingle sets.
+For the index the signature is cut into BANDS bands of ROWS rows, each
+hashed to one 64-bit key: two texts share a key with probability
+1 - (1 - s^ROWS)^BANDS at similarity s, about 0.95 at 0.8 and 0.9999 at
+0.9, while texts below 0.5 rarely collide.
+
+Pure NumPy, no Django, so the offline benchmark can use it directly.
+Changing any of the constants invalidates stored signatures.
+"""
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+SHINGLE_SIZE = 4
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Multiply-add-shift hashing of 32-bit keys, ((a * x + b) mod 2^64) >> 32,
+# one (a, b) pair per permutation; uint64 arithmetic wraps by design
+_SHIFT = np.uint64(32)
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+
+# Per-row multipliers and per-band offsets that fold a band into one key
+_ROW_MULTIPLIERS = _rng.integers(1, 1 << 63, size=ROWS, dtype=np.uint64) | np.uint64(1)
+_BAND_OFFSETS = _rng.integers(0, 1 << 63, size=BANDS, dtype=np.uint64)
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def word_hashes(text: str) -> np.ndarray:
+    """Return the stable 32-bit hash of each normalized word."""
+    words = _WORD_RE.findall(text.lower())
+    return np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint64, count=len(words))
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Return the distinct 32-bit hashes of a text's word shingles."""
+    words = word_hashes(text)
+    if len(words) == 0:
+        return np.zeros(1, dtype=np.uint64)
+    if len(words) < SHINGLE_SIZE:
+        windows = words[np.newaxis, :]
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(words, SHINGLE_SIZE)
+    # Polynomial hash of each window, keeping its high 32 bits
+    powers = np.uint64(1000003) ** np.arange(windows.shape[1], dtype=np.uint64)
+    return np.unique((windows * powers).sum(axis=1) >> _SHIFT)
+
+
+def signature(text: str) -> np.ndarray:
+    """Return the NUM_PERM-value MinHash signature of a text as uint32."""
+    shingles = shingle_hashes(text)
+    permuted = (_A[:, np.newaxis] * shingles[np.newaxis, :] + _B[:, np.newaxis]) >> _SHIFT
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[int]:
+    """Return the BANDS signed 64-bit LSH keys of a signature."""
+    bands = sig.astype(np.uint64).reshape(BANDS, ROWS)
+    keys = (bands * _ROW_MULTIPLIERS).sum(axis=1) + _BAND_OFFSETS
+    return keys.view(np.int64).tolist()
+
+
+def similarities(sig: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Return the estimated Jaccard similarity of a signature to each row of ``candidates``."""
+    return (candidates == sig).mean(axis=1)
+
+
+def to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype('<u4').tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(bytes(data), dtype='<u4')
@@ -1,9 +1,31 @@
 """
 Django models for the guideline ingest application.
 """
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import uuid
 
+from .payloads import compress_result, compress_text, decompress_result, decompress_text
+from .routing import QUEUE_INTERACTIVE
+
+# Bulky job attributes stored in JobPayload, by the payload column holding them
+PAYLOAD_COLUMNS = {
+    'guideline_text': 'compressed_text',
+    'summary': 'compressed_result',
+    'checklist': 'compressed_result',
+}
+
+
+def _payload_property(name, doc):
+    """Expose a value stored in the job's payload as a lazily loaded attribute."""
+    def getter(self):
+        return self._get_payload_value(name)
+    
+    def setter(self, value):
+        self._set_payload_value(name, value)
+    
+    return property(getter, setter, doc=doc)
+
 
 class JobStatus(models.TextChoices):
     PENDING = 'pending', 'Pending'
@@ -12,6 +34,11 @@ class JobStatus(models.TextChoices):
     FAILED = 'failed', 'Failed'
 
 
+class JobPipeline(models.TextChoices):
+    CHAIN = 'chain', 'Two-step chain'
+    SINGLE = 'single', 'Single structured call'
+
+
 class Job(models.Model):
     """Model to track guideline ingest jobs."""
     
@@ -21,27 +48,199 @@ class Job(models.Model):
         choices=JobStatus.choices,
         default=JobStatus.PENDING
     )
-    guideline_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    # GPT chain results
-    summary = models.TextField(blank=True, null=True)
-    checklist = models.JSONField(blank=True, null=True)
+    # Worker queue chosen at creation from the job's size and priority
+    queue = models.CharField(max_length=20, default=QUEUE_INTERACTIVE)
+    # Until when the async worker that claimed the job holds it; the job of a
+    # worker that died is claimed again once its lease runs out
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    # Processing attempts async workers started, kept across reclaims so a job
+    # that keeps killing its workers still runs out of retries
+    attempts = models.PositiveIntegerField(default=0)
+    # Two-step chain or one structured call, from the request or GPT_PIPELINE_MODE
+    pipeline = models.CharField(max_length=10, choices=JobPipeline.choices, default=JobPipeline.CHAIN)
+    # Deferred jobs are processed through the provider's batch API
+    deferred = models.BooleanField(default=False)
+    batch = models.ForeignKey(
+        'ProviderBatch',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='jobs'
+    )
+    # Receives the job's final state once it completes or fails
+    callback_url = models.URLField(max_length=2048, blank=True, null=True)
+    
+    # Input text and GPT chain results, kept in JobPayload and loaded on access
+    guideline_text = _payload_property('guideline_text', "The submitted guideline text.")
+    summary = _payload_property('summary', "Step 1 output.")
+    checklist = _payload_property('checklist', "Step 2 output.")
+    
+    # Streamed output so far, while the job is processing
+    partial_result = models.JSONField(blank=True, null=True)
     
     # Error handling
     error_message = models.TextField(blank=True, null=True)
     
+    # OpenAI token usage summed over all attempts
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    
+    # Result cache: normalized content hash and the job whose result is reused
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    source_job = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='followers'
+    )
+    # Most similar earlier job found by the near-duplicate index, and the
+    # estimated Jaccard similarity of their texts
+    near_duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='near_duplicates'
+    )
+    near_duplicate_similarity = models.FloatField(blank=True, null=True)
+    # Earlier version of the same guideline; chunks unchanged since then
+    # reuse its chunk summaries
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='revisions'
+    )
+    
     class Meta:
         db_table = 'jobs'
         indexes = [
             models.Index(fields=['status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['content_hash', 'status']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'updated_at']),
         ]
     
+    def __init__(self, *args, **kwargs):
+        self._payload_values = {}
+        self._payload_loaded = set()
+        self._payload_dirty = set()
+        super().__init__(*args, **kwargs)
+    
     def __str__(self):
         return f"Job {self.id} - {self.status}"
     
+    def _get_payload_value(self, name):
+        if name not in self._payload_values:
+            self._load_payload(PAYLOAD_COLUMNS[name])
+        return self._payload_values.get(name)
+    
+    def _set_payload_value(self, name, value):
+        self._payload_values[name] = value
+        self._payload_dirty.add(name)
+    
+    def _load_payload(self, column):
+        """Decompress one payload column, keeping values assigned since."""
+        names = [name for name, stored_in in PAYLOAD_COLUMNS.items() if stored_in == column]
+        if all(name in self._payload_values for name in names):
+            return
+        if column in self._payload_loaded or self._state.adding:
+            return
+        self._payload_loaded.add(column)
+        
+        try:
+            payload = self.payload
+        except JobPayload.DoesNotExist:
+            return
+        
+        if column == 'compressed_text':
+            values = {'guideline_text': decompress_text(payload.compressed_text)}
+        else:
+            summary, checklist = decompress_result(payload.compressed_result)
+            values = {'summary': summary, 'checklist': checklist}
+        for name, value in values.items():
+            self._payload_values.setdefault(name, value)
+    
+    def _payload_columns(self, columns):
+        """Return the compressed values of the given payload columns."""
+        data = {}
+        for column in columns:
+            self._load_payload(column)
+            if column == 'compressed_text':
+                data[column] = compress_text(self._payload_values.get('guideline_text'))
+            else:
+                data[column] = compress_result(
+                    self._payload_values.get('summary'),
+                    self._payload_values.get('checklist')
+                )
+        return data
+    
+    def build_payload(self) -> 'JobPayload':
+        """Return an unsaved payload row holding all of the job's bulky values."""
+        return JobPayload(job=self, **self._payload_columns(set(PAYLOAD_COLUMNS.values())))
+    
+    def save(self, *args, **kwargs):
+        """Save the job row and, if any bulky value changed, its payload."""
+        if not self._payload_dirty or kwargs.get('update_fields') is not None:
+            return super().save(*args, **kwargs)
+        
+        new_payload = self.build_payload() if self._state.adding else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if new_payload is not None:
+                new_payload.save(force_insert=True)
+            else:
+                # Only rewrite the columns that changed
+                columns = {PAYLOAD_COLUMNS[name] for name in self._payload_dirty}
+                data = self._payload_columns(columns)
+                data['updated_at'] = timezone.now()
+                if not JobPayload.objects.filter(job_id=self.id).update(**data):
+                    self.build_payload().save(force_insert=True)
+        self._payload_dirty.clear()
+    
+    @classmethod
+    def bulk_create_with_payloads(cls, jobs):
+        """Insert new jobs and their payloads with one query per table."""
+        payloads = [job.build_payload() for job in jobs]
+        with transaction.atomic():
+            cls.objects.bulk_create(jobs)
+            JobPayload.objects.bulk_create(payloads)
+        for job in jobs:
+            job._payload_dirty.clear()
+        return jobs
+    
+    @classmethod
+    def bulk_save_results(cls, jobs, fields):
+        """Update the given job fields and the jobs' results with one query per table."""
+        now = timezone.now()
+        payloads = []
+        for job in jobs:
+            job.updated_at = now
+            payloads.append(JobPayload(
+                job_id=job.id,
+                updated_at=now,
+                **job._payload_columns({'compressed_result'})
+            ))
+        with transaction.atomic():
+            cls.objects.bulk_update(jobs, list(fields) + ['updated_at'], batch_size=500)
+            JobPayload.objects.bulk_update(payloads, ['compressed_result', 'updated_at'], batch_size=500)
+        for job in jobs:
+            job._payload_dirty.clear()
+        return jobs
+    
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None:
+            self._payload_values = {}
+            self._payload_loaded = set()
+            self._payload_dirty = set()
+    
     @property
     def result(self):
         """Return the result data if job is completed."""
@@ -50,4 +249,231 @@ class Job(models.Model):
                 'summary': self.summary,
                 'checklist': self.checklist
             }
-        return None
\ No newline at end of file
+        return None
+
+
+class JobChunk(models.Model):
+    """Summary of one chunk of a long guideline processed with map-reduce."""
+    
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)
+    # zlib-compressed UTF-8 chunk text, so a revision can split along
+    # exactly these chunks; null on chunks stored before it was kept
+    compressed_text = models.BinaryField(blank=True, null=True)
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'job_chunks'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'index'], name='unique_job_chunk_index'),
+        ]
+    
+    def __str__(self):
+        return f"Chunk {self.index} of job {self.job_id}"
+
+
+class JobStep(models.Model):
+    """Checkpoint of one step of a job's GPT chain."""
+    
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='steps')
+    name = models.CharField(max_length=50)
+    output = models.JSONField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Wall-clock seconds of the attempt that completed the step
+    duration = models.FloatField(blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'job_steps'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'name'], name='unique_job_step_name'),
+        ]
+    
+    def __str__(self):
+        return f"Step {self.name} of job {self.job_id}"
+    
+    @property
+    def is_completed(self):
+        return self.completed_at is not None
+
+
+class JobPayload(models.Model):
+    """Compressed input text and result of a job, kept out of the jobs row."""
+    
+    job = models.OneToOneField(
+        Job,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='payload'
+    )
+    # zlib-compressed UTF-8 guideline text
+    compressed_text = models.BinaryField()
+    # zlib-compressed JSON {"summary": ..., "checklist": ...}, null until a result exists
+    compressed_result = models.BinaryField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'job_payloads'
+    
+    def __str__(self):
+        return f"Payload of job {self.job_id}"
+
+
+class JobSignature(models.Model):
+    """MinHash signature of a job's text for the near-duplicate index."""
+    
+    job = models.OneToOneField(
+        Job,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    # NUM_PERM little-endian uint32 values, see jobs.minhash
+    minhash = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'job_signatures'
+    
+    def __str__(self):
+        return f"Signature of job {self.job_id}"
+
+
+class JobSignatureBand(models.Model):
+    """One LSH band key of a signature; jobs sharing a key are near-duplicate candidates."""
+    
+    signature = models.ForeignKey(JobSignature, on_delete=models.CASCADE, related_name='bands')
+    key = models.BigIntegerField()
+    
+    class Meta:
+        db_table = 'job_signature_bands'
+        indexes = [
+            # Serves the per-key "most recent bands" walk of near-duplicate lookups
+            models.Index(fields=['key', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"Band {self.key} of job {self.signature_id}"
+
+
+class JobArchive(models.Model):
+    """
+    Terminal job moved out of the hot tables by the retention task.
+    
+    Holds everything the status endpoint needs, with the payload kept
+    compressed exactly as it was stored in job_payloads.
+    """
+    
+    id = models.UUIDField(primary_key=True, editable=False)
+    status = models.CharField(max_length=20, choices=JobStatus.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    error_message = models.TextField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    source_job_id = models.UUIDField(blank=True, null=True)
+    compressed_text = models.BinaryField()
+    compressed_result = models.BinaryField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'jobs_archive'
+    
+    def __str__(self):
+        return f"Archived job {self.id} - {self.status}"
+    
+    @property
+    def result(self):
+        """Return the result data if the job completed."""
+        summary, checklist = decompress_result(self.compressed_result)
+        if self.status == JobStatus.COMPLETED and summary and checklist:
+            return {
+                'summary': summary,
+                'checklist': checklist
+            }
+        return None
+
+
+class ProviderBatchStatus(models.TextChoices):
+    SUBMITTED = 'submitted', 'Submitted'
+    COMPLETED = 'completed', 'Completed'
+    FAILED = 'failed', 'Failed'
+
+
+class ProviderBatch(models.Model):
+    """
+    One phase of deferred jobs submitted to the provider's batch API.
+    
+    ``phase`` is the chain step the batch's requests run (summary,
+    checklist or combined); every job in it has the batch as ``batch``.
+    """
+    
+    provider_batch_id = models.CharField(max_length=100, unique=True)
+    phase = models.CharField(max_length=20)
+    status = models.CharField(
+        max_length=20,
+        choices=ProviderBatchStatus.choices,
+        default=ProviderBatchStatus.SUBMITTED
+    )
+    # Last status reported by the provider (validating, in_progress, completed, expired, ...)
+    provider_status = models.CharField(max_length=30, blank=True, default='')
+    input_file_id = models.CharField(max_length=100)
+    output_file_id = models.CharField(max_length=100, blank=True, null=True)
+    error_file_id = models.CharField(max_length=100, blank=True, null=True)
+    job_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'provider_batches'
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+    
+    def __str__(self):
+        return f"Batch {self.provider_batch_id} ({self.phase}) - {self.status}"
+
+
+class WebhookDeliveryStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    DELIVERED = 'delivered', 'Delivered'
+    FAILED = 'failed', 'Failed'
+
+
+class WebhookDelivery(models.Model):
+    """
+    Completion callback of a job, written when the job reaches a terminal status.
+    
+    Pending deliveries are claimed by the webhook dispatcher once
+    ``next_attempt_at`` has passed; failed attempts push it back with backoff.
+    """
+    
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name='webhook')
+    url = models.URLField(max_length=2048)
+    status = models.CharField(
+        max_length=20,
+        choices=WebhookDeliveryStatus.choices,
+        default=WebhookDeliveryStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Outcome of the latest attempt: the receiver's status code or a transport error
+    last_status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'webhook_deliveries'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"Webhook of job {self.job_id} - {self.status}"
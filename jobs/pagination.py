@@ -0,0 +1,58 @@
+"""
+Keyset (cursor) pagination for job listings.
+
+Pages are ordered newest first by (created_at, id) and each page continues
+strictly after the last row of the previous one, so the database seeks
+through an index instead of scanning and discarding OFFSET rows. Page
+latency stays flat however deep a client pages, and no COUNT(*) is needed.
+"""
+import base64
+import json
+import uuid
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+from .models import Job
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(job: Job) -> str:
+    """Return an opaque cursor pointing just after the given job."""
+    position = json.dumps([job.created_at.isoformat(), str(job.id)])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Return the (created_at, id) position encoded in a cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = parse_datetime(created_at)
+        job_id = uuid.UUID(job_id)
+    except (TypeError, ValueError, AttributeError):
+        raise InvalidCursor("Invalid cursor.")
+    if created_at is None:
+        raise InvalidCursor("Invalid cursor.")
+    return created_at, job_id
+
+
+def keyset_page(queryset: QuerySet, cursor: Optional[str], limit: int) -> Tuple[List[Job], Optional[str]]:
+    """
+    Return one page of jobs, newest first, and the cursor of the next page.
+    
+    One extra row is fetched to tell whether another page follows.
+    """
+    if cursor:
+        created_at, job_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=job_id)
+        )
+    
+    jobs = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(jobs[limit - 1]) if len(jobs) > limit else None
+    return jobs[:limit], next_cursor
@@ -0,0 +1,42 @@
+"""
+Compression of the bulky job payloads kept out of the ``jobs`` row.
+
+Guideline texts and results are stored zlib-compressed in ``job_payloads``
+so status reads and transitions only touch the narrow ``jobs`` row.
+"""
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+COMPRESSION_LEVEL = 6
+
+
+def _to_bytes(data) -> bytes:
+    # Postgres returns BinaryField values as memoryview
+    return bytes(data)
+
+
+def compress_text(text: Optional[str]) -> bytes:
+    """Compress a guideline text."""
+    return zlib.compress((text or '').encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_text(data) -> str:
+    """Decompress a guideline text."""
+    return zlib.decompress(_to_bytes(data)).decode('utf-8')
+
+
+def compress_result(summary: Optional[str], checklist: Optional[List[Dict[str, Any]]]) -> Optional[bytes]:
+    """Compress a job result, or return None if the job has no result yet."""
+    if summary is None and checklist is None:
+        return None
+    payload = json.dumps({'summary': summary, 'checklist': checklist}, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_result(data) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+    """Decompress a job result into (summary, checklist)."""
+    if data is None:
+        return None, None
+    payload = json.loads(zlib.decompress(_to_bytes(data)).decode('utf-8'))
+    return payload['summary'], payload['checklist']
@@ -0,0 +1,318 @@
+"""
+Cluster-wide rate limiting and adaptive concurrency for OpenAI calls.
+
+All workers share token buckets for requests/min and tokens/min in Redis (the
+broker we already run), plus a concurrency limit that adapts to the provider:
+it grows slowly while calls succeed and halves on a 429, during which every
+worker waits out ``Retry-After``. The goal is to sit just under the quota
+instead of oscillating between bursts and one-minute task retries.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Returns 0 when a slot was acquired, otherwise the milliseconds to wait.
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local max_concurrency = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts', 'limit', 'blocked_until')
+local req = tonumber(state[1]) or rpm
+local tok = tonumber(state[2]) or tpm
+local ts = tonumber(state[3]) or now
+local limit = tonumber(state[4]) or max_concurrency
+local blocked_until = tonumber(state[5]) or 0
+
+local elapsed = math.max(0, now - ts)
+if rpm > 0 then req = math.min(rpm, req + elapsed * rpm / 60) end
+if tpm > 0 then
+  tok = math.min(tpm, tok + elapsed * tpm / 60)
+  tokens = math.min(tokens, tpm)
+end
+redis.call('HSET', KEYS[1], 'req', req, 'tok', tok, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 3600)
+
+local wait = 0
+if now < blocked_until then wait = blocked_until - now end
+if wait == 0 and max_concurrency > 0 then
+  redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+  if redis.call('ZCARD', KEYS[2]) >= math.max(1, math.floor(limit)) then wait = 0.05 end
+end
+if wait == 0 and rpm > 0 and req < 1 then wait = (1 - req) * 60 / rpm end
+if wait == 0 and tpm > 0 and tok < tokens then wait = (tokens - tok) * 60 / tpm end
+if wait > 0 then return math.ceil(wait * 1000) end
+
+if rpm > 0 then req = req - 1 end
+if tpm > 0 then tok = tok - tokens end
+redis.call('HSET', KEYS[1], 'req', req, 'tok', tok)
+if max_concurrency > 0 then
+  redis.call('ZADD', KEYS[2], now + tonumber(ARGV[6]), ARGV[5])
+  redis.call('EXPIRE', KEYS[2], 3600)
+end
+return 0
+"""
+
+# Frees a lease, settles the token estimate and grows the concurrency limit
+# additively after a successful call.
+RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local adjust = tonumber(ARGV[2])
+if adjust ~= 0 then redis.call('HINCRBYFLOAT', KEYS[1], 'tok', adjust) end
+local max_concurrency = tonumber(ARGV[4])
+if ARGV[3] == '1' and max_concurrency > 0 then
+  local limit = tonumber(redis.call('HGET', KEYS[1], 'limit')) or max_concurrency
+  limit = math.min(max_concurrency, limit + 1 / math.max(1, limit))
+  redis.call('HSET', KEYS[1], 'limit', limit)
+end
+return 0
+"""
+
+# Halves the concurrency limit (at most once per second, so a burst of 429s
+# from concurrent calls counts once) and blocks everyone until Retry-After.
+RATE_LIMITED_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local max_concurrency = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'limit', 'blocked_until', 'last_decrease')
+local limit = tonumber(state[1]) or max_concurrency
+if max_concurrency > 0 and now - (tonumber(state[3]) or 0) >= 1 then
+  redis.call('HSET', KEYS[1], 'limit', math.max(1, limit / 2), 'last_decrease', now)
+end
+local blocked_until = now + tonumber(ARGV[1])
+if blocked_until > (tonumber(state[2]) or 0) then
+  redis.call('HSET', KEYS[1], 'blocked_until', blocked_until)
+end
+return 0
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no rate limit slot became available in time."""
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """Estimate the tokens a chat completion will consume (prompt + max output)."""
+    prompt_chars = sum(len(message.get('content') or '') for message in request.get('messages', []))
+    return prompt_chars // 4 + request.get('max_tokens', 0)
+
+
+def retry_after_seconds(headers, default: float = 1.0) -> float:
+    """Read the provider's Retry-After hint from response headers."""
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+class RateLimitLease:
+    """One acquired slot; reports outcome and actual usage on release."""
+    
+    def __init__(self, lease_id: Optional[str], estimated_tokens: int):
+        self.lease_id = lease_id
+        self.estimated_tokens = estimated_tokens
+        self.used_tokens = None
+        self.success = True
+    
+    def record_usage(self, usage) -> None:
+        """Record the tokens actually used, from a response's ``usage``."""
+        total = getattr(usage, 'total_tokens', None)
+        if isinstance(total, int):
+            self.used_tokens = total
+    
+    def failed(self) -> None:
+        """Mark the call as failed so it does not grow the concurrency limit."""
+        self.success = False
+
+
+class RateLimiter:
+    """Redis-backed token buckets and adaptive concurrency shared by all workers."""
+    
+    def __init__(self, redis_client: Optional[redis.Redis] = None, prefix: str = 'openai:ratelimit'):
+        self._redis = redis_client
+        self.state_key = f'{prefix}:state'
+        self.leases_key = f'{prefix}:leases'
+        self._scripts = None
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            settings.OPENAI_RATE_LIMIT_RPM
+            or settings.OPENAI_RATE_LIMIT_TPM
+            or settings.OPENAI_MAX_CONCURRENCY
+        )
+    
+    def _script(self, name: str):
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(settings.OPENAI_RATE_LIMIT_REDIS_URL)
+        if self._scripts is None:
+            self._scripts = {
+                'acquire': self._redis.register_script(ACQUIRE_SCRIPT),
+                'release': self._redis.register_script(RELEASE_SCRIPT),
+                'rate_limited': self._redis.register_script(RATE_LIMITED_SCRIPT),
+            }
+        return self._scripts[name]
+    
+    def try_acquire(self, lease_id: str, tokens: int) -> float:
+        """Try to take a slot; return 0 on success or the seconds to wait."""
+        wait_ms = self._script('acquire')(
+            keys=[self.state_key, self.leases_key],
+            args=[
+                settings.OPENAI_RATE_LIMIT_RPM,
+                settings.OPENAI_RATE_LIMIT_TPM,
+                tokens,
+                settings.OPENAI_MAX_CONCURRENCY,
+                lease_id,
+                settings.OPENAI_RATE_LIMIT_LEASE_TTL,
+            ]
+        )
+        return int(wait_ms) / 1000
+    
+    def _new_lease(self, tokens: int):
+        if not self.enabled:
+            return RateLimitLease(None, tokens), None
+        return RateLimitLease(uuid.uuid4().hex, tokens), time.monotonic() + settings.OPENAI_RATE_LIMIT_MAX_WAIT
+    
+    def _next_wait(self, lease: RateLimitLease, deadline: float) -> float:
+        """Return 0 once the lease holds a slot, else how long to sleep."""
+        try:
+            wait = self.try_acquire(lease.lease_id, lease.estimated_tokens)
+        except redis.RedisError as e:
+            # Fail open: losing the limiter must not stop job processing
+            logger.warning(f"Rate limiter unavailable, proceeding without it: {str(e)}")
+            lease.lease_id = None
+            return 0
+        if wait and time.monotonic() + wait > deadline:
+            raise RateLimitTimeout(
+                f"No OpenAI rate limit slot within {settings.OPENAI_RATE_LIMIT_MAX_WAIT}s"
+            )
+        return wait
+    
+    def acquire(self, tokens: int) -> RateLimitLease:
+        """Block until a slot for a call of ``tokens`` tokens is available."""
+        lease, deadline = self._new_lease(tokens)
+        if lease.lease_id is None:
+            return lease
+        while True:
+            wait = self._next_wait(lease, deadline)
+            if not wait:
+                return lease
+            time.sleep(wait)
+    
+    async def aacquire(self, tokens: int) -> RateLimitLease:
+        """Async variant of acquire that sleeps without blocking the loop."""
+        lease, deadline = self._new_lease(tokens)
+        if lease.lease_id is None:
+            return lease
+        while True:
+            wait = await asyncio.to_thread(self._next_wait, lease, deadline)
+            if not wait:
+                return lease
+            await asyncio.sleep(wait)
+    
+    def release(self, lease: RateLimitLease) -> None:
+        """Free a slot and settle its token estimate against actual usage."""
+        if lease.lease_id is None:
+            return
+        adjust = 0
+        if lease.used_tokens is not None:
+            adjust = lease.estimated_tokens - lease.used_tokens
+        try:
+            self._script('release')(
+                keys=[self.state_key, self.leases_key],
+                args=[lease.lease_id, adjust, 1 if lease.success else 0, settings.OPENAI_MAX_CONCURRENCY]
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not release rate limit lease: {str(e)}")
+    
+    def free_slot(self, lease: RateLimitLease) -> None:
+        """
+        Give a lease's concurrency slot back before its call finishes.
+        
+        The token estimate stays reserved until release settles it; the
+        lease does not grow the concurrency limit.
+        """
+        if lease.lease_id is None:
+            return
+        try:
+            self._script('release')(
+                keys=[self.state_key, self.leases_key],
+                args=[lease.lease_id, 0, 0, settings.OPENAI_MAX_CONCURRENCY]
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not free rate limit slot: {str(e)}")
+    
+    def record_rate_limited(self, retry_after: float) -> None:
+        """Report a 429: shrink concurrency and pause all workers for Retry-After."""
+        if not self.enabled:
+            return
+        logger.warning(f"OpenAI rate limit hit, pausing calls for {retry_after:.1f}s")
+        try:
+            self._script('rate_limited')(
+                keys=[self.state_key],
+                args=[retry_after, settings.OPENAI_MAX_CONCURRENCY]
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not record rate limit: {str(e)}")
+    
+    @contextmanager
+    def slot(self, tokens: int):
+        """Hold a slot for the duration of one call."""
+        lease = self.acquire(tokens)
+        try:
+            yield lease
+        except BaseException:
+            lease.failed()
+            raise
+        finally:
+            self.release(lease)
+    
+    @asynccontextmanager
+    async def aslot(self, tokens: int):
+        """Async variant of slot."""
+        lease = await self.aacquire(tokens)
+        try:
+            yield lease
+        except BaseException:
+            lease.failed()
+            raise
+        finally:
+            await asyncio.to_thread(self.release, lease)
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def observe_response(response) -> None:
+    """httpx response hook: feed every 429, including SDK retries, to the limiter."""
+    if response.status_code == 429:
+        get_rate_limiter().record_rate_limited(retry_after_seconds(response.headers))
+
+
+async def aobserve_response(response) -> None:
+    """Async httpx response hook, see observe_response."""
+    if response.status_code == 429:
+        await asyncio.to_thread(observe_response, response)
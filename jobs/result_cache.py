@@ -0,0 +1,372 @@
+"""
+Content-addressed result cache and single-flight coalescing for jobs.
+
+Identical guideline texts (after whitespace normalization) share a content
+hash. A new job whose twin already completed reuses that result without
+calling OpenAI; a new job whose twin is still in flight attaches to it as a
+follower and receives the result when the leader finishes.
+
+Texts that are only similar (a revision with a changed date or a reworded
+clause) are found through a MinHash LSH index over completed leader jobs.
+Depending on NEAR_DUPLICATE_MODE a near-duplicate above the threshold is
+only recorded on the new job (``flag``) or its result is reused as well
+(``reuse``).
+"""
+import hashlib
+import re
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Subquery
+from django.utils import timezone
+
+from . import minhash
+from .events import TERMINAL_STATUSES, publish_job_events
+from .models import Job, JobPayload, JobSignature, JobSignatureBand, JobStatus
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+IN_FLIGHT_STATUSES = (JobStatus.PENDING, JobStatus.PROCESSING)
+
+
+def normalize_guideline_text(text: str) -> str:
+    """Collapse whitespace so trivially reformatted copies hash identically."""
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def compute_content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of the normalized guideline text."""
+    return hashlib.sha256(normalize_guideline_text(text).encode('utf-8')).hexdigest()
+
+
+def fresh_results_cutoff():
+    """Return the oldest update time of a reusable result, or None if results never expire."""
+    if settings.JOB_RESULT_CACHE_TTL > 0:
+        return timezone.now() - timedelta(seconds=settings.JOB_RESULT_CACHE_TTL)
+    return None
+
+
+def find_completed_twins(content_hashes) -> Dict[str, Job]:
+    """Map each hash to its most recent completed leader job that is still fresh."""
+    queryset = Job.objects.select_related('payload').filter(
+        content_hash__in=content_hashes,
+        status=JobStatus.COMPLETED,
+        source_job__isnull=True,
+        payload__compressed_result__isnull=False,
+    )
+    cutoff = fresh_results_cutoff()
+    if cutoff is not None:
+        queryset = queryset.filter(updated_at__gte=cutoff)
+    
+    twins = {}
+    for twin in queryset.order_by('-updated_at'):
+        twins.setdefault(twin.content_hash, twin)
+    return twins
+
+
+def find_inflight_twins(content_hashes) -> Dict[Tuple[str, bool], Job]:
+    """
+    Map each (hash, deferred) to the oldest in-flight leader a job of that kind may follow.
+    
+    A deferred job follows any leader, but an interactive one never follows
+    a deferred leader: it would wait out the provider batch window.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_SINGLE_FLIGHT_TIMEOUT)
+    queryset = Job.objects.filter(
+        content_hash__in=content_hashes,
+        status__in=IN_FLIGHT_STATUSES,
+        source_job__isnull=True,
+        created_at__gte=cutoff,
+    ).only('id', 'content_hash', 'deferred')
+    
+    leaders = {}
+    for leader in queryset.order_by('created_at'):
+        add_leader(leaders, leader)
+    return leaders
+
+
+def add_leader(leaders: Dict[Tuple[str, bool], Job], leader: Job) -> None:
+    """Offer a job as the leader of its hash, unless an older one already leads."""
+    leaders.setdefault((leader.content_hash, True), leader)
+    if not leader.deferred:
+        leaders.setdefault((leader.content_hash, False), leader)
+
+
+def apply_result_cache_bulk(jobs: List[Job], use_cache: List[bool]) -> List[Job]:
+    """
+    Resolve a batch of unsaved jobs against the result cache.
+    
+    Sets each job's content hash and, where caching is allowed, either copies
+    a completed twin's result onto the job or attaches it to an in-flight twin.
+    Identical texts within the batch are coalesced onto the first of them
+    the job may follow. Uses at most two queries regardless of batch size, plus two for the
+    near-duplicate lookup when it is enabled.
+    """
+    for job in jobs:
+        job.content_hash = compute_content_hash(job.guideline_text)
+    
+    if settings.JOB_RESULT_CACHE_ENABLED:
+        resolve_exact_twins(jobs, use_cache)
+    if settings.NEAR_DUPLICATE_MODE != 'off':
+        resolve_near_duplicates(jobs, use_cache)
+    return jobs
+
+
+def resolve_exact_twins(jobs: List[Job], use_cache: List[bool]) -> None:
+    """Reuse or follow the jobs whose text is identical to each job's."""
+    cacheable = [job for job, allowed in zip(jobs, use_cache) if allowed]
+    if not cacheable:
+        return
+    
+    hashes = {job.content_hash for job in cacheable}
+    twins = find_completed_twins(hashes)
+    leaders = find_inflight_twins(hashes - twins.keys())
+    
+    # Jobs that will run their own chain can lead later jobs in the same batch
+    for job in jobs:
+        if job.content_hash not in twins:
+            add_leader(leaders, job)
+    
+    for job in cacheable:
+        twin = twins.get(job.content_hash)
+        if twin is not None:
+            job.source_job = twin
+            job.summary = twin.summary
+            job.checklist = twin.checklist
+            job.status = JobStatus.COMPLETED
+            continue
+        
+        leader = leaders[job.content_hash, job.deferred]
+        if leader is not job:
+            job.source_job = leader
+
+
+def apply_result_cache(job: Job, use_cache: bool = True) -> Job:
+    """Resolve a single unsaved job against the result cache."""
+    return apply_result_cache_bulk([job], [use_cache])[0]
+
+
+def needs_processing(job: Job) -> bool:
+    """Return True if the job must run its own GPT chain."""
+    return job.status == JobStatus.PENDING and job.source_job_id is None
+
+
+def recent_band_jobs(keys: List[int], limit: int) -> List[Tuple[int, str, int]]:
+    """
+    Return up to ``limit`` reusable jobs per band key, most recently indexed first.
+    
+    Rows are (key, job id, band id). Only the NEAR_DUPLICATE_MAX_SCAN most
+    recent bands of a key are considered, so a key shared by a large part
+    of the corpus (boilerplate every guideline starts with) costs a bounded
+    walk down the (key, id) index instead of a sort of all its rows. On
+    PostgreSQL all keys are looked up in one query, with a LATERAL subquery
+    per key; other databases run one query per key.
+    """
+    scan = max(settings.NEAR_DUPLICATE_MAX_SCAN, limit)
+    cutoff = fresh_results_cutoff()
+    if connection.vendor != 'postgresql':
+        rows = []
+        for key in keys:
+            recent = JobSignatureBand.objects.filter(key=key).order_by('-id').values('id')[:scan]
+            queryset = JobSignatureBand.objects.filter(
+                id__in=Subquery(recent),
+                signature__job__status=JobStatus.COMPLETED,
+                signature__job__source_job__isnull=True,
+                signature__job__payload__compressed_result__isnull=False,
+            )
+            if cutoff is not None:
+                queryset = queryset.filter(signature__job__updated_at__gte=cutoff)
+            rows.extend(queryset.order_by('-id').values_list('key', 'signature_id', 'id')[:limit])
+        return rows
+    
+    quote = connection.ops.quote_name
+    fresh = f"AND j.{quote('updated_at')} >= %s" if cutoff is not None else ''
+    sql = f"""
+        SELECT k.key, c.signature_id, c.id
+        FROM unnest(%s::bigint[]) AS k(key)
+        CROSS JOIN LATERAL (
+            SELECT b.signature_id, b.id
+            FROM (
+                SELECT id, signature_id FROM {quote(JobSignatureBand._meta.db_table)}
+                WHERE key = k.key ORDER BY id DESC LIMIT %s
+            ) b
+            JOIN {quote(Job._meta.db_table)} j ON j.id = b.signature_id
+            JOIN {quote(JobPayload._meta.db_table)} p ON p.job_id = j.id
+            WHERE j.status = %s AND j.source_job_id IS NULL AND p.compressed_result IS NOT NULL {fresh}
+            ORDER BY b.id DESC
+            LIMIT %s
+        ) c
+    """
+    params = [list(keys), scan, JobStatus.COMPLETED] + ([cutoff] if cutoff is not None else []) + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def find_near_duplicates(signatures: List[np.ndarray]) -> List[Optional[Tuple[str, float]]]:
+    """
+    Return the most similar completed leader job of each signature, or None.
+    
+    Each signature's candidates are the NEAR_DUPLICATE_MAX_CANDIDATES most
+    recently indexed jobs sharing at least one LSH band key with it. One
+    indexed query fetches, for every band key of the batch, its most recent
+    jobs up to that cap (see recent_band_jobs); a signature's most recent
+    candidates are always among those of its own keys. A second query loads
+    the candidates' signatures, from which similarity is estimated. Only
+    matches at or above NEAR_DUPLICATE_THRESHOLD are returned, as
+    (job id, similarity).
+    """
+    limit = settings.NEAR_DUPLICATE_MAX_CANDIDATES
+    signature_keys = [minhash.band_keys(sig) for sig in signatures]
+    bands = recent_band_jobs(sorted({key for keys in signature_keys for key in keys}), limit)
+    
+    jobs_by_key: Dict[int, List[str]] = {}
+    indexed = {}
+    for key, job_id, band_id in bands:
+        jobs_by_key.setdefault(key, []).append(job_id)
+        indexed[job_id] = max(band_id, indexed.get(job_id, 0))
+    if not indexed:
+        return [None] * len(signatures)
+    
+    candidate_ids = []
+    for keys in signature_keys:
+        ids = {job_id for key in keys for job_id in jobs_by_key.get(key, ())}
+        candidate_ids.append(sorted(ids, key=indexed.__getitem__, reverse=True)[:limit])
+    stored = dict(
+        JobSignature.objects.filter(job_id__in={job_id for ids in candidate_ids for job_id in ids})
+        .values_list('job_id', 'minhash')
+    )
+    
+    matches = []
+    for sig, ids in zip(signatures, candidate_ids):
+        if not ids:
+            matches.append(None)
+            continue
+        scores = minhash.similarities(sig, np.stack([minhash.from_bytes(stored[job_id]) for job_id in ids]))
+        best = int(scores.argmax())
+        if scores[best] >= settings.NEAR_DUPLICATE_THRESHOLD:
+            matches.append((ids[best], float(scores[best])))
+        else:
+            matches.append(None)
+    return matches
+
+
+def resolve_near_duplicates(jobs: List[Job], use_cache: List[bool]) -> None:
+    """
+    Sign the jobs that will run their own chain and look up their near-duplicates.
+    
+    A match is recorded on the job; in ``reuse`` mode, jobs allowed to use
+    the cache also take over the match's result. The signatures are kept on
+    the jobs for index_signatures once they are saved.
+    """
+    pending = [(job, allowed) for job, allowed in zip(jobs, use_cache) if needs_processing(job)]
+    if not pending:
+        return
+    for job, _ in pending:
+        job.minhash_signature = minhash.signature(job.guideline_text)
+    
+    matches = find_near_duplicates([job.minhash_signature for job, _ in pending])
+    reuse = settings.NEAR_DUPLICATE_MODE == 'reuse' and settings.JOB_RESULT_CACHE_ENABLED
+    sources = {}
+    if reuse:
+        reused_ids = [match[0] for match, (_, allowed) in zip(matches, pending) if match and allowed]
+        sources = Job.objects.select_related('payload').in_bulk(reused_ids)
+    
+    for (job, allowed), match in zip(pending, matches):
+        if match is None:
+            continue
+        job.near_duplicate_of_id, job.near_duplicate_similarity = match
+        source = sources.get(match[0]) if allowed else None
+        if source is not None:
+            job.source_job = source
+            job.summary = source.summary
+            job.checklist = source.checklist
+            job.status = JobStatus.COMPLETED
+
+
+def index_signatures(jobs: List[Job]) -> None:
+    """Add the saved jobs that run their own chain to the near-duplicate index."""
+    signed = [job for job in jobs if needs_processing(job) and getattr(job, 'minhash_signature', None) is not None]
+    if not signed:
+        return
+    JobSignature.objects.bulk_create([
+        JobSignature(job=job, minhash=minhash.to_bytes(job.minhash_signature))
+        for job in signed
+    ])
+    JobSignatureBand.objects.bulk_create([
+        JobSignatureBand(signature_id=job.id, key=key)
+        for job in signed
+        for key in minhash.band_keys(job.minhash_signature)
+    ])
+
+
+def resolve_followers(job: Job) -> int:
+    """
+    Fan a leader's terminal state out to the jobs attached to it.
+    
+    Returns the number of follower jobs updated.
+    """
+    if job.status not in TERMINAL_STATUSES:
+        return 0
+    
+    follower_ids = list(
+        Job.objects.filter(source_job=job, status__in=IN_FLIGHT_STATUSES)
+        .values_list('id', flat=True)
+    )
+    if not follower_ids:
+        return 0
+    
+    followers = Job.objects.filter(id__in=follower_ids)
+    if job.status == JobStatus.COMPLETED:
+        updated = followers.update(
+            status=JobStatus.COMPLETED,
+            error_message=None,
+            updated_at=timezone.now()
+        )
+        # Copy the compressed result inside the database
+        JobPayload.objects.filter(job_id__in=follower_ids).update(
+            compressed_result=Subquery(
+                JobPayload.objects.filter(job_id=job.id).values('compressed_result')[:1]
+            ),
+            updated_at=timezone.now()
+        )
+    else:
+        updated = followers.update(
+            status=JobStatus.FAILED,
+            error_message=job.error_message,
+            updated_at=timezone.now()
+        )
+    
+    publish_job_events(followers.select_related('payload'))
+    return updated
+
+
+def resolve_late_followers(jobs: List[Job]) -> int:
+    """
+    Resolve saved followers whose leader finished before they were inserted.
+    
+    A leader finishing between a follower's lookup and its insert fans its
+    result out without seeing the follower, which would then wait forever.
+    Once the followers are committed their leaders are read again, and any
+    that are terminal resolve their followers once more; a leader finishing
+    after that read sees the follower itself. The jobs' statuses are
+    updated in place. Returns the number of follower jobs updated.
+    """
+    followers = {job.id: job for job in jobs if job.source_job_id is not None and job.status in IN_FLIGHT_STATUSES}
+    if not followers:
+        return 0
+    
+    leaders = Job.objects.filter(
+        id__in={job.source_job_id for job in followers.values()},
+        status__in=TERMINAL_STATUSES
+    ).only('id', 'status', 'error_message')
+    resolved = sum(resolve_followers(leader) for leader in leaders)
+    if resolved:
+        states = Job.objects.filter(id__in=list(followers)).values_list('id', 'status', 'error_message')
+        for job_id, status, error_message in states:
+            followers[job_id].status = status
+            followers[job_id].error_message = error_message
+    return resolved
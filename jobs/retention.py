@@ -0,0 +1,145 @@
+"""
+Retention for the hot job tables.
+
+Terminal jobs older than JOB_RETENTION_DAYS are moved to ``jobs_archive``
+(or deleted outright in purge mode) in bounded batches, so the ``jobs``
+table and its indexes stop growing with total traffic and settle at the
+size of the retention window. Each batch is its own short transaction,
+leaving dead tuples that autovacuum can recycle for new jobs.
+
+Monthly range partitioning was considered, but Postgres requires the
+partition key in every primary key and unique constraint, which conflicts
+with the UUID event_id key that chunks, steps, payloads and followers
+reference.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .events import TERMINAL_STATUSES, drop_cached_job_statuses
+from .models import Job, JobArchive
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionReport:
+    """Outcome (or, for a dry run, forecast) of one retention run."""
+    
+    cutoff: datetime
+    mode: str
+    dry_run: bool
+    processed: int = 0
+    batches: int = 0
+    by_status: Dict[str, int] = field(default_factory=dict)
+    oldest: Optional[datetime] = None
+    newest: Optional[datetime] = None
+
+
+def retention_cutoff(days: Optional[int] = None) -> datetime:
+    """Return the creation time before which terminal jobs are retired."""
+    if days is None:
+        days = settings.JOB_RETENTION_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def expired_jobs(cutoff: datetime):
+    """Return the terminal jobs created before the cutoff."""
+    return Job.objects.filter(status__in=TERMINAL_STATUSES, created_at__lt=cutoff)
+
+
+def archive_rows(jobs: List[Job]) -> List[JobArchive]:
+    """Build archive rows for jobs loaded with their payloads."""
+    rows = []
+    for job in jobs:
+        payload = getattr(job, 'payload', None)
+        rows.append(JobArchive(
+            id=job.id,
+            status=job.status,
+            created_at=job.created_at,
+            updated_at=job.updated_at,
+            error_message=job.error_message,
+            content_hash=job.content_hash,
+            source_job_id=job.source_job_id,
+            compressed_text=payload.compressed_text if payload else b'',
+            compressed_result=payload.compressed_result if payload else None
+        ))
+    return rows
+
+
+def retire_batch(cutoff: datetime, batch_size: int, mode: str) -> int:
+    """
+    Archive or purge one batch of expired jobs.
+    
+    Rows are locked with SKIP LOCKED so concurrent runs never fight over a
+    batch. Chunks, steps and payloads go with their job through cascades.
+    """
+    with transaction.atomic():
+        job_ids = list(
+            expired_jobs(cutoff)
+            .select_for_update(skip_locked=True)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not job_ids:
+            return 0
+        
+        if mode == 'archive':
+            jobs = list(Job.objects.filter(id__in=job_ids).select_related('payload'))
+            JobArchive.objects.bulk_create(archive_rows(jobs), ignore_conflicts=True)
+        Job.objects.filter(id__in=job_ids).delete()
+    
+    drop_cached_job_statuses(job_ids)
+    return len(job_ids)
+
+
+def report_expired_jobs(cutoff: datetime, mode: str) -> RetentionReport:
+    """Describe what a retention run would do, without changing anything."""
+    report = RetentionReport(cutoff=cutoff, mode=mode, dry_run=True)
+    queryset = expired_jobs(cutoff)
+    for row in queryset.values('status').annotate(count=Count('id')).order_by('status'):
+        report.by_status[row['status']] = row['count']
+    bounds = queryset.aggregate(oldest=Min('created_at'), newest=Max('created_at'))
+    report.oldest = bounds['oldest']
+    report.newest = bounds['newest']
+    report.processed = sum(report.by_status.values())
+    return report
+
+
+def retire_expired_jobs(
+    days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+    mode: Optional[str] = None,
+    dry_run: bool = False
+) -> RetentionReport:
+    """Archive or purge expired terminal jobs, at most max_batches batches per run."""
+    cutoff = retention_cutoff(days)
+    batch_size = batch_size or settings.JOB_RETENTION_BATCH_SIZE
+    max_batches = max_batches or settings.JOB_RETENTION_MAX_BATCHES
+    mode = mode or settings.JOB_RETENTION_MODE
+    if mode not in ('archive', 'purge'):
+        raise ValueError(f"Unknown retention mode: {mode}")
+    
+    if dry_run:
+        return report_expired_jobs(cutoff, mode)
+    
+    report = RetentionReport(cutoff=cutoff, mode=mode, dry_run=False)
+    while report.batches < max_batches:
+        retired = retire_batch(cutoff, batch_size, mode)
+        if not retired:
+            break
+        report.batches += 1
+        report.processed += retired
+    
+    logger.info(
+        f"Retention ({mode}) retired {report.processed} jobs created before "
+        f"{cutoff.isoformat()} in {report.batches} batches"
+    )
+    return report
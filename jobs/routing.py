@@ -0,0 +1,37 @@
+"""
+Queue routing for guideline jobs.
+
+Jobs are classified when they are created: small documents and high
+priority submissions go to the interactive queue, large documents and low
+priority submissions (backfills) to the bulk queue. Each queue is consumed by
+its own worker pool, so a backlog of long documents never sits in front of a
+short one.
+"""
+from typing import Optional
+
+from django.conf import settings
+
+QUEUE_INTERACTIVE = 'interactive'
+QUEUE_BULK = 'bulk'
+
+PRIORITY_HIGH = 'high'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_LOW = 'low'
+
+PRIORITY_CHOICES = [
+    (PRIORITY_HIGH, 'High'),
+    (PRIORITY_NORMAL, 'Normal'),
+    (PRIORITY_LOW, 'Low'),
+]
+
+
+def classify_job(guideline_text: str, priority: Optional[str] = None, deferred: bool = False) -> str:
+    """Return the queue a job should be processed on."""
+    if priority == PRIORITY_HIGH:
+        return QUEUE_INTERACTIVE
+    # Deferred jobs only reach a worker if their batch request fails
+    if priority == PRIORITY_LOW or deferred:
+        return QUEUE_BULK
+    if len(guideline_text) > settings.JOB_INTERACTIVE_MAX_CHARS:
+        return QUEUE_BULK
+    return QUEUE_INTERACTIVE
@@ -1,8 +1,12 @@
 """
 Django REST Framework serializers for the guideline ingest API.
 """
+from typing import List, Optional
+
 from rest_framework import serializers
-from .models import Job, JobStatus
+from .callback_urls import UnsafeCallbackURL, check_callback_url
+from .models import Job, JobPipeline, JobStatus
+from .routing import PRIORITY_CHOICES, PRIORITY_HIGH
 
 
 class JobCreateSerializer(serializers.Serializer):
@@ -12,12 +16,91 @@ class JobCreateSerializer(serializers.Serializer):
         max_length=50000,
         help_text="The guideline text to process (max 50,000 characters)"
     )
+    use_cache = serializers.BooleanField(
+        default=True,
+        help_text="Reuse the result of an identical guideline text when available"
+    )
+    priority = serializers.ChoiceField(
+        choices=PRIORITY_CHOICES,
+        required=False,
+        help_text=(
+            "high: interactive queue; low: bulk queue; normal: chosen by size. "
+            "Defaults to normal for single jobs and low for batch items."
+        )
+    )
+    pipeline = serializers.ChoiceField(
+        choices=JobPipeline.choices,
+        required=False,
+        help_text=(
+            "chain: summary, then checklist (two calls); single: both from one "
+            "structured call. Defaults to the deployment's GPT_PIPELINE_MODE."
+        )
+    )
+    deferred = serializers.BooleanField(
+        default=False,
+        help_text=(
+            "Process through the provider's batch API: cheaper, but results can "
+            "take up to GPT_BATCH_COMPLETION_WINDOW. Not allowed with high priority."
+        )
+    )
+    callback_url = serializers.URLField(
+        max_length=2048,
+        required=False,
+        help_text=(
+            "URL that receives a POST with the job's status response once it "
+            "completes or fails, retried with backoff until it answers 2xx"
+        )
+    )
+    parent_event_id = serializers.UUIDField(
+        required=False,
+        help_text=(
+            "event_id of the job that processed the previous version of this guideline. "
+            "Parts of a long guideline unchanged since then reuse that job's summaries."
+        )
+    )
     
     def validate_guideline_text(self, value):
         """Validate that guideline text is not empty."""
         if not value.strip():
             raise serializers.ValidationError("Guideline text cannot be empty.")
         return value.strip()
+    
+    def validate_callback_url(self, value):
+        """Only call back public hosts over HTTP(S)."""
+        if not value.lower().startswith(('http://', 'https://')):
+            raise serializers.ValidationError("Callback URL must use http or https.")
+        try:
+            check_callback_url(value)
+        except UnsafeCallbackURL as e:
+            raise serializers.ValidationError(str(e))
+        return value
+    
+    def validate(self, attrs):
+        """Keep interactive jobs on the synchronous path."""
+        if attrs.get('deferred') and attrs.get('priority') == PRIORITY_HIGH:
+            raise serializers.ValidationError({'deferred': "High priority jobs cannot be deferred."})
+        return attrs
+
+
+def missing_parent_errors(items: List[dict]) -> Optional[List[dict]]:
+    """
+    Check that the parent_event_id of each validated job request names a live job.
+    
+    Returns None if they all do, otherwise errors per item shaped like those
+    of a ``many=True`` JobCreateSerializer. Kept out of the serializer so the
+    async view can run it off the event loop and a batch costs one query.
+    """
+    parent_ids = {item['parent_event_id'] for item in items if item.get('parent_event_id')}
+    if not parent_ids:
+        return None
+    found = set(Job.objects.filter(id__in=parent_ids).values_list('id', flat=True))
+    if found == parent_ids:
+        return None
+    return [
+        {'parent_event_id': ["No job with this event_id."]}
+        if item.get('parent_event_id') and item['parent_event_id'] not in found else {}
+        for item in items
+    ]
 
 
 class JobCreateResponseSerializer(serializers.Serializer):
@@ -58,11 +141,31 @@ class JobStatusResponseSerializer(serializers.Serializer):
         allow_null=True,
         help_text="Job result data (only present when status is 'completed')"
     )
+    partial_result = JobResultSerializer(
+        required=False,
+        allow_null=True,
+        help_text="Output streamed so far (only present when status is 'processing')"
+    )
     error_message = serializers.CharField(
         required=False,
         allow_null=True,
         help_text="Error message if job failed"
     )
+    near_duplicate_of = serializers.UUIDField(
+        required=False,
+        allow_null=True,
+        help_text="Earlier job whose text is nearly identical, if near-duplicate detection found one"
+    )
+    near_duplicate_similarity = serializers.FloatField(
+        required=False,
+        allow_null=True,
+        help_text="Estimated similarity (0-1) of the two texts"
+    )
+    parent_event_id = serializers.UUIDField(
+        required=False,
+        allow_null=True,
+        help_text="Job of the previous version of this guideline, if one was given"
+    )
     created_at = serializers.DateTimeField(
         help_text="When the job was created"
     )
@@ -76,6 +179,10 @@ class JobSerializer(serializers.ModelSerializer):
     
     event_id = serializers.UUIDField(source='id', read_only=True)
     result = serializers.SerializerMethodField()
+    partial_result = serializers.SerializerMethodField()
+    near_duplicate_of = serializers.SerializerMethodField()
+    near_duplicate_similarity = serializers.SerializerMethodField()
+    parent_event_id = serializers.SerializerMethodField()
     
     class Meta:
         model = Job
@@ -83,11 +190,105 @@ class JobSerializer(serializers.ModelSerializer):
             'event_id', 
             'status', 
             'result', 
+            'partial_result',
             'error_message',
+            'near_duplicate_of',
+            'near_duplicate_similarity',
+            'parent_event_id',
             'created_at', 
             'updated_at'
         ]
     
     def get_result(self, obj):
         """Get the result data for completed jobs."""
-        return obj.result
\ No newline at end of file
+        return obj.result
+    
+    def get_partial_result(self, obj):
+        """Get the streamed output so far for processing jobs."""
+        if obj.status == JobStatus.PROCESSING:
+            return obj.partial_result
+        return None
+    
+    def get_near_duplicate_of(self, obj):
+        """Archived jobs do not keep near-duplicate matches."""
+        job_id = getattr(obj, 'near_duplicate_of_id', None)
+        return str(job_id) if job_id else None
+    
+    def get_near_duplicate_similarity(self, obj):
+        return getattr(obj, 'near_duplicate_similarity', None)
+    
+    def get_parent_event_id(self, obj):
+        """Archived jobs do not keep their parent."""
+        job_id = getattr(obj, 'parent_id', None)
+        return str(job_id) if job_id else None
+
+
+class JobListQuerySerializer(serializers.Serializer):
+    """Serializer for job listing query parameters."""
+    
+    status = serializers.ChoiceField(
+        choices=JobStatus.choices,
+        required=False,
+        help_text="Only list jobs with this status"
+    )
+    created_after = serializers.DateTimeField(
+        required=False,
+        help_text="Only list jobs created at or after this time"
+    )
+    created_before = serializers.DateTimeField(
+        required=False,
+        help_text="Only list jobs created before this time"
+    )
+    cursor = serializers.CharField(
+        required=False,
+        help_text="Cursor of the page to fetch, taken from next_cursor"
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        help_text="Page size"
+    )
+
+
+class JobExportQuerySerializer(serializers.Serializer):
+    """Serializer for the watermarks of a job export."""
+    
+    created_after = serializers.DateTimeField(
+        required=False,
+        help_text="Only export jobs created at or after this time"
+    )
+    created_before = serializers.DateTimeField(
+        required=False,
+        help_text="Only export jobs created before this time"
+    )
+    updated_after = serializers.DateTimeField(
+        required=False,
+        help_text=(
+            "Only export jobs completed or updated at or after this time, less JOB_EXPORT_WATERMARK_OVERLAP "
+            "seconds; deduplicate lines on (event_id, updated_at)"
+        )
+    )
+    updated_before = serializers.DateTimeField(
+        required=False,
+        help_text="Only export jobs completed or updated before this time"
+    )
+
+
+class JobListItemSerializer(serializers.ModelSerializer):
+    """Narrow serializer for jobs in a listing."""
+    
+    event_id = serializers.UUIDField(source='id', read_only=True)
+    
+    class Meta:
+        model = Job
+        fields = ['event_id', 'status', 'created_at', 'updated_at']
+
+
+class JobListResponseSerializer(serializers.Serializer):
+    """Serializer for a page of the job listing."""
+    
+    results = JobListItemSerializer(many=True)
+    next_cursor = serializers.CharField(
+        allow_null=True,
+        help_text="Cursor of the next page, or null on the last page"
+    )
@@ -0,0 +1,77 @@
+"""
+Read-through cache of rendered job status responses.
+
+Jobs in a terminal state never change (short of a manual re-run), so their
+rendered status response is kept in Redis keyed by event_id and served
+without touching the database. Every status write goes through
+publish_job_events, which refreshes or drops the cached entry in the same
+pipeline, so the cache is never behind the database for longer than a Redis
+outage. ETags derive from ``updated_at`` so repeat polls can be answered with
+304 Not Modified.
+"""
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .models import Job, JobStatus
+
+TERMINAL_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED)
+
+
+def status_cache_key(job_id) -> str:
+    """Return the Redis key holding a job's rendered status response."""
+    return f'jobs:status:{job_id}'
+
+
+def job_etag(job: Job) -> str:
+    """Return the ETag of a job's status response, derived from updated_at."""
+    return f'"{job.updated_at.timestamp():.6f}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True if an If-None-Match header matches the given ETag."""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def render_job_status(data: dict) -> bytes:
+    """Render serialized job data exactly as the status endpoint does."""
+    return JSONRenderer().render(data)
+
+
+def store_job_status(pipeline, job: Job, data: dict) -> None:
+    """
+    Queue a cache update for a job on a Redis pipeline.
+    
+    Terminal jobs are written through; any other state drops the entry.
+    """
+    key = status_cache_key(job.id)
+    if settings.JOB_STATUS_CACHE_ENABLED and job.status in TERMINAL_STATUSES:
+        pipeline.hset(key, mapping={'etag': job_etag(job), 'body': render_job_status(data)})
+        pipeline.expire(key, settings.JOB_STATUS_CACHE_TTL)
+    else:
+        pipeline.delete(key)
+
+
+def read_job_status(client, job_id) -> Optional[Tuple[str, bytes]]:
+    """Return the cached (etag, body) of a job, or None on a miss."""
+    if not settings.JOB_STATUS_CACHE_ENABLED:
+        return None
+    etag, body = client.hmget(status_cache_key(job_id), ['etag', 'body'])
+    if etag is None or body is None:
+        return None
+    return etag.decode(), body
+
+
+async def aread_job_status(client, job_id) -> Optional[Tuple[str, bytes]]:
+    """Async variant of read_job_status for an asyncio Redis client."""
+    if not settings.JOB_STATUS_CACHE_ENABLED:
+        return None
+    etag, body = await client.hmget(status_cache_key(job_id), ['etag', 'body'])
+    if etag is None or body is None:
+        return None
+    return etag.decode(), body
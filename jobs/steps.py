@@ -0,0 +1,99 @@
+"""
+Per-step checkpoints for the GPT chain.
+
+Each step's output is stored as soon as it completes, together with its
+duration and attempt count. A retried job resumes from the first step that
+has not completed instead of paying for the whole chain again.
+"""
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import observe_step
+from .models import Job, JobStep
+
+SUMMARY_STEP = 'summary'
+CHECKLIST_STEP = 'checklist'
+# Single-call pipeline: summary and checklist from one completion
+COMBINED_STEP = 'combined'
+
+
+class JobStepStore:
+    """Records the steps of one job's chain and replays completed ones."""
+    
+    def __init__(self, job: Job):
+        self.job = job
+    
+    def get_completed(self, name: str) -> Optional[JobStep]:
+        """Return the step if it already completed."""
+        return JobStep.objects.filter(
+            job=self.job,
+            name=name,
+            completed_at__isnull=False
+        ).first()
+    
+    def start(self, name: str) -> None:
+        """Count a new attempt of a step."""
+        step, created = JobStep.objects.get_or_create(
+            job=self.job,
+            name=name,
+            defaults={'attempts': 1}
+        )
+        if not created:
+            JobStep.objects.filter(id=step.id).update(
+                attempts=F('attempts') + 1,
+                updated_at=timezone.now()
+            )
+    
+    def complete(self, name: str, output: Any, duration: float) -> None:
+        """Store a step's output as soon as it completes."""
+        observe_step(name, duration)
+        JobStep.objects.filter(job=self.job, name=name).update(
+            output=output,
+            duration=duration,
+            error_message=None,
+            completed_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+    
+    def fail(self, name: str, error: Exception) -> None:
+        """Record the error of a failed attempt."""
+        JobStep.objects.filter(job=self.job, name=name).update(
+            error_message=str(error),
+            updated_at=timezone.now()
+        )
+    
+    def run(self, name: str, func: Callable[[], Any]) -> Any:
+        """Return a completed step's stored output, or run and checkpoint it."""
+        step = self.get_completed(name)
+        if step is not None:
+            return step.output
+        
+        self.start(name)
+        started = time.monotonic()
+        try:
+            output = func()
+        except Exception as e:
+            self.fail(name, e)
+            raise
+        self.complete(name, output, time.monotonic() - started)
+        return output
+    
+    async def arun(self, name: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of run for the async worker."""
+        step = await sync_to_async(self.get_completed)(name)
+        if step is not None:
+            return step.output
+        
+        await sync_to_async(self.start)(name)
+        started = time.monotonic()
+        try:
+            output = await func()
+        except Exception as e:
+            await sync_to_async(self.fail)(name, e)
+            raise
+        await sync_to_async(self.complete)(name, output, time.monotonic() - started)
+        return output
@@ -0,0 +1,90 @@
+"""
+Progressive partial results for streamed GPT completions.
+
+While a job is processing, the text streamed so far is flushed to
+``Job.partial_result`` at a throttled interval and published as a job event,
+so clients see the summary (and checklist items as they are parsed) long
+before the chain finishes.
+"""
+import json
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .events import publish_job_event
+from .models import Job
+
+
+def parse_partial_checklist(content: str) -> List[Dict[str, str]]:
+    """
+    Return the checklist items that are complete in a partial JSON array.
+    
+    Items are decoded one by one from the opening bracket; parsing stops at
+    the first item that has not been fully streamed yet.
+    """
+    start = content.find('[')
+    if start < 0:
+        return []
+    
+    decoder = json.JSONDecoder()
+    items = []
+    position = start + 1
+    while True:
+        while position < len(content) and content[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(content) or content[position] != '{':
+            return items
+        try:
+            item, position = decoder.raw_decode(content, position)
+        except json.JSONDecodeError:
+            return items
+        items.append(item)
+
+
+class PartialResultWriter:
+    """Throttled writer of a job's partial result while it is processing."""
+    
+    def __init__(self, job: Job, interval: Optional[float] = None):
+        self.job = job
+        self.interval = settings.GPT_STREAM_FLUSH_INTERVAL if interval is None else interval
+        self.partial = {'summary': '', 'checklist': []}
+        self._checklist_text = ''
+        self._last_flush = 0.0
+        self._dirty = False
+    
+    def update_summary(self, text: str) -> None:
+        """Record the summary text streamed so far."""
+        self.partial['summary'] = text
+        self._changed()
+    
+    def update_checklist(self, text: str) -> None:
+        """Record the raw checklist text streamed so far."""
+        self._checklist_text = text
+        self._changed()
+    
+    def flush(self) -> None:
+        """Write the current partial result to the job and publish it."""
+        if self._checklist_text:
+            self.partial['checklist'] = parse_partial_checklist(self._checklist_text)
+        
+        self.job.partial_result = dict(self.partial)
+        self.job.updated_at = timezone.now()
+        Job.objects.filter(id=self.job.id).update(
+            partial_result=self.job.partial_result,
+            updated_at=self.job.updated_at
+        )
+        publish_job_event(self.job)
+        self._last_flush = time.monotonic()
+        self._dirty = False
+    
+    def finish_step(self) -> None:
+        """Flush anything not yet written at the end of a step."""
+        if self._dirty:
+            self.flush()
+    
+    def _changed(self) -> None:
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
@@ -0,0 +1,80 @@
+"""
+Structured (JSON) model output.
+
+``extract_json`` pulls a JSON value out of a completion that may wrap it in
+a Markdown fence or surround it with prose, so a chatty answer still parses
+instead of falling back to a placeholder. The single-call pipeline asks for
+the summary and the checklist together, constrained by RESULT_SCHEMA.
+"""
+import json
+import re
+from typing import Any, Dict
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_decoder = json.JSONDecoder()
+
+RESULT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        'checklist': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'item': {'type': 'string'},
+                    'description': {'type': 'string'},
+                },
+                'required': ['item', 'description'],
+                'additionalProperties': False,
+            },
+        },
+    },
+    'required': ['summary', 'checklist'],
+    'additionalProperties': False,
+}
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a structured completion does not contain the expected JSON."""
+
+
+def extract_json(content: str) -> Any:
+    """
+    Return the JSON value in a completion.
+    
+    Plain JSON is parsed directly; otherwise the first fenced block is tried,
+    then the first object or array found in the text.
+    """
+    text = content.strip()
+    if text[:1] in ('{', '['):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+    
+    fence = _FENCE.search(text)
+    if fence:
+        try:
+            return json.loads(fence.group(1))
+        except json.JSONDecodeError:
+            pass
+    
+    for index, char in enumerate(text):
+        if char in '{[':
+            try:
+                return _decoder.raw_decode(text, index)[0]
+            except json.JSONDecodeError:
+                continue
+    raise StructuredOutputError("No JSON found in completion")
+
+
+def parse_result(content: str) -> Dict[str, Any]:
+    """Return the summary and checklist of a single-call completion."""
+    data = extract_json(content)
+    if not isinstance(data, dict) or not isinstance(data.get('summary'), str):
+        raise StructuredOutputError("Completion is missing the summary")
+    checklist = data.get('checklist')
+    if not isinstance(checklist, list):
+        raise StructuredOutputError("Completion is missing the checklist")
+    return {'summary': data['summary'].strip(), 'checklist': checklist}
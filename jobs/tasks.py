@@ -1,132 +1,705 @@
 """
 Celery tasks for processing guideline documents with GPT chains.
 """
-import json
+import asyncio
+import contextvars
 import logging
-from typing import Dict, List
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from celery import shared_task
+from asgiref.sync import sync_to_async
+from celery import group, shared_task
 from django.conf import settings
-from openai import OpenAI
+from django.db.models import Q
+from django.utils import timezone
+from openai import RateLimitError
 
-from .models import Job, JobStatus
+from .chunking import JobChunkStore, split_into_chunks, split_revision
+from .clients import get_async_openai_client, get_openai_client
+from .events import publish_job_event
+from .hedging import get_hedger, on_abandon, raise_if_abandoned
+from .metrics import (
+    CHECKLIST_FALLBACKS,
+    RETRIES,
+    TokenUsage,
+    observe_job_finished,
+    observe_queue_wait,
+    record_token_usage,
+    track_job_usage,
+)
+from .models import Job, JobPipeline, JobStatus
+from .ratelimit import estimate_tokens, get_rate_limiter
+from .result_cache import resolve_followers
+from .retention import retire_expired_jobs
+from .routing import QUEUE_INTERACTIVE
+from .steps import CHECKLIST_STEP, COMBINED_STEP, SUMMARY_STEP, JobStepStore
+from .streaming import PartialResultWriter
+from .structured import RESULT_SCHEMA, StructuredOutputError, extract_json, parse_result
 
 logger = logging.getLogger(__name__)
 
+# Retry policy shared by the Celery task and the async worker
+MAX_RETRIES = 3
 
-class GPTChainProcessor:
+
+def retry_backoff(retries: int) -> float:
+    """
+    Return the delay before retry number ``retries`` (0 for the first retry).
+    
+    The delay doubles per retry up to GPT_RETRY_BACKOFF_MAX and is jittered
+    so jobs that failed together (e.g. on an outage) do not retry in lockstep.
+    """
+    ceiling = min(settings.GPT_RETRY_BACKOFF_MAX, settings.GPT_RETRY_BACKOFF_BASE * 2 ** retries)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class BaseGPTChainProcessor:
+    """Prompts and response parsing shared by the sync and async processors."""
+    
+    def build_summary_request(self, text: str) -> Dict[str, Any]:
+        """Return the chat completion arguments for step 1."""
+        return {
+            'model': "gpt-3.5-turbo",
+            'messages': [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant that summarizes guideline documents. "
+                        "Create a concise but comprehensive summary that captures the key "
+                        "points, requirements, and important details from the text."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": f"Please summarize the following guideline text:\n\n{text}"
+                }
+            ],
+            'max_tokens': 500,
+            'temperature': 0.3
+        }
+    
+    def build_checklist_request(self, summary: str) -> Dict[str, Any]:
+        """Return the chat completion arguments for step 2."""
+        return {
+            'model': "gpt-3.5-turbo",
+            'messages': [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant that creates actionable checklists. "
+                        "Based on the provided summary, create a practical checklist with "
+                        "specific, actionable items. Return the response as a JSON array "
+                        "where each item is an object with 'item' and 'description' fields."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        f"Based on this summary, create a practical checklist:\n\n{summary}\n\n"
+                        "Return as JSON array with objects containing 'item' and 'description' fields."
+                    )
+                }
+            ],
+            'max_tokens': 800,
+            'temperature': 0.3
+        }
+    
+    def build_chunk_summary_request(self, chunk: str, index: int, total: int) -> Dict[str, Any]:
+        """Return the chat completion arguments for summarizing one chunk (map)."""
+        return {
+            'model': "gpt-3.5-turbo",
+            'messages': [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant that summarizes one part of a longer "
+                        "guideline document. Capture the key points, requirements, and "
+                        "important details of this part only."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        f"Please summarize part {index + 1} of {total} of the following "
+                        f"guideline text:\n\n{chunk}"
+                    )
+                }
+            ],
+            'max_tokens': 300,
+            'temperature': 0.3
+        }
+    
+    def join_chunk_summaries(self, chunk_summaries: List[str]) -> str:
+        """Return chunk summaries as numbered parts of one prompt."""
+        return "\n\n".join(
+            f"Part {index + 1}:\n{summary}" for index, summary in enumerate(chunk_summaries)
+        )
+    
+    def build_reduce_request(self, chunk_summaries: List[str]) -> Dict[str, Any]:
+        """Return the chat completion arguments for combining chunk summaries (reduce)."""
+        parts = self.join_chunk_summaries(chunk_summaries)
+        return {
+            'model': "gpt-3.5-turbo",
+            'messages': [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant that summarizes guideline documents. "
+                        "Combine the summaries of consecutive parts of one document into a "
+                        "single concise but comprehensive summary that captures the key "
+                        "points, requirements, and important details."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": f"Please combine these partial summaries into one summary:\n\n{parts}"
+                }
+            ],
+            'max_tokens': 500,
+            'temperature': 0.3
+        }
+    
+    def build_combined_request(self, text: str, chunked: bool = False) -> Dict[str, Any]:
+        """
+        Return the chat completion arguments for the single-call pipeline.
+        
+        The summary and the checklist come back together as one JSON object
+        constrained by RESULT_SCHEMA. For long guidelines ``text`` holds the
+        joined chunk summaries instead of the guideline itself.
+        """
+        if chunked:
+            source = f"Summaries of consecutive parts of one guideline document:\n\n{text}"
+        else:
+            source = f"Guideline text:\n\n{text}"
+        return {
+            'model': settings.GPT_STRUCTURED_MODEL,
+            'messages': [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant that summarizes guideline documents and "
+                        "creates actionable checklists. Write a concise but comprehensive summary "
+                        "that captures the key points, requirements, and important details, and "
+                        "a practical checklist of specific, actionable items based on it. Respond "
+                        "with a JSON object with a 'summary' string and a 'checklist' array of "
+                        "objects with 'item' and 'description' fields."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": source
+                }
+            ],
+            'max_tokens': 1300,
+            'temperature': 0.3,
+            'response_format': {
+                'type': 'json_schema',
+                'json_schema': {'name': 'guideline_result', 'strict': True, 'schema': RESULT_SCHEMA}
+            }
+        }
+    
+    def split_for_summary(self, text: str, previous_chunks: Optional[List[str]] = None) -> List[str]:
+        """
+        Return the chunks to map-reduce, or a single chunk for short texts.
+        
+        A revision is split along the chunks of its previous version, so
+        unchanged chunks keep the text their stored summaries were made from.
+        """
+        if len(text) <= settings.GPT_CHUNK_THRESHOLD_CHARS:
+            return [text]
+        if previous_chunks:
+            return split_revision(previous_chunks, text, settings.GPT_CHUNK_SIZE_CHARS)
+        return split_into_chunks(text, settings.GPT_CHUNK_SIZE_CHARS)
+    
+    def plan_chunks(
+        self,
+        chunks: List[str],
+        stored: Dict,
+        chunk_store: Optional[JobChunkStore]
+    ) -> Tuple[Dict[int, str], Dict[int, str]]:
+        """Split chunks into already summarized ones and ones still to run."""
+        summaries = {}
+        pending = {}
+        for index, chunk in enumerate(chunks):
+            summary = chunk_store.get_summary(stored, index, chunk) if chunk_store else None
+            if summary is not None:
+                summaries[index] = summary
+            else:
+                pending[index] = chunk
+        return summaries, pending
+    
+    def parse_checklist(self, content: str) -> List[Dict[str, str]]:
+        """Parse the checklist step's output into a list of items."""
+        # Try to parse as JSON, also when fenced or surrounded by prose
+        try:
+            checklist = extract_json(content)
+        except StructuredOutputError:
+            # If JSON parsing fails, create a simple structure
+            CHECKLIST_FALLBACKS.inc()
+            return [{"item": "Review guidelines", "description": content}]
+        
+        if isinstance(checklist, list):
+            return checklist
+        # If not a list, wrap in a list
+        return [checklist]
+
+
+class GPTChainProcessor(BaseGPTChainProcessor):
     """Handles the two-step GPT chain processing."""
     
-    def __init__(self):
-        # Correct OpenAI client initialization
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, client=None, limiter=None, hedger=None):
+        # Reuse the worker's pooled client instead of opening new connections
+        self.client = client or get_openai_client()
+        self.limiter = limiter or get_rate_limiter()
+        self.hedger = hedger or get_hedger()
     
-    def summarize_guideline(self, text: str) -> str:
-        """Step 1: Summarize the guideline text."""
+    def summarize_guideline(
+        self,
+        text: str,
+        chunk_store: Optional[JobChunkStore] = None,
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        Step 1: Summarize the guideline text.
+        
+        Texts above GPT_CHUNK_THRESHOLD_CHARS are summarized with map-reduce.
+        If on_partial is given, the (final) completion is streamed and
+        on_partial receives the text accumulated so far.
+        """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful assistant that summarizes guideline documents. "
-                            "Create a concise but comprehensive summary that captures the key "
-                            "points, requirements, and important details from the text."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Please summarize the following guideline text:\n\n{text}"
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content.strip()
+            chunks = self.split_for_summary(text, chunk_store.previous_chunks() if chunk_store else None)
+            if len(chunks) > 1:
+                return self.summarize_chunked(chunks, chunk_store, on_partial)
             
+            return self._complete(self.build_summary_request(text), on_partial)
+        
         except Exception as e:
             logger.error(f"Error in summarize_guideline: {str(e)}")
             raise
     
-    def generate_checklist(self, summary: str) -> List[Dict[str, str]]:
-        """Step 2: Generate a checklist based on the summary."""
+    def summarize_chunked(
+        self,
+        chunks: List[str],
+        chunk_store: Optional[JobChunkStore] = None,
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """Summarize chunks concurrently, then combine them in a reduce pass."""
+        return self._complete(
+            self.build_reduce_request(self.summarize_chunks(chunks, chunk_store)),
+            on_partial
+        )
+    
+    def summarize_chunks(self, chunks: List[str], chunk_store: Optional[JobChunkStore] = None) -> List[str]:
+        """Summarize chunks concurrently (map) and return their summaries in order."""
+        stored = chunk_store.load() if chunk_store else {}
+        summaries, pending = self.plan_chunks(chunks, stored, chunk_store)
+        if chunk_store:
+            chunk_store.save_inherited()
+        
+        errors = []
+        if pending:
+            workers = min(settings.GPT_CHUNK_CONCURRENCY, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # Copy the context so chunk calls count towards the job's usage
+                futures = {
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self._complete,
+                        self.build_chunk_summary_request(chunk, index, len(chunks))
+                    ): index
+                    for index, chunk in pending.items()
+                }
+                # Persist on this thread as each chunk finishes
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        summaries[index] = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if chunk_store:
+                        chunk_store.save(index, pending[index], summaries[index])
+        
+        if errors:
+            logger.error(f"{len(errors)} of {len(chunks)} chunks failed to summarize")
+            raise errors[0]
+        
+        return [summaries[index] for index in range(len(chunks))]
+    
+    def summarize_with_checklist(self, text: str, chunk_store: Optional[JobChunkStore] = None) -> Dict[str, Any]:
+        """
+        Single-call pipeline: return the summary and checklist from one completion.
+        
+        Long guidelines are still map-reduced, with the checklist produced by
+        the reduce call.
+        """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful assistant that creates actionable checklists. "
-                            "Based on the provided summary, create a practical checklist with "
-                            "specific, actionable items. Return the response as a JSON array "
-                            "where each item is an object with 'item' and 'description' fields."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f"Based on this summary, create a practical checklist:\n\n{summary}\n\n"
-                            "Return as JSON array with objects containing 'item' and 'description' fields."
-                        )
-                    }
-                ],
-                max_tokens=800,
-                temperature=0.3
+            chunks = self.split_for_summary(text, chunk_store.previous_chunks() if chunk_store else None)
+            if len(chunks) > 1:
+                summaries = self.summarize_chunks(chunks, chunk_store)
+                request = self.build_combined_request(self.join_chunk_summaries(summaries), chunked=True)
+            else:
+                request = self.build_combined_request(text)
+            return parse_result(self._complete(request))
+        
+        except Exception as e:
+            logger.error(f"Error in summarize_with_checklist: {str(e)}")
+            raise
+    
+    def _complete(
+        self,
+        request: Dict[str, Any],
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        Send one chat completion and return its stripped content.
+        
+        Slow calls are hedged when GPT_HEDGE_ENABLED is set, except streamed
+        ones: two streams would interleave their partial output.
+        """
+        if on_partial is not None:
+            return self._call(
+                request,
+                lambda stream: self._consume_stream(stream, on_partial, request['model']),
+                stream=True,
+                stream_options={'include_usage': True}
             )
+        
+        def handle(response):
+            return response.choices[0].message.content.strip()
+        
+        if self.hedger is None:
+            return self._call(request, handle)
+        return self.hedger.run(request, lambda hedged: self._call(hedged, handle))
+    
+    def _consume_stream(self, stream, on_partial: Callable[[str], None], model: str) -> str:
+        """Read a streamed completion, reporting the accumulated text per delta."""
+        parts = []
+        for event in stream:
+            # The final event carries the usage and no choices
+            record_token_usage(getattr(event, 'usage', None), model)
+            if not event.choices or not event.choices[0].delta.content:
+                continue
+            parts.append(event.choices[0].delta.content)
+            on_partial(''.join(parts))
+        return ''.join(parts).strip()
+    
+    def _call(self, request: Dict[str, Any], handle: Callable[[Any], Any], **options) -> Any:
+        """
+        Send a chat completion through the cluster-wide rate limiter.
+        
+        ``handle`` consumes the response while the rate limit slot is held.
+        A 429 that survives the SDK's own retries waits for a new slot (and
+        so for the provider's Retry-After) instead of failing the task. The
+        losing request of a hedge frees its slot as soon as the winner
+        answers, and is not sent at all if it is still waiting for one.
+        """
+        estimated = estimate_tokens(request)
+        for attempt in range(settings.OPENAI_RATE_LIMIT_RETRIES + 1):
+            try:
+                with self.limiter.slot(estimated) as lease:
+                    raise_if_abandoned()
+                    on_abandon(lambda lease=lease: self.limiter.free_slot(lease))
+                    response = self.client.chat.completions.create(**request, **options)
+                    lease.record_usage(getattr(response, 'usage', None))
+                    record_token_usage(getattr(response, 'usage', None), request['model'])
+                    return handle(response)
+            except RateLimitError:
+                if not self.limiter.enabled or attempt >= settings.OPENAI_RATE_LIMIT_RETRIES:
+                    raise
+                logger.warning(f"Rate limited, waiting for a new slot (attempt {attempt + 1})")
+    
+    def generate_checklist(
+        self,
+        summary: str,
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Step 2: Generate a checklist based on the summary.
+        
+        If on_partial is given, the completion is streamed and on_partial
+        receives the raw checklist text accumulated so far.
+        """
+        try:
+            content = self._complete(self.build_checklist_request(summary), on_partial)
+            return self.parse_checklist(content)
+        
+        except Exception as e:
+            logger.error(f"Error in generate_checklist: {str(e)}")
+            raise
+
+
+class AsyncGPTChainProcessor(BaseGPTChainProcessor):
+    """Two-step GPT chain on the async OpenAI client, for the async worker."""
+    
+    def __init__(self, client=None, limiter=None, hedger=None):
+        self.client = client or get_async_openai_client()
+        self.limiter = limiter or get_rate_limiter()
+        self.hedger = hedger or get_hedger()
+    
+    async def summarize_guideline(self, text: str, chunk_store: Optional[JobChunkStore] = None) -> str:
+        """
+        Step 1: Summarize the guideline text.
+        
+        Texts above GPT_CHUNK_THRESHOLD_CHARS are summarized with map-reduce.
+        """
+        try:
+            chunks = self.split_for_summary(text, await self._previous_chunks(chunk_store))
+            if len(chunks) > 1:
+                return await self.summarize_chunked(chunks, chunk_store)
             
-            content = response.choices[0].message.content.strip()
-            
-            # Try to parse as JSON
+            return await self._complete(self.build_summary_request(text))
+        
+        except Exception as e:
+            logger.error(f"Error in summarize_guideline: {str(e)}")
+            raise
+    
+    async def summarize_chunked(self, chunks: List[str], chunk_store: Optional[JobChunkStore] = None) -> str:
+        """Summarize chunks concurrently, then combine them in a reduce pass."""
+        return await self._complete(
+            self.build_reduce_request(await self.summarize_chunks(chunks, chunk_store))
+        )
+    
+    async def summarize_chunks(self, chunks: List[str], chunk_store: Optional[JobChunkStore] = None) -> List[str]:
+        """Summarize chunks concurrently (map) and return their summaries in order."""
+        stored = await sync_to_async(chunk_store.load)() if chunk_store else {}
+        summaries, pending = self.plan_chunks(chunks, stored, chunk_store)
+        if chunk_store:
+            await sync_to_async(chunk_store.save_inherited)()
+        semaphore = asyncio.Semaphore(settings.GPT_CHUNK_CONCURRENCY)
+        
+        async def summarize_chunk(index: int, chunk: str) -> None:
+            async with semaphore:
+                summaries[index] = await self._complete(
+                    self.build_chunk_summary_request(chunk, index, len(chunks))
+                )
+            if chunk_store:
+                await sync_to_async(chunk_store.save)(index, chunk, summaries[index])
+        
+        results = await asyncio.gather(
+            *(summarize_chunk(index, chunk) for index, chunk in pending.items()),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.error(f"{len(errors)} of {len(chunks)} chunks failed to summarize")
+            raise errors[0]
+        
+        return [summaries[index] for index in range(len(chunks))]
+    
+    async def summarize_with_checklist(
+        self,
+        text: str,
+        chunk_store: Optional[JobChunkStore] = None
+    ) -> Dict[str, Any]:
+        """Single-call pipeline, see GPTChainProcessor.summarize_with_checklist."""
+        try:
+            chunks = self.split_for_summary(text, await self._previous_chunks(chunk_store))
+            if len(chunks) > 1:
+                summaries = await self.summarize_chunks(chunks, chunk_store)
+                request = self.build_combined_request(self.join_chunk_summaries(summaries), chunked=True)
+            else:
+                request = self.build_combined_request(text)
+            return parse_result(await self._complete(request))
+        
+        except Exception as e:
+            logger.error(f"Error in summarize_with_checklist: {str(e)}")
+            raise
+    
+    async def _previous_chunks(self, chunk_store: Optional[JobChunkStore]) -> Optional[List[str]]:
+        """Return the chunks of a revision's previous version, see JobChunkStore.previous_chunks."""
+        return await sync_to_async(chunk_store.previous_chunks)() if chunk_store else None
+    
+    async def _complete(self, request: Dict[str, Any]) -> str:
+        """Send one chat completion, hedged if it is slow, and return its content."""
+        if self.hedger is None:
+            return await self._send(request)
+        return await self.hedger.arun(request, self._send)
+    
+    async def _send(self, request: Dict[str, Any]) -> str:
+        """
+        Send one chat completion through the rate limiter and return its content.
+        
+        See GPTChainProcessor._call for the rate limit handling.
+        """
+        estimated = estimate_tokens(request)
+        for attempt in range(settings.OPENAI_RATE_LIMIT_RETRIES + 1):
             try:
-                checklist = json.loads(content)
-                if isinstance(checklist, list):
-                    return checklist
-                else:
-                    # If not a list, wrap in a list
-                    return [checklist]
-            except json.JSONDecodeError:
-                # If JSON parsing fails, create a simple structure
-                return [{"item": "Review guidelines", "description": content}]
-                
+                async with self.limiter.aslot(estimated) as lease:
+                    response = await self.client.chat.completions.create(**request)
+                    lease.record_usage(getattr(response, 'usage', None))
+                    record_token_usage(getattr(response, 'usage', None), request['model'])
+                    return response.choices[0].message.content.strip()
+            except RateLimitError:
+                if not self.limiter.enabled or attempt >= settings.OPENAI_RATE_LIMIT_RETRIES:
+                    raise
+                logger.warning(f"Rate limited, waiting for a new slot (attempt {attempt + 1})")
+    
+    async def generate_checklist(self, summary: str) -> List[Dict[str, str]]:
+        """Step 2: Generate a checklist based on the summary."""
+        try:
+            content = await self._complete(self.build_checklist_request(summary))
+            return self.parse_checklist(content)
+        
         except Exception as e:
             logger.error(f"Error in generate_checklist: {str(e)}")
             raise
 
 
-@shared_task(bind=True, max_retries=3)
+def add_job_usage(job: Job, usage: Optional[TokenUsage]) -> None:
+    """Add one attempt's token usage to the job's running totals."""
+    if usage is not None:
+        job.prompt_tokens += usage.prompt_tokens
+        job.completion_tokens += usage.completion_tokens
+
+
+def start_job(job: Job) -> None:
+    """Mark a job as processing and publish the transition."""
+    # Retries restart processing jobs; only the first start waited in the queue
+    if job.status == JobStatus.PENDING:
+        observe_queue_wait(job)
+    job.status = JobStatus.PROCESSING
+    job.save()
+    publish_job_event(job)
+
+
+def claim_job(job: Job) -> bool:
+    """
+    Atomically move a job to processing for a Celery task; False if it is not the task's to run.
+    
+    A pending job is claimed, and so is a processing one without a lease:
+    the task's own retry, or a redelivery after its worker was lost. A job
+    already finished, or leased by an async worker, is left alone, so a job
+    both queued and claimed by the async worker runs only once.
+    """
+    claimed = Job.objects.filter(
+        Q(status=JobStatus.PENDING) | Q(status=JobStatus.PROCESSING, lease_expires_at__isnull=True),
+        id=job.id
+    ).update(status=JobStatus.PROCESSING, updated_at=timezone.now())
+    if not claimed:
+        return False
+    
+    # Retries restart processing jobs; only the first start waited in the queue
+    if job.status == JobStatus.PENDING:
+        observe_queue_wait(job)
+    job.status = JobStatus.PROCESSING
+    publish_job_event(job)
+    return True
+
+
+def complete_job(
+    job: Job,
+    summary: str,
+    checklist: List[Dict[str, str]],
+    usage: Optional[TokenUsage] = None
+) -> None:
+    """Store a job's result, mark it completed and release its followers."""
+    job.summary = summary
+    job.checklist = checklist
+    job.partial_result = None
+    job.status = JobStatus.COMPLETED
+    add_job_usage(job, usage)
+    job.save()
+    publish_job_event(job)
+    observe_job_finished(job)
+    
+    # Hand the result to identical jobs waiting on this one
+    resolve_followers(job)
+
+
+def fail_job(job_id: str, error: Exception, final: bool, usage: Optional[TokenUsage] = None) -> Optional[Job]:
+    """
+    Record a job's error, marking it failed once no retry is left.
+    
+    While a retry is pending the job stays processing, so clients and
+    followers keep waiting for it instead of seeing a transient failure.
+    """
+    try:
+        job = Job.objects.get(id=job_id)
+    except Job.DoesNotExist:
+        return None
+    
+    if final:
+        job.status = JobStatus.FAILED
+    job.error_message = str(error)
+    add_job_usage(job, usage)
+    job.save()
+    publish_job_event(job)
+    
+    if final:
+        observe_job_finished(job)
+        resolve_followers(job)
+    else:
+        RETRIES.inc()
+    return job
+
+
+def run_chain(job: Job, processor: GPTChainProcessor, steps: JobStepStore) -> Tuple[str, List[Dict[str, str]]]:
+    """Two-step pipeline: summarize, then generate the checklist from the summary."""
+    writer = PartialResultWriter(job) if settings.GPT_STREAMING_ENABLED else None
+    
+    # Step 1: Summarize (skipped if a previous attempt completed it)
+    logger.info(f"Summarizing guideline for job {job.id}")
+    summary = steps.run(SUMMARY_STEP, lambda: processor.summarize_guideline(
+        job.guideline_text,
+        chunk_store=JobChunkStore(job),
+        on_partial=writer.update_summary if writer else None
+    ))
+    if writer:
+        writer.update_summary(summary)
+        writer.finish_step()
+    
+    # Step 2: Generate checklist
+    logger.info(f"Generating checklist for job {job.id}")
+    checklist = steps.run(CHECKLIST_STEP, lambda: processor.generate_checklist(
+        summary,
+        on_partial=writer.update_checklist if writer else None
+    ))
+    return summary, checklist
+
+
+def run_single_call(job: Job, processor: GPTChainProcessor, steps: JobStepStore) -> Tuple[str, List[Dict[str, str]]]:
+    """Single-call pipeline: one structured completion returns both results."""
+    logger.info(f"Summarizing guideline with checklist for job {job.id}")
+    result = steps.run(COMBINED_STEP, lambda: processor.summarize_with_checklist(
+        job.guideline_text,
+        chunk_store=JobChunkStore(job)
+    ))
+    return result['summary'], result['checklist']
+
+
+@shared_task(bind=True, max_retries=MAX_RETRIES)
 def process_guideline_task(self, job_id: str):
     """
     Process a guideline text through the GPT chain.
     """
+    with track_job_usage() as usage:
+        return _process_guideline(self, job_id, usage)
+
+
+def _process_guideline(task, job_id: str, usage: TokenUsage):
     try:
         # Get the job
-        job = Job.objects.get(id=job_id)
+        job = Job.objects.select_related('payload').get(id=job_id)
         
-        # Update status to processing
-        job.status = JobStatus.PROCESSING
-        job.save()
+        # Update status to processing, unless another worker already has the job
+        if not claim_job(job):
+            logger.info(f"Job {job_id} is finished or held by another worker, skipping")
+            return {'job_id': job_id, 'status': 'skipped'}
         
         logger.info(f"Starting processing for job {job_id}")
         
         # Initialize GPT processor
         processor = GPTChainProcessor()
-        
-        # Step 1: Summarize
-        logger.info(f"Summarizing guideline for job {job_id}")
-        summary = processor.summarize_guideline(job.guideline_text)
-        
-        # Step 2: Generate checklist
-        logger.info(f"Generating checklist for job {job_id}")
-        checklist = processor.generate_checklist(summary)
+        steps = JobStepStore(job)
+        if job.pipeline == JobPipeline.SINGLE:
+            summary, checklist = run_single_call(job, processor, steps)
+        else:
+            summary, checklist = run_chain(job, processor, steps)
         
         # Update job with results
-        job.summary = summary
-        job.checklist = checklist
-        job.status = JobStatus.COMPLETED
-        job.save()
+        complete_job(job, summary, checklist, usage)
         
         logger.info(f"Successfully completed processing for job {job_id}")
         
@@ -136,27 +709,82 @@ def process_guideline_task(self, job_id: str):
             'summary_length': len(summary),
             'checklist_items': len(checklist)
         }
-        
+    
     except Job.DoesNotExist:
         logger.error(f"Job {job_id} not found")
         raise
-        
+    
     except Exception as e:
         logger.error(f"Error processing job {job_id}: {str(e)}")
         
-        # Update job status to failed
-        try:
-            job = Job.objects.get(id=job_id)
-            job.status = JobStatus.FAILED
-            job.error_message = str(e)
-            job.save()
-        except Job.DoesNotExist:
-            pass
-        
-        # Retry the task
-        if self.request.retries < self.max_retries:
-            logger.info(f"Retrying job {job_id} (attempt {self.request.retries + 1})")
-            raise self.retry(countdown=60, exc=e)
+        # A task called directly (not through a worker) cannot be retried
+        can_retry = not task.request.called_directly and task.request.retries < task.max_retries
+        fail_job(job_id, e, final=not can_retry, usage=usage)
+        
+        # Retry the task; completed steps are not repeated
+        if can_retry:
+            logger.info(f"Retrying job {job_id} (attempt {task.request.retries + 1})")
+            raise task.retry(countdown=retry_backoff(task.request.retries), exc=e)
         else:
             logger.error(f"Max retries exceeded for job {job_id}")
-            raise
\ No newline at end of file
+            raise
+
+
+@shared_task
+def submit_deferred_jobs_task():
+    """Periodic run: submit waiting deferred jobs to the provider's batch API."""
+    from .batching import submit_deferred_jobs
+    batches = submit_deferred_jobs()
+    return {'batches': [batch.provider_batch_id for batch in batches]}
+
+
+@shared_task
+def poll_provider_batches_task():
+    """Periodic run: collect the results of finished provider batches."""
+    from .batching import poll_provider_batches
+    return {'collected': poll_provider_batches()}
+
+
+@shared_task
+def retire_expired_jobs_task():
+    """Periodic retention run: archive or purge expired terminal jobs."""
+    report = retire_expired_jobs()
+    return {
+        'mode': report.mode,
+        'retired': report.processed,
+        'batches': report.batches
+    }
+
+
+def enqueue_jobs(job_ids: Iterable[str], queue: Optional[str] = None) -> None:
+    """
+    Queue processing tasks for the given jobs on a worker queue.
+    
+    Multiple jobs are published as one group so the messages share a single
+    producer and broker connection instead of one round trip per job. In the
+    async execution mode nothing is published: async workers claim pending
+    jobs directly from the database.
+    """
+    if settings.GPT_EXECUTION_MODE == 'async':
+        return
+    
+    job_ids = [str(job_id) for job_id in job_ids]
+    queue = queue or QUEUE_INTERACTIVE
+    
+    if len(job_ids) == 1:
+        process_guideline_task.apply_async((job_ids[0],), queue=queue)
+    elif job_ids:
+        group(process_guideline_task.s(job_id) for job_id in job_ids).apply_async(queue=queue)
+
+
+async def aenqueue_jobs(job_ids: Iterable[str], queue: Optional[str] = None) -> None:
+    """
+    Async variant of enqueue_jobs for the async views.
+    
+    The broker publish runs on a worker thread outside the thread that
+    serializes ORM calls, so neither the event loop nor database access
+    waits on it.
+    """
+    if settings.GPT_EXECUTION_MODE == 'async':
+        return
+    await sync_to_async(enqueue_jobs, thread_sensitive=False)(list(job_ids), queue=queue)
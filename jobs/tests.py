@@ -137,7 +137,7 @@ class JobAPITest(APITestCase):
 class GPTChainProcessorTest(TestCase):
     """Test cases for the GPTChainProcessor."""
     
-    @patch('jobs.tasks.OpenAI')
+    @patch('jobs.tasks.get_openai_client')
     def test_summarize_guideline_success(self, mock_openai):
         """Test successful guideline summarization."""
         # Mock OpenAI response
@@ -151,7 +151,7 @@ class GPTChainProcessorTest(TestCase):
         self.assertEqual(result, "This is a test summary.")
         mock_openai.return_value.chat.completions.create.assert_called_once()
     
-    @patch('jobs.tasks.OpenAI')
+    @patch('jobs.tasks.get_openai_client')
     def test_generate_checklist_success(self, mock_openai):
         """Test successful checklist generation."""
         # Mock OpenAI response
@@ -169,7 +169,7 @@ class GPTChainProcessorTest(TestCase):
         self.assertEqual(result[0]['item'], "Test item 1")
         self.assertEqual(result[1]['item'], "Test item 2")
     
-    @patch('jobs.tasks.OpenAI')
+    @patch('jobs.tasks.get_openai_client')
     def test_generate_checklist_invalid_json(self, mock_openai):
         """Test checklist generation with invalid JSON response."""
         # Mock OpenAI response with invalid JSON
@@ -304,4 +304,2564 @@ class SerializerTest(TestCase):
         self.assertEqual(data['status'], JobStatus.COMPLETED)
         self.assertIsNotNone(data['result'])
         self.assertIn('summary', data['result'])
-        self.assertIn('checklist', data['result'])
\ No newline at end of file
+        self.assertIn('checklist', data['result'])
+
+class ResultCacheTest(APITestCase):
+    """Test cases for the content-addressed result cache."""
+    
+    def setUp(self):
+        self.create_job_url = reverse('jobs:create_job')
+        self.guideline_text = 'Wash hands before   every procedure.'
+    
+    def test_content_hash_ignores_whitespace(self):
+        """Test that reformatted copies of a text share a hash."""
+        from .result_cache import compute_content_hash
+        
+        self.assertEqual(
+            compute_content_hash(self.guideline_text),
+            compute_content_hash('  Wash hands\nbefore every procedure. ')
+        )
+    
+    @patch('jobs.views.enqueue_jobs')
+    def test_completed_twin_is_reused(self, mock_enqueue):
+        """Test that a completed identical job is reused without processing."""
+        from .result_cache import compute_content_hash
+        
+        twin = Job.objects.create(
+            guideline_text=self.guideline_text,
+            content_hash=compute_content_hash(self.guideline_text),
+            status=JobStatus.COMPLETED,
+            summary="Cached summary",
+            checklist=[{"item": "Cached item", "description": "Cached description"}]
+        )
+        
+        response = self.client.post(
+            self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], JobStatus.COMPLETED)
+        job = Job.objects.get(id=response.data['event_id'])
+        self.assertEqual(job.source_job, twin)
+        self.assertEqual(job.summary, "Cached summary")
+        mock_enqueue.assert_not_called()
+    
+    @override_settings(JOB_RESULT_CACHE_TTL=60)
+    @patch('jobs.views.enqueue_jobs')
+    def test_expired_twin_is_not_reused(self, mock_enqueue):
+        """Test that results older than the TTL are not reused."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .result_cache import compute_content_hash
+        
+        twin = Job.objects.create(
+            guideline_text=self.guideline_text,
+            content_hash=compute_content_hash(self.guideline_text),
+            status=JobStatus.COMPLETED,
+            summary="Stale summary",
+            checklist=[]
+        )
+        Job.objects.filter(id=twin.id).update(
+            updated_at=timezone.now() - timedelta(minutes=5)
+        )
+        
+        response = self.client.post(
+            self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+        )
+        
+        self.assertEqual(response.data['status'], JobStatus.PENDING)
+        mock_enqueue.assert_called_once_with([response.data['event_id']], queue='interactive')
+    
+    @patch('jobs.views.enqueue_jobs')
+    def test_bypass_cache(self, mock_enqueue):
+        """Test that use_cache=False forces a fresh run."""
+        self.client.post(
+            self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+        )
+        response = self.client.post(
+            self.create_job_url,
+            {'guideline_text': self.guideline_text, 'use_cache': False},
+            format='json'
+        )
+        
+        job = Job.objects.get(id=response.data['event_id'])
+        self.assertIsNone(job.source_job)
+        self.assertEqual(mock_enqueue.call_count, 2)
+    
+    @patch('jobs.tasks.GPTChainProcessor')
+    @patch('jobs.views.enqueue_jobs')
+    def test_inflight_twin_is_joined(self, mock_enqueue, mock_processor_class):
+        """Test that a follower receives the leader's result on completion."""
+        mock_processor = MagicMock()
+        mock_processor.summarize_guideline.return_value = "Shared summary"
+        mock_processor.generate_checklist.return_value = [
+            {"item": "Shared item", "description": "Shared description"}
+        ]
+        mock_processor_class.return_value = mock_processor
+        
+        leader_id = self.client.post(
+            self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+        ).data['event_id']
+        follower_id = self.client.post(
+            self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+        ).data['event_id']
+        
+        mock_enqueue.assert_called_once_with([leader_id], queue='interactive')
+        follower = Job.objects.get(id=follower_id)
+        self.assertEqual(follower.source_job_id, leader_id)
+        self.assertEqual(follower.status, JobStatus.PENDING)
+        
+        process_guideline_task(str(leader_id))
+        
+        follower.refresh_from_db()
+        self.assertEqual(follower.status, JobStatus.COMPLETED)
+        self.assertEqual(follower.summary, "Shared summary")
+        mock_processor.summarize_guideline.assert_called_once()
+    
+    @patch('jobs.events.get_redis_client')
+    @patch('jobs.views.enqueue_jobs')
+    def test_leader_finishing_before_follower_insert(self, mock_enqueue, mock_redis):
+        """Test that a follower whose leader completes between lookup and insert is still resolved."""
+        from . import result_cache
+        from .tasks import complete_job
+        
+        leader = Job.objects.get(id=self.client.post(
+            self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+        ).data['event_id'])
+        find_inflight_twins = result_cache.find_inflight_twins
+        
+        def lookup_then_complete(hashes):
+            leaders = find_inflight_twins(hashes)
+            complete_job(leader, "Raced summary", [{"item": "Raced item", "description": "Raced"}])
+            return leaders
+        
+        with patch('jobs.result_cache.find_inflight_twins', side_effect=lookup_then_complete):
+            response = self.client.post(
+                self.create_job_url, {'guideline_text': self.guideline_text}, format='json'
+            )
+        
+        self.assertEqual(response.data['status'], JobStatus.COMPLETED)
+        follower = Job.objects.get(id=response.data['event_id'])
+        self.assertEqual(follower.source_job_id, leader.id)
+        self.assertEqual(follower.status, JobStatus.COMPLETED)
+        self.assertEqual(follower.summary, "Raced summary")
+
+
+class BatchJobAPITest(APITestCase):
+    """Test cases for the batch job submission endpoint."""
+    
+    def setUp(self):
+        self.batch_url = reverse('jobs:create_jobs_batch')
+    
+    @patch('jobs.tasks.group')
+    def test_create_jobs_batch_success(self, mock_group):
+        """Test that a batch is inserted and queued in one grouped publish."""
+        payload = [
+            {'guideline_text': f'Guideline number {i}'} for i in range(5)
+        ]
+        
+        # Two cache lookups and one insert per table, inside a savepoint
+        with self.assertNumQueries(6):
+            response = self.client.post(self.batch_url, payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(Job.objects.count(), 5)
+        for item, job_data in zip(response.data, payload):
+            job = Job.objects.get(id=item['event_id'])
+            self.assertEqual(job.guideline_text, job_data['guideline_text'])
+        mock_group.return_value.apply_async.assert_called_once_with(queue='bulk')
+        self.assertEqual(len(list(mock_group.call_args[0][0])), 5)
+    
+    @patch('jobs.views.enqueue_jobs')
+    def test_create_jobs_batch_coalesces_duplicates(self, mock_enqueue):
+        """Test that identical texts in one batch share a single run."""
+        payload = [{'guideline_text': 'Same guideline'}] * 3
+        
+        response = self.client.post(self.batch_url, payload, format='json')
+        
+        leader_id = response.data[0]['event_id']
+        self.assertEqual(list(mock_enqueue.call_args[0][0]), [leader_id])
+        self.assertEqual(Job.objects.filter(source_job_id=leader_id).count(), 2)
+    
+    def test_create_jobs_batch_invalid_item(self):
+        """Test that one invalid item rejects the whole batch."""
+        payload = [{'guideline_text': 'Valid guideline'}, {'guideline_text': '  '}]
+        
+        response = self.client.post(self.batch_url, payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Job.objects.count(), 0)
+    
+    @override_settings(JOB_BATCH_MAX_SIZE=2)
+    def test_create_jobs_batch_too_large(self):
+        """Test that batches above the configured limit are rejected."""
+        payload = [{'guideline_text': f'Guideline {i}'} for i in range(3)]
+        
+        response = self.client.post(self.batch_url, payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobEventsTest(APITestCase):
+    """Test cases for push-based job status (SSE and long-poll)."""
+    
+    def setUp(self):
+        self.job = Job.objects.create(
+            guideline_text="Test guideline",
+            status=JobStatus.PROCESSING
+        )
+        patcher = patch('jobs.events.get_redis_client')
+        self.mock_redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pubsub = self.mock_redis.return_value.pubsub.return_value
+    
+    def _message(self, **fields):
+        event = {'event_id': str(self.job.id), 'result': None, **fields}
+        return {'type': 'message', 'data': json.dumps(event).encode()}
+    
+    def test_long_poll_returns_published_transition(self):
+        """Test that a long-poll returns the next published event."""
+        self.pubsub.get_message.side_effect = [
+            None, self._message(status=JobStatus.COMPLETED)
+        ]
+        
+        url = reverse('jobs:wait_for_job_status', kwargs={'event_id': self.job.id})
+        response = self.client.get(url, {'timeout': 5})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], JobStatus.COMPLETED)
+        self.pubsub.subscribe.assert_called_once_with(f'jobs:events:{self.job.id}')
+        self.pubsub.close.assert_called_once()
+    
+    def test_long_poll_returns_immediately_when_status_differs(self):
+        """Test that a stale client status is answered without waiting."""
+        url = reverse('jobs:wait_for_job_status', kwargs={'event_id': self.job.id})
+        response = self.client.get(url, {'status': JobStatus.PENDING})
+        
+        self.assertEqual(response.data['status'], JobStatus.PROCESSING)
+        self.pubsub.get_message.assert_not_called()
+    
+    def test_long_poll_invalid_timeout(self):
+        """Test that a non-numeric timeout is rejected."""
+        url = reverse('jobs:wait_for_job_status', kwargs={'event_id': self.job.id})
+        response = self.client.get(url, {'timeout': 'soon'})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_stream_ends_after_terminal_event(self):
+        """Test that the SSE stream closes once the job finishes."""
+        self.pubsub.get_message.side_effect = [
+            self._message(status=JobStatus.COMPLETED)
+        ]
+        
+        url = reverse('jobs:stream_job_events', kwargs={'event_id': self.job.id})
+        response = self.client.get(url)
+        body = b''.join(response.streaming_content).decode()
+        
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(body.count('event: status'), 2)
+        self.assertIn('"status": "completed"', body)
+        self.pubsub.close.assert_called_once()
+    
+    @patch('jobs.tasks.GPTChainProcessor')
+    def test_task_publishes_transitions(self, mock_processor_class):
+        """Test that processing publishes each status transition."""
+        mock_processor_class.return_value.summarize_guideline.return_value = "Summary"
+        mock_processor_class.return_value.generate_checklist.return_value = []
+        
+        process_guideline_task(str(self.job.id))
+        
+        pipeline = self.mock_redis.return_value.pipeline.return_value
+        published = [
+            json.loads(call.args[1])['status'] for call in pipeline.publish.call_args_list
+        ]
+        self.assertEqual(published, [JobStatus.PROCESSING, JobStatus.COMPLETED])
+
+
+@override_settings(GPT_EXECUTION_MODE='async')
+class AsyncJobRunnerTest(TestCase):
+    """Test cases for the asyncio execution mode."""
+    
+    def setUp(self):
+        from unittest.mock import AsyncMock
+        
+        self.processor = MagicMock()
+        self.processor.summarize_guideline = AsyncMock(return_value="Async summary")
+        self.processor.generate_checklist = AsyncMock(
+            return_value=[{"item": "Async item", "description": "Async description"}]
+        )
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _runner(self, concurrency=10):
+        from .async_worker import AsyncJobRunner
+        
+        return AsyncJobRunner(
+            concurrency=concurrency,
+            poll_interval=0.01,
+            retry_countdown=0,
+            processor=self.processor
+        )
+    
+    @patch('jobs.tasks.process_guideline_task')
+    def test_enqueue_skips_broker_in_async_mode(self, mock_task):
+        """Test that async mode leaves jobs for the async worker to claim."""
+        from .tasks import enqueue_jobs
+        
+        enqueue_jobs(['a', 'b'])
+        
+        mock_task.apply_async.assert_not_called()
+    
+    async def test_runs_claimed_jobs_concurrently(self):
+        """Test that pending jobs are claimed up to the concurrency limit."""
+        jobs = [
+            await Job.objects.acreate(guideline_text=f"Guideline {i}")
+            for i in range(3)
+        ]
+        runner = self._runner(concurrency=2)
+        
+        self.assertEqual(await runner.run_once(), 2)
+        await runner.drain()
+        self.assertEqual(await runner.run_once(), 1)
+        await runner.drain()
+        
+        for job in jobs:
+            job = await Job.objects.select_related('payload').aget(id=job.id)
+            self.assertEqual(job.status, JobStatus.COMPLETED)
+            self.assertEqual(job.summary, "Async summary")
+    
+    async def test_retries_then_fails(self):
+        """Test that a failing job is retried and finally marked failed."""
+        from .tasks import MAX_RETRIES
+        
+        self.processor.summarize_guideline.side_effect = Exception("API Error")
+        job = await Job.objects.acreate(guideline_text="Failing guideline")
+        runner = self._runner()
+        
+        await runner.run_once()
+        await runner.drain()
+        
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(job.error_message, "API Error")
+        self.assertEqual(self.processor.summarize_guideline.call_count, MAX_RETRIES + 1)
+    
+    async def test_retry_resumes_after_completed_step(self):
+        """Test that a retry does not summarize again after the checklist failed."""
+        self.processor.generate_checklist.side_effect = [
+            Exception("API Error"),
+            [{"item": "Async item", "description": "Async description"}],
+        ]
+        job = await Job.objects.acreate(guideline_text="Flaky guideline")
+        runner = self._runner()
+        
+        await runner.run_once()
+        await runner.drain()
+        
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, JobStatus.COMPLETED)
+        self.assertEqual(self.processor.summarize_guideline.call_count, 1)
+        self.assertEqual(self.processor.generate_checklist.call_count, 2)
+    
+    def test_claims_jobs_whose_lease_expired(self):
+        """Test that jobs of a dead worker are claimed again, while leased and Celery-run jobs are not."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .async_worker import Claim, claim_pending_jobs
+        
+        now = timezone.now()
+        expired = Job.objects.create(
+            guideline_text="Orphaned", status=JobStatus.PROCESSING, lease_expires_at=now - timedelta(seconds=1),
+            attempts=1
+        )
+        Job.objects.create(
+            guideline_text="Leased", status=JobStatus.PROCESSING, lease_expires_at=now + timedelta(minutes=1)
+        )
+        Job.objects.create(guideline_text="On Celery", status=JobStatus.PROCESSING)
+        
+        self.assertEqual(claim_pending_jobs(10), [Claim(str(expired.id), 1, reclaimed=True)])
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, JobStatus.PROCESSING)
+        self.assertEqual(expired.attempts, 2)
+        self.assertGreater(expired.lease_expires_at, now + timedelta(seconds=60))
+    
+    @patch('jobs.async_worker.observe_queue_wait')
+    async def test_reclaimed_jobs_keep_their_attempt_count(self, mock_queue_wait):
+        """Test that attempts lost with dead workers count towards the retry limit and not as queue wait."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .tasks import MAX_RETRIES
+        
+        self.processor.summarize_guideline.side_effect = Exception("API Error")
+        expired = timezone.now() - timedelta(seconds=1)
+        last_attempt = await Job.objects.acreate(
+            guideline_text="Last attempt", status=JobStatus.PROCESSING, lease_expires_at=expired,
+            attempts=MAX_RETRIES
+        )
+        exhausted = await Job.objects.acreate(
+            guideline_text="Exhausted", status=JobStatus.PROCESSING, lease_expires_at=expired,
+            attempts=MAX_RETRIES + 1
+        )
+        runner = self._runner()
+        
+        await runner.run_once()
+        await runner.drain()
+        
+        for job in (last_attempt, exhausted):
+            await job.arefresh_from_db()
+            self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(self.processor.summarize_guideline.call_count, 1)
+        mock_queue_wait.assert_not_called()
+    
+    async def test_renews_leases_of_held_jobs(self):
+        """Test that the worker extends the leases of jobs it is still running, and forgets them once done."""
+        import asyncio
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        release = asyncio.Event()
+        
+        async def summarize(*args, **kwargs):
+            await release.wait()
+            return "Async summary"
+        self.processor.summarize_guideline.side_effect = summarize
+        job = await Job.objects.acreate(guideline_text="Slow guideline")
+        runner = self._runner()
+        
+        await runner.run_once()
+        await Job.objects.filter(id=job.id).aupdate(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        await runner.renew_leases()
+        await job.arefresh_from_db()
+        self.assertGreater(job.lease_expires_at, timezone.now())
+        
+        release.set()
+        await runner.drain()
+        self.assertEqual(runner._held, set())
+    
+    @patch('jobs.tasks.GPTChainProcessor')
+    async def test_job_queued_to_celery_while_claimed_runs_once(self, mock_processor_class):
+        """Test that a Celery task for a job the async worker holds skips it, and vice versa."""
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from .async_worker import claim_pending_jobs
+        
+        release = asyncio.Event()
+        
+        async def summarize(*args, **kwargs):
+            await release.wait()
+            return "Async summary"
+        self.processor.summarize_guideline.side_effect = summarize
+        job = await Job.objects.acreate(guideline_text="Doubly queued guideline")
+        runner = self._runner()
+        
+        await runner.run_once()
+        result = await sync_to_async(process_guideline_task)(str(job.id))
+        release.set()
+        await runner.drain()
+        
+        self.assertEqual(result['status'], 'skipped')
+        mock_processor_class.return_value.summarize_guideline.assert_not_called()
+        self.assertEqual(self.processor.summarize_guideline.call_count, 1)
+        await job.arefresh_from_db()
+        self.assertEqual(job.status, JobStatus.COMPLETED)
+        
+        # A job Celery took first has no lease, so async workers never claim it
+        celery_job = await Job.objects.acreate(guideline_text="Celery guideline", status=JobStatus.PROCESSING)
+        claims = await sync_to_async(claim_pending_jobs)(10)
+        self.assertNotIn(str(celery_job.id), [claim.job_id for claim in claims])
+
+
+@override_settings(GPT_CHUNK_THRESHOLD_CHARS=100, GPT_CHUNK_SIZE_CHARS=60)
+class MapReduceSummaryTest(TestCase):
+    """Test cases for map-reduce summarization of long guidelines."""
+    
+    def setUp(self):
+        self.text = "\n\n".join(
+            f"Section {i}\n\nRequirement {i} applies to every ward." for i in range(4)
+        )
+        self.job = Job.objects.create(guideline_text=self.text)
+    
+    def _mock_client(self, mock_openai, fail_on=None):
+        """Answer chunk prompts with 'chunk N', reduce prompts with 'final'."""
+        def create(**kwargs):
+            prompt = kwargs['messages'][1]['content']
+            if fail_on and fail_on in prompt:
+                raise Exception("Chunk failed")
+            response = MagicMock()
+            if prompt.startswith("Please combine"):
+                response.choices[0].message.content = "final"
+            else:
+                part = prompt.split("part ")[1].split(" of")[0]
+                response.choices[0].message.content = f"chunk {part}"
+            return response
+        mock_openai.return_value.chat.completions.create.side_effect = create
+        return mock_openai.return_value.chat.completions.create
+    
+    def test_split_into_chunks_respects_size_and_sections(self):
+        """Test that chunks stay under the size limit and start at sections."""
+        from .chunking import split_into_chunks
+        
+        chunks = split_into_chunks(self.text, 60)
+        
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 60 for chunk in chunks))
+        self.assertTrue(all(chunk.startswith("Section") for chunk in chunks))
+        self.assertEqual(
+            "".join(chunks).replace("\n", ""), self.text.replace("\n", "")
+        )
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_short_text_uses_single_call(self, mock_openai):
+        """Test that texts under the threshold are summarized in one call."""
+        create = self._mock_client(mock_openai)
+        create.side_effect = None
+        create.return_value.choices[0].message.content = "short"
+        
+        result = GPTChainProcessor().summarize_guideline("Short guideline")
+        
+        self.assertEqual(result, "short")
+        create.assert_called_once()
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_long_text_is_map_reduced_and_persisted(self, mock_openai):
+        """Test that chunk summaries are stored and reduced into one summary."""
+        from .chunking import JobChunkStore
+        from .models import JobChunk
+        
+        create = self._mock_client(mock_openai)
+        
+        result = GPTChainProcessor().summarize_guideline(
+            self.text, chunk_store=JobChunkStore(self.job)
+        )
+        
+        self.assertEqual(result, "final")
+        chunks = JobChunk.objects.filter(job=self.job).order_by('index')
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(chunks[2].summary, "chunk 3")
+        self.assertEqual(create.call_count, 5)
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_retry_only_redoes_failed_chunks(self, mock_openai):
+        """Test that a retry reuses the chunks that already succeeded."""
+        from .chunking import JobChunkStore
+        
+        create = self._mock_client(mock_openai, fail_on="Requirement 2")
+        processor = GPTChainProcessor()
+        
+        with self.assertRaises(Exception):
+            processor.summarize_guideline(self.text, chunk_store=JobChunkStore(self.job))
+        
+        self._mock_client(mock_openai)
+        create.reset_mock()
+        result = processor.summarize_guideline(self.text, chunk_store=JobChunkStore(self.job))
+        
+        self.assertEqual(result, "final")
+        # Only the failed chunk and the reduce pass run again
+        self.assertEqual(create.call_count, 2)
+
+
+class StreamingPartialResultTest(TestCase):
+    """Test cases for streamed completions and partial results."""
+    
+    def setUp(self):
+        self.job = Job.objects.create(
+            guideline_text="Test guideline",
+            status=JobStatus.PROCESSING
+        )
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _stream(self, *deltas):
+        events = []
+        for delta in deltas:
+            event = MagicMock()
+            event.choices[0].delta.content = delta
+            events.append(event)
+        return iter(events)
+    
+    def test_parse_partial_checklist(self):
+        """Test that only fully streamed checklist items are returned."""
+        from .streaming import parse_partial_checklist
+        
+        content = '[{"item": "One", "description": "First"}, {"item": "Tw'
+        
+        self.assertEqual(
+            parse_partial_checklist(content),
+            [{"item": "One", "description": "First"}]
+        )
+        self.assertEqual(parse_partial_checklist('Sure, here'), [])
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_streamed_summary_reports_progress(self, mock_openai):
+        """Test that streaming reports the accumulated text per delta."""
+        create = mock_openai.return_value.chat.completions.create
+        create.return_value = self._stream("Wash ", "hands", None)
+        seen = []
+        
+        result = GPTChainProcessor().summarize_guideline("Text", on_partial=seen.append)
+        
+        self.assertEqual(result, "Wash hands")
+        self.assertEqual(seen, ["Wash ", "Wash hands"])
+        self.assertTrue(create.call_args.kwargs['stream'])
+    
+    def test_writer_throttles_and_exposes_partial_result(self):
+        """Test that partial results are throttled and shown while processing."""
+        from .serializers import JobSerializer
+        from .streaming import PartialResultWriter
+        
+        writer = PartialResultWriter(self.job, interval=60)
+        writer.update_summary("Wash")
+        writer.update_summary("Wash hands")
+        
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.partial_result['summary'], "Wash")
+        
+        writer.update_checklist('[{"item": "Soap", "description": "Use soap"}, {')
+        writer.finish_step()
+        
+        self.job.refresh_from_db()
+        data = JobSerializer(self.job).data
+        self.assertEqual(data['partial_result']['summary'], "Wash hands")
+        self.assertEqual(data['partial_result']['checklist'][0]['item'], "Soap")
+        
+        self.job.status = JobStatus.COMPLETED
+        self.assertIsNone(JobSerializer(self.job).data['partial_result'])
+    
+    @override_settings(GPT_STREAMING_ENABLED=True)
+    @patch('jobs.tasks.get_openai_client')
+    def test_task_clears_partial_result_on_completion(self, mock_openai):
+        """Test that a streamed job ends with its final result only."""
+        mock_openai.return_value.chat.completions.create.side_effect = [
+            self._stream("Summary"),
+            self._stream('[{"item": "Item", ', '"description": "Desc"}]'),
+        ]
+        
+        process_guideline_task(str(self.job.id))
+        
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, JobStatus.COMPLETED)
+        self.assertEqual(self.job.checklist, [{"item": "Item", "description": "Desc"}])
+        self.assertIsNone(self.job.partial_result)
+
+
+class OpenAIClientRegistryTest(TestCase):
+    """Test cases for the process-wide pooled OpenAI client."""
+    
+    def setUp(self):
+        from . import clients
+        
+        clients.reset_clients()
+        self.addCleanup(clients.reset_clients)
+    
+    @override_settings(OPENAI_API_KEY='test-key')
+    def test_client_is_shared_within_process(self):
+        """Test that processors reuse one client and its connection pool."""
+        from .clients import get_openai_client
+        
+        self.assertIs(GPTChainProcessor().client, GPTChainProcessor().client)
+        self.assertIs(GPTChainProcessor().client, get_openai_client())
+    
+    @override_settings(OPENAI_API_KEY='test-key', OPENAI_POOL_MAX_CONNECTIONS=7)
+    def test_client_is_rebuilt_after_fork(self):
+        """Test that a child process does not reuse the parent's client."""
+        from . import clients
+        
+        parent_client = clients.get_openai_client()
+        with patch('jobs.clients.os.getpid', return_value=clients._client_pid + 1):
+            child_client = clients.get_openai_client()
+        
+        self.assertIsNot(parent_client, child_client)
+        pool = child_client._client._transport._pool
+        self.assertEqual(pool._max_connections, 7)
+
+
+class RateLimiterTest(TestCase):
+    """Test cases for the cluster-wide OpenAI rate limiter."""
+    
+    def _rate_limit_error(self):
+        import httpx
+        from openai import RateLimitError
+        
+        request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+        response = httpx.Response(429, request=request, headers={'retry-after': '2'})
+        return RateLimitError("Rate limit reached", response=response, body=None)
+    
+    def test_estimate_tokens_and_retry_after(self):
+        """Test token estimates and Retry-After parsing."""
+        from .ratelimit import estimate_tokens, retry_after_seconds
+        
+        request = {'messages': [{'role': 'user', 'content': 'x' * 400}], 'max_tokens': 100}
+        self.assertEqual(estimate_tokens(request), 200)
+        self.assertEqual(retry_after_seconds({'retry-after-ms': '1500'}), 1.5)
+        self.assertEqual(retry_after_seconds({'retry-after': '3'}), 3.0)
+        self.assertEqual(retry_after_seconds({'retry-after': 'soon'}), 1.0)
+    
+    def test_disabled_limiter_does_not_touch_redis(self):
+        """Test that without configured limits no Redis calls are made."""
+        from .ratelimit import RateLimiter
+        
+        redis_client = MagicMock()
+        limiter = RateLimiter(redis_client=redis_client)
+        with limiter.slot(100) as lease:
+            self.assertIsNone(lease.lease_id)
+        limiter.record_rate_limited(5)
+        
+        redis_client.register_script.assert_not_called()
+    
+    @override_settings(OPENAI_RATE_LIMIT_RPM=100)
+    def test_fails_open_when_redis_is_down(self):
+        """Test that an unreachable Redis does not block OpenAI calls."""
+        import redis
+        
+        from .ratelimit import RateLimiter
+        
+        redis_client = MagicMock()
+        redis_client.register_script.return_value.side_effect = redis.ConnectionError("down")
+        limiter = RateLimiter(redis_client=redis_client)
+        
+        with limiter.slot(100) as lease:
+            self.assertIsNone(lease.lease_id)
+    
+    @override_settings(OPENAI_RATE_LIMIT_RPM=100, OPENAI_RATE_LIMIT_RETRIES=2)
+    def test_rate_limited_call_waits_for_new_slot(self):
+        """Test that a 429 re-acquires a slot instead of failing the step."""
+        from .ratelimit import RateLimiter
+        
+        limiter = RateLimiter(redis_client=MagicMock())
+        limiter.try_acquire = MagicMock(return_value=0)
+        limiter.release = MagicMock()
+        
+        mock_client = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "Summary"
+        mock_response.usage.total_tokens = 42
+        mock_client.chat.completions.create.side_effect = [self._rate_limit_error(), mock_response]
+        
+        processor = GPTChainProcessor(client=mock_client, limiter=limiter)
+        self.assertEqual(processor.summarize_guideline("Guideline"), "Summary")
+        
+        self.assertEqual(limiter.try_acquire.call_count, 2)
+        failed, succeeded = [c.args[0] for c in limiter.release.call_args_list]
+        self.assertFalse(failed.success)
+        self.assertTrue(succeeded.success)
+        self.assertEqual(succeeded.used_tokens, 42)
+    
+    def test_rate_limit_error_is_raised_when_disabled(self):
+        """Test that 429s go to the task retry policy when no limit is configured."""
+        from openai import RateLimitError
+        
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = self._rate_limit_error()
+        
+        processor = GPTChainProcessor(client=mock_client)
+        with self.assertRaises(RateLimitError):
+            processor.summarize_guideline("Guideline")
+        self.assertEqual(mock_client.chat.completions.create.call_count, 1)
+
+
+class JobStepCheckpointTest(TestCase):
+    """Test cases for per-step checkpoints and retry backoff."""
+    
+    def setUp(self):
+        self.job = Job.objects.create(guideline_text="Checkpointed guideline")
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    @patch('jobs.tasks.GPTChainProcessor')
+    def test_retry_skips_completed_steps(self, mock_processor_class):
+        """Test that a failed checklist step is retried without summarizing again."""
+        from .models import JobStep
+        
+        mock_processor = mock_processor_class.return_value
+        mock_processor.summarize_guideline.return_value = "Stored summary"
+        mock_processor.generate_checklist.side_effect = [
+            Exception("API Error"),
+            [{"item": "Item", "description": "Desc"}],
+        ]
+        
+        with self.assertRaises(Exception):
+            process_guideline_task(str(self.job.id))
+        # A direct call cannot retry; a queued retry finds the job still processing
+        Job.objects.filter(id=self.job.id).update(status=JobStatus.PROCESSING)
+        process_guideline_task(str(self.job.id))
+        
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, JobStatus.COMPLETED)
+        self.assertEqual(self.job.summary, "Stored summary")
+        mock_processor.summarize_guideline.assert_called_once()
+        mock_processor.generate_checklist.assert_called_with("Stored summary", on_partial=None)
+        
+        steps = {step.name: step for step in JobStep.objects.filter(job=self.job)}
+        self.assertEqual(steps['summary'].attempts, 1)
+        self.assertEqual(steps['summary'].output, "Stored summary")
+        self.assertEqual(steps['checklist'].attempts, 2)
+        self.assertTrue(steps['checklist'].is_completed)
+        self.assertIsNone(steps['checklist'].error_message)
+        self.assertIsNotNone(steps['checklist'].duration)
+    
+    def test_job_is_not_failed_while_retry_is_pending(self):
+        """Test that only the final failure marks the job failed."""
+        from .tasks import fail_job
+        
+        self.job.status = JobStatus.PROCESSING
+        self.job.save()
+        
+        fail_job(str(self.job.id), Exception("Timeout"), final=False)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, JobStatus.PROCESSING)
+        self.assertEqual(self.job.error_message, "Timeout")
+        
+        fail_job(str(self.job.id), Exception("Timeout"), final=True)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, JobStatus.FAILED)
+    
+    @override_settings(GPT_RETRY_BACKOFF_BASE=10, GPT_RETRY_BACKOFF_MAX=60)
+    def test_retry_backoff_is_exponential_with_jitter(self):
+        """Test that retry delays double per attempt within the cap."""
+        from .tasks import retry_backoff
+        
+        for retries, ceiling in [(0, 10), (1, 20), (2, 40), (3, 60), (8, 60)]:
+            delay = retry_backoff(retries)
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+
+
+class JobStatusCacheTest(APITestCase):
+    """Test cases for cached and conditional job status reads."""
+    
+    def setUp(self):
+        self.job = Job.objects.create(
+            guideline_text="Cached guideline",
+            status=JobStatus.COMPLETED,
+            summary="Summary",
+            checklist=[{"item": "Item", "description": "Desc"}]
+        )
+        self.url = reverse('jobs:get_job_status', kwargs={'event_id': self.job.id})
+        patcher = patch('jobs.events.get_redis_client')
+        self.redis = patcher.start().return_value
+        self.redis.hmget.return_value = [None, None]
+        self.addCleanup(patcher.stop)
+    
+    def test_etag_and_not_modified(self):
+        """Test that a repeat poll with the ETag gets 304 without a body."""
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        
+        self.job.status = JobStatus.FAILED
+        self.job.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_cache_hit_skips_database(self):
+        """Test that a cached terminal job is served without a query."""
+        body = b'{"event_id":"cached","status":"completed"}'
+        self.redis.hmget.return_value = [b'"123.000000"', body]
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH='"123.000000"')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, body)
+        self.assertEqual(response['ETag'], '"123.000000"')
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_miss_caches_only_terminal_jobs(self):
+        """Test that a miss writes the rendered body through for terminal jobs."""
+        from .status_cache import status_cache_key
+        
+        response = self.client.get(self.url)
+        pipeline = self.redis.pipeline.return_value
+        key, = pipeline.hset.call_args.args
+        mapping = pipeline.hset.call_args.kwargs['mapping']
+        self.assertEqual(key, status_cache_key(self.job.id))
+        self.assertEqual(mapping['body'], response.content)
+        self.assertEqual(mapping['etag'], response['ETag'])
+        
+        pipeline.reset_mock()
+        pending = Job.objects.create(guideline_text="Pending guideline")
+        self.client.get(reverse('jobs:get_job_status', kwargs={'event_id': pending.id}))
+        pipeline.hset.assert_not_called()
+    
+    def test_status_writes_invalidate_cache(self):
+        """Test that publishing a non-terminal transition drops the cached entry."""
+        from .status_cache import status_cache_key
+        from .tasks import start_job
+        
+        start_job(self.job)
+        
+        pipeline = self.redis.pipeline.return_value
+        pipeline.delete.assert_called_once_with(status_cache_key(self.job.id))
+        pipeline.hset.assert_not_called()
+
+
+class JobPayloadTest(TestCase):
+    """Test cases for compressed payload storage outside the jobs row."""
+    
+    def setUp(self):
+        self.text = "Wash hands before and after every patient contact. " * 200
+        self.job = Job.objects.create(guideline_text=self.text)
+    
+    def test_payload_is_compressed_and_loaded_lazily(self):
+        """Test that the text round-trips and is only read on access."""
+        from .models import JobPayload
+        
+        payload = JobPayload.objects.get(job=self.job)
+        self.assertLess(len(payload.compressed_text), len(self.text) // 10)
+        self.assertIsNone(payload.compressed_result)
+        
+        with self.assertNumQueries(1):
+            job = Job.objects.get(id=self.job.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(job.guideline_text, self.text)
+            self.assertEqual(job.guideline_text, self.text)
+    
+    def test_status_transition_touches_only_jobs_row(self):
+        """Test that status writes and reads do not read or rewrite payloads."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            job = Job.objects.get(id=self.job.id)
+            job.status = JobStatus.PROCESSING
+            job.save()
+            self.client.get(reverse('jobs:get_job_status', kwargs={'event_id': job.id}))
+        
+        self.assertFalse(any('job_payloads' in query['sql'] for query in queries))
+    
+    def test_result_write_leaves_text_untouched(self):
+        """Test that storing a result only rewrites the result column."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        job = Job.objects.get(id=self.job.id)
+        with CaptureQueriesContext(connection) as queries:
+            job.summary = "Summary"
+            job.checklist = [{"item": "Item", "description": "Desc"}]
+            job.status = JobStatus.COMPLETED
+            job.save()
+        
+        payload_writes = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "job_payloads"')]
+        self.assertEqual(len(payload_writes), 1)
+        self.assertNotIn('compressed_text', payload_writes[0])
+        
+        job.refresh_from_db()
+        self.assertEqual(job.result['summary'], "Summary")
+        self.assertEqual(job.guideline_text, self.text)
+
+
+class JobListAPITest(APITestCase):
+    """Test cases for the keyset-paginated job listing."""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        self.url = reverse('jobs:create_job')
+        self.start = timezone.now()
+        self.jobs = []
+        for i in range(5):
+            job = Job.objects.create(
+                guideline_text=f"Guideline {i}",
+                status=JobStatus.COMPLETED if i % 2 else JobStatus.PENDING
+            )
+            Job.objects.filter(id=job.id).update(created_at=self.start + timedelta(minutes=i))
+            self.jobs.append(job)
+    
+    def test_pages_newest_first_without_payloads(self):
+        """Test that cursors walk every job once and payloads are not read."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        seen = []
+        cursor = None
+        with CaptureQueriesContext(connection) as queries:
+            while True:
+                params = {'limit': 2}
+                if cursor:
+                    params['cursor'] = cursor
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                seen.extend(item['event_id'] for item in response.data['results'])
+                cursor = response.data['next_cursor']
+                if cursor is None:
+                    break
+        
+        self.assertEqual(seen, [str(job.id) for job in reversed(self.jobs)])
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('job_payloads' in q['sql'] or 'COUNT' in q['sql'] for q in queries))
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'event_id', 'status', 'created_at', 'updated_at'}
+        )
+    
+    def test_filters_by_status_and_created_at(self):
+        """Test the status and creation time filters."""
+        from datetime import timedelta
+        
+        response = self.client.get(self.url, {
+            'status': JobStatus.COMPLETED,
+            'created_after': (self.start + timedelta(minutes=2)).isoformat(),
+        })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['event_id'] for item in response.data['results']], [str(self.jobs[3].id)])
+        self.assertIsNone(response.data['next_cursor'])
+    
+    def test_invalid_parameters(self):
+        """Test that bad filters and cursors are rejected."""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cursor', response.data)
+        
+        response = self.client.get(self.url, {'status': 'unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobRetentionTest(TestCase):
+    """Test cases for batched archival and purging of expired jobs."""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start().return_value.hmget.return_value = [None, None]
+        self.addCleanup(patcher.stop)
+        
+        old = timezone.now() - timedelta(days=60)
+        self.expired = []
+        for i in range(5):
+            job = Job.objects.create(
+                guideline_text=f"Old guideline {i}",
+                status=JobStatus.COMPLETED,
+                summary=f"Summary {i}",
+                checklist=[{"item": "Item", "description": "Desc"}]
+            )
+            self.expired.append(job)
+        self.running = Job.objects.create(guideline_text="Old but running", status=JobStatus.PROCESSING)
+        Job.objects.filter(id__in=[job.id for job in self.expired] + [self.running.id]).update(created_at=old)
+        self.recent = Job.objects.create(guideline_text="Recent", status=JobStatus.COMPLETED)
+    
+    @override_settings(JOB_RETENTION_DAYS=30)
+    def test_dry_run_changes_nothing(self):
+        """Test that a dry run only reports the expired terminal jobs."""
+        from .retention import retire_expired_jobs
+        
+        report = retire_expired_jobs(dry_run=True)
+        
+        self.assertEqual(report.processed, 5)
+        self.assertEqual(report.by_status, {JobStatus.COMPLETED: 5})
+        self.assertEqual(Job.objects.count(), 7)
+    
+    @override_settings(JOB_RETENTION_DAYS=30)
+    def test_archives_in_bounded_batches(self):
+        """Test that expired jobs move to the archive a batch at a time."""
+        from .models import JobArchive, JobPayload
+        from .retention import retire_expired_jobs
+        
+        report = retire_expired_jobs(batch_size=2, max_batches=2)
+        self.assertEqual((report.processed, report.batches), (4, 2))
+        
+        report = retire_expired_jobs(batch_size=2)
+        self.assertEqual(report.processed, 1)
+        
+        self.assertEqual(set(Job.objects.values_list('id', flat=True)), {self.running.id, self.recent.id})
+        self.assertEqual(JobArchive.objects.count(), 5)
+        self.assertEqual(JobPayload.objects.count(), 2)
+        
+        url = reverse('jobs:get_job_status', kwargs={'event_id': self.expired[0].id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], JobStatus.COMPLETED)
+        self.assertEqual(response.data['result']['summary'], "Summary 0")
+    
+    @override_settings(JOB_RETENTION_DAYS=30, JOB_RETENTION_MODE='purge')
+    def test_purge_mode_deletes_without_archiving(self):
+        """Test that purge mode deletes expired jobs outright."""
+        from django.core.management import call_command
+        from .models import JobArchive
+        
+        call_command('retire_jobs', stdout=MagicMock())
+        
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(JobArchive.objects.count(), 0)
+
+
+class QueueRoutingTest(APITestCase):
+    """Test cases for size- and priority-aware queue routing."""
+    
+    @override_settings(JOB_INTERACTIVE_MAX_CHARS=100)
+    def test_classify_job(self):
+        """Test that size and priority pick the queue."""
+        from .routing import classify_job
+        
+        self.assertEqual(classify_job("short"), 'interactive')
+        self.assertEqual(classify_job("x" * 101), 'bulk')
+        self.assertEqual(classify_job("x" * 101, 'high'), 'interactive')
+        self.assertEqual(classify_job("short", 'low'), 'bulk')
+    
+    @override_settings(JOB_INTERACTIVE_MAX_CHARS=100)
+    @patch('jobs.tasks.process_guideline_task')
+    def test_create_job_publishes_to_classified_queue(self, mock_task):
+        """Test that single jobs are published to their queue."""
+        url = reverse('jobs:create_job')
+        small = self.client.post(url, {'guideline_text': "Short guideline"}, format='json')
+        large = self.client.post(url, {'guideline_text': "Long guideline " * 20}, format='json')
+        
+        self.assertEqual(Job.objects.get(id=small.data['event_id']).queue, 'interactive')
+        self.assertEqual(Job.objects.get(id=large.data['event_id']).queue, 'bulk')
+        queues = [c.kwargs['queue'] for c in mock_task.apply_async.call_args_list]
+        self.assertEqual(queues, ['interactive', 'bulk'])
+    
+    @patch('jobs.tasks.group')
+    def test_batch_items_default_to_bulk(self, mock_group):
+        """Test that batch items go to bulk unless sent with high priority."""
+        payload = [
+            {'guideline_text': "Backfill guideline 1"},
+            {'guideline_text': "Backfill guideline 2"},
+            {'guideline_text': "Urgent guideline", 'priority': 'high'},
+        ]
+        
+        with patch('jobs.tasks.process_guideline_task') as mock_task:
+            response = self.client.post(reverse('jobs:create_jobs_batch'), payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_group.return_value.apply_async.assert_called_once_with(queue='bulk')
+        mock_task.apply_async.assert_called_once_with((str(response.data[2]['event_id']),), queue='interactive')
+    
+    def test_async_worker_claims_interactive_first(self):
+        """Test that async workers claim interactive jobs before older bulk ones."""
+        from .async_worker import claim_pending_jobs
+        
+        bulk = Job.objects.create(guideline_text="Bulk guideline", queue='bulk')
+        interactive = Job.objects.create(guideline_text="Interactive guideline")
+        
+        with patch('jobs.events.get_redis_client'):
+            claimed = claim_pending_jobs(1)
+        
+        self.assertEqual([claim.job_id for claim in claimed], [str(interactive.id)])
+        bulk.refresh_from_db()
+        self.assertEqual(bulk.status, JobStatus.PENDING)
+
+
+class BenchmarkHarnessTest(APITestCase):
+    """Test cases for the fake OpenAI API and query counting used by load tests."""
+    
+    def start_server(self, **config):
+        from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+        
+        server = start_fake_openai(FakeOpenAIConfig(latency_ms=1, latency_sigma=0, stream_chunk_ms=0, **config))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+    
+    def test_processor_runs_against_fake_api(self):
+        """Test that the real client and chain parse the fake API's completions."""
+        from .clients import build_openai_client
+        
+        server = self.start_server()
+        with override_settings(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='fake'):
+            processor = GPTChainProcessor(client=build_openai_client())
+            partials = []
+            summary = processor.summarize_guideline("Wash hands before every patient contact.", on_partial=partials.append)
+            checklist = processor.generate_checklist(summary)
+        
+        self.assertIn("escalation path", summary)
+        self.assertEqual(partials[-1], summary)
+        self.assertEqual(len(checklist), 5)
+        self.assertEqual(checklist[0]['item'], "Step 1")
+        self.assertEqual(server.counts['requests'], 2)
+    
+    def test_fake_api_injects_rate_limits(self):
+        """Test that injected 429s reach the client with a Retry-After."""
+        from openai import RateLimitError
+        from .clients import build_openai_client
+        
+        server = self.start_server(rate_limit_rate=1.0, retry_after_ms=1500)
+        with override_settings(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='fake', OPENAI_MAX_RETRIES=0):
+            processor = GPTChainProcessor(client=build_openai_client())
+            with self.assertRaises(RateLimitError) as ctx:
+                processor.summarize_guideline("Test guideline")
+        
+        self.assertEqual(ctx.exception.response.headers['retry-after-ms'], '1500')
+        self.assertEqual(server.counts['rate_limited'], 1)
+    
+    @patch('jobs.tasks.process_guideline_task')
+    def test_query_count_header(self, mock_task):
+        """Test that the middleware reports the queries each request ran."""
+        from django.conf import settings
+        
+        middleware = ['jobs.middleware.QueryCountMiddleware'] + settings.MIDDLEWARE
+        with override_settings(MIDDLEWARE=middleware), patch('jobs.events.get_redis_client'):
+            response = self.client.post(reverse('jobs:create_job'), {'guideline_text': "Test guideline"}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+
+class JobMetricsTest(APITestCase):
+    """Test cases for Prometheus metrics and per-job token usage."""
+    
+    def sample(self, name, labels=None):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels or {}) or 0
+    
+    def completion(self, content, prompt_tokens, completion_tokens):
+        from types import SimpleNamespace
+        
+        response = MagicMock()
+        response.choices[0].message.content = content
+        response.usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+        return response
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_task_records_token_usage(self, mock_openai):
+        """Test that token usage is counted and stored on the job."""
+        mock_openai.return_value.chat.completions.create.side_effect = [
+            self.completion("Test summary", 120, 30),
+            self.completion("Not JSON", 60, 20),
+        ]
+        job = Job.objects.create(guideline_text="Test guideline")
+        tokens = {'kind': 'prompt', 'model': 'gpt-3.5-turbo'}
+        prompt_before = self.sample('guideline_openai_tokens_total', tokens)
+        fallbacks_before = self.sample('guideline_checklist_parse_fallbacks_total')
+        waits_before = self.sample('guideline_job_queue_wait_seconds_count', {'queue': 'interactive'})
+        
+        process_guideline_task(str(job.id))
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.COMPLETED)
+        self.assertEqual((job.prompt_tokens, job.completion_tokens), (180, 50))
+        self.assertEqual(self.sample('guideline_openai_tokens_total', tokens) - prompt_before, 180)
+        self.assertEqual(self.sample('guideline_checklist_parse_fallbacks_total') - fallbacks_before, 1)
+        self.assertEqual(self.sample('guideline_job_queue_wait_seconds_count', {'queue': 'interactive'}) - waits_before, 1)
+        self.assertGreater(self.sample('guideline_job_step_seconds_count', {'step': 'checklist'}), 0)
+    
+    def test_failed_attempts_keep_usage(self):
+        """Test that retried and failed attempts add their usage and are counted."""
+        from .metrics import TokenUsage
+        from .tasks import fail_job
+        
+        job = Job.objects.create(guideline_text="Test guideline", status=JobStatus.PROCESSING, prompt_tokens=10)
+        retries_before = self.sample('guideline_job_retries_total')
+        failures_before = self.sample('guideline_job_failures_total')
+        
+        fail_job(str(job.id), Exception("Timeout"), final=False, usage=TokenUsage(prompt_tokens=40, completion_tokens=5))
+        fail_job(str(job.id), Exception("Timeout"), final=True, usage=TokenUsage(prompt_tokens=40))
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual((job.prompt_tokens, job.completion_tokens), (90, 5))
+        self.assertEqual(self.sample('guideline_job_retries_total') - retries_before, 1)
+        self.assertEqual(self.sample('guideline_job_failures_total') - failures_before, 1)
+    
+    def test_usage_is_tracked_per_context(self):
+        """Test that concurrent jobs on the async worker collect their own usage."""
+        import asyncio
+        from types import SimpleNamespace
+        from .metrics import record_token_usage, track_job_usage
+        
+        async def job(tokens):
+            with track_job_usage() as usage:
+                await asyncio.sleep(0)
+                record_token_usage(SimpleNamespace(prompt_tokens=tokens, completion_tokens=1), 'gpt-3.5-turbo')
+                await asyncio.sleep(0)
+                return usage.prompt_tokens
+        
+        async def main():
+            return await asyncio.gather(job(5), job(7))
+        
+        self.assertEqual(asyncio.run(main()), [5, 7])
+    
+    def test_metrics_endpoint(self):
+        """Test that /metrics exposes job counts per status alongside the histograms."""
+        Job.objects.create(guideline_text="Pending guideline")
+        Job.objects.create(guideline_text="Done guideline", status=JobStatus.COMPLETED)
+        
+        response = self.client.get('/metrics')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('guideline_jobs{status="pending"} 1.0', body)
+        self.assertIn('guideline_jobs{status="failed"} 0.0', body)
+        self.assertIn('# TYPE guideline_job_end_to_end_seconds histogram', body)
+        
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_terminal_job_counts_are_cached_between_scrapes(self):
+        """Test that only pending and processing jobs are counted on every scrape."""
+        from .metrics import JobStateCollector
+        
+        collector = JobStateCollector()
+        Job.objects.create(guideline_text="Done guideline", status=JobStatus.COMPLETED)
+        
+        def gauge():
+            jobs = next(iter(collector.collect()))
+            return {sample.labels['status']: sample.value for sample in jobs.samples}
+        
+        with patch.object(collector, 'queue_depth', return_value=None):
+            with self.assertNumQueries(2):
+                self.assertEqual(gauge(), {'pending': 0, 'processing': 0, 'completed': 1, 'failed': 0})
+            Job.objects.create(guideline_text="Pending guideline")
+            Job.objects.create(guideline_text="Failed guideline", status=JobStatus.FAILED)
+            with self.assertNumQueries(1):
+                self.assertEqual(gauge(), {'pending': 1, 'processing': 0, 'completed': 1, 'failed': 0})
+            with override_settings(METRICS_TERMINAL_COUNT_TTL=0):
+                self.assertEqual(gauge()['failed'], 1)
+
+
+class StructuredPipelineTest(APITestCase):
+    """Test cases for the single-call structured pipeline and JSON extraction."""
+    
+    def test_extract_json_tolerates_wrapping(self):
+        """Test that fenced and chatty completions still parse."""
+        from .structured import StructuredOutputError, extract_json
+        
+        items = [{"item": "Wash hands", "description": "Before contact"}]
+        self.assertEqual(extract_json(json.dumps(items)), items)
+        self.assertEqual(extract_json(f"```json\n{json.dumps(items)}\n```"), items)
+        self.assertEqual(extract_json(f"Here is the checklist:\n{json.dumps(items)}\nLet me know!"), items)
+        with self.assertRaises(StructuredOutputError):
+            extract_json("No JSON here")
+    
+    def test_parse_checklist_accepts_fenced_output(self):
+        """Test that the chain's checklist step no longer falls back on fenced JSON."""
+        with patch('jobs.tasks.get_openai_client'):
+            processor = GPTChainProcessor()
+        
+        checklist = processor.parse_checklist('```json\n[{"item": "Audit", "description": "Monthly"}]\n```')
+        
+        self.assertEqual(checklist, [{"item": "Audit", "description": "Monthly"}])
+    
+    def test_parse_result_requires_both_parts(self):
+        """Test that a structured completion without a checklist is an error."""
+        from .structured import StructuredOutputError, parse_result
+        
+        result = parse_result('{"summary": " Summary ", "checklist": []}')
+        
+        self.assertEqual(result, {'summary': "Summary", 'checklist': []})
+        with self.assertRaises(StructuredOutputError):
+            parse_result('{"summary": "Summary"}')
+    
+    @patch('jobs.tasks.process_guideline_task')
+    def test_pipeline_selected_per_job_or_deployment(self, mock_task):
+        """Test that jobs take the requested pipeline, defaulting to GPT_PIPELINE_MODE."""
+        url = reverse('jobs:create_job')
+        chain = self.client.post(url, {'guideline_text': "Guideline one"}, format='json')
+        single = self.client.post(url, {'guideline_text': "Guideline two", 'pipeline': 'single'}, format='json')
+        with override_settings(GPT_PIPELINE_MODE='single'):
+            default = self.client.post(url, {'guideline_text': "Guideline three"}, format='json')
+        
+        self.assertEqual(Job.objects.get(id=chain.data['event_id']).pipeline, 'chain')
+        self.assertEqual(Job.objects.get(id=single.data['event_id']).pipeline, 'single')
+        self.assertEqual(Job.objects.get(id=default.data['event_id']).pipeline, 'single')
+    
+    def test_single_call_job_against_fake_api(self):
+        """Test that a single-call job completes from one structured request."""
+        from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+        from .clients import build_openai_client
+        from .models import JobStep
+        
+        server = start_fake_openai(FakeOpenAIConfig(latency_ms=1, latency_sigma=0))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        job = Job.objects.create(guideline_text="Wash hands before every patient contact.", pipeline='single')
+        
+        with override_settings(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='fake'):
+            with patch('jobs.tasks.get_openai_client', return_value=build_openai_client()):
+                process_guideline_task(str(job.id))
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.COMPLETED)
+        self.assertIn("escalation path", job.summary)
+        self.assertEqual(len(job.checklist), 5)
+        self.assertEqual(server.counts['requests'], 1)
+        self.assertEqual(list(JobStep.objects.filter(job=job).values_list('name', flat=True)), ['combined'])
+
+
+@override_settings(GPT_BATCH_MIN_JOBS=1, OPENAI_API_KEY='fake')
+class ProviderBatchTest(APITestCase):
+    """Test cases for deferred jobs processed through the batch API."""
+    
+    def setUp(self):
+        from benchmarks.fake_openai import FakeOpenAIConfig, start_fake_openai
+        
+        self.server = start_fake_openai(FakeOpenAIConfig(latency_ms=1, latency_sigma=0))
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def client_for_server(self):
+        from .clients import build_openai_client
+        
+        with override_settings(OPENAI_BASE_URL=self.server.base_url):
+            return build_openai_client()
+    
+    @patch('jobs.tasks.process_guideline_task')
+    def test_deferred_jobs_are_not_queued(self, mock_task):
+        """Test that deferred jobs wait for a batch and cannot be high priority."""
+        from .async_worker import claim_pending_jobs
+        
+        url = reverse('jobs:create_job')
+        response = self.client.post(url, {'guideline_text': "Backfill guideline", 'deferred': True}, format='json')
+        rejected = self.client.post(
+            url,
+            {'guideline_text': "Urgent guideline", 'deferred': True, 'priority': 'high'},
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(rejected.status_code, status.HTTP_400_BAD_REQUEST)
+        job = Job.objects.get(id=response.data['event_id'])
+        self.assertTrue(job.deferred)
+        self.assertEqual(job.queue, 'bulk')
+        mock_task.apply_async.assert_not_called()
+        self.assertEqual(claim_pending_jobs(10), [])
+    
+    @patch('jobs.views.enqueue_jobs')
+    def test_interactive_job_does_not_follow_deferred_twin(self, mock_enqueue):
+        """Test that only deferred jobs join an identical deferred job in flight."""
+        url = reverse('jobs:create_job')
+        text = "Backfill guideline"
+        deferred = self.client.post(url, {'guideline_text': text, 'deferred': True}, format='json')
+        interactive = self.client.post(url, {'guideline_text': text}, format='json')
+        batch = self.client.post(
+            reverse('jobs:create_jobs_batch'),
+            [{'guideline_text': text, 'deferred': True}, {'guideline_text': text, 'priority': 'high'}],
+            format='json'
+        )
+        
+        interactive_job = Job.objects.get(id=interactive.data['event_id'])
+        self.assertIsNone(interactive_job.source_job_id)
+        mock_enqueue.assert_any_call([interactive_job.id], queue='interactive')
+        deferred_follower, interactive_follower = [Job.objects.get(id=item['event_id']) for item in batch.data]
+        self.assertEqual(str(deferred_follower.source_job_id), str(deferred.data['event_id']))
+        self.assertEqual(interactive_follower.source_job_id, interactive_job.id)
+    
+    def test_batches_complete_chain_and_single_call_jobs(self):
+        """Test that summary, checklist and combined batches fan results out to jobs."""
+        from .batching import poll_provider_batches, submit_deferred_jobs
+        from .models import ProviderBatch
+        
+        client = self.client_for_server()
+        chain_jobs = [Job.objects.create(guideline_text=f"Guideline {i}", deferred=True) for i in range(2)]
+        single_job = Job.objects.create(guideline_text="Guideline single", deferred=True, pipeline='single')
+        
+        batches = submit_deferred_jobs(client)
+        self.assertEqual(sorted(batch.phase for batch in batches), ['combined', 'summary'])
+        self.assertEqual(Job.objects.filter(status=JobStatus.PROCESSING).count(), 3)
+        
+        # Summaries come back and are resubmitted as a checklist batch
+        self.assertEqual(poll_provider_batches(client), 2)
+        single_job.refresh_from_db()
+        self.assertEqual(single_job.status, JobStatus.COMPLETED)
+        self.assertEqual(ProviderBatch.objects.get(phase='checklist').job_count, 2)
+        
+        self.assertEqual(poll_provider_batches(client), 1)
+        for job in chain_jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, JobStatus.COMPLETED)
+            self.assertIn("escalation path", job.summary)
+            self.assertEqual(len(job.checklist), 5)
+            self.assertGreater(job.prompt_tokens, 0)
+        self.assertEqual(self.server.counts['batches'], 3)
+        self.assertEqual(self.server.counts['requests'], 0)
+    
+    def test_failed_phase_keeps_earlier_batches(self):
+        """Test that a phase failing to submit leaves the batch already created recorded, and is retried alone."""
+        from .batching import submit_deferred_jobs
+        from .models import ProviderBatch
+        
+        client = self.client_for_server()
+        chain_job = Job.objects.create(guideline_text="Guideline chain", deferred=True)
+        single_job = Job.objects.create(guideline_text="Guideline single", deferred=True, pipeline='single')
+        
+        # The summary batch is created, then the provider fails the combined one
+        create_batch = client.batches.create
+        outcomes = iter([None, Exception("Provider down")])
+        
+        def create(**kwargs):
+            error = next(outcomes)
+            if error is not None:
+                raise error
+            return create_batch(**kwargs)
+        with patch.object(client.batches, 'create', side_effect=create):
+            with self.assertRaisesMessage(Exception, "Provider down"):
+                submit_deferred_jobs(client)
+        
+        chain_job.refresh_from_db()
+        single_job.refresh_from_db()
+        self.assertEqual(ProviderBatch.objects.get().phase, 'summary')
+        self.assertEqual(chain_job.status, JobStatus.PROCESSING)
+        self.assertIsNotNone(chain_job.batch_id)
+        self.assertEqual((single_job.status, single_job.batch_id), (JobStatus.PENDING, None))
+        
+        batches = submit_deferred_jobs(client)
+        self.assertEqual([batch.phase for batch in batches], ['combined'])
+        self.assertEqual(self.server.counts['batches'], 2)
+    
+    @override_settings(GPT_BATCH_MIN_JOBS=10, GPT_BATCH_MAX_WAIT=3600)
+    def test_jobs_accumulate_until_enough_or_old(self):
+        """Test that a batch waits for more jobs unless the oldest has waited too long."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .batching import submit_deferred_jobs
+        
+        client = self.client_for_server()
+        job = Job.objects.create(guideline_text="Backfill guideline", deferred=True)
+        
+        self.assertEqual(submit_deferred_jobs(client), [])
+        
+        Job.objects.filter(id=job.id).update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(len(submit_deferred_jobs(client)), 1)
+    
+    @patch('jobs.batching.enqueue_jobs')
+    def test_failed_requests_continue_synchronously(self, mock_enqueue):
+        """Test that jobs without a batch result move to the synchronous bulk path."""
+        from .batching import poll_provider_batches, submit_deferred_jobs
+        
+        self.server.config.error_rate = 1.0
+        client = self.client_for_server()
+        job = Job.objects.create(guideline_text="Backfill guideline", deferred=True)
+        
+        submit_deferred_jobs(client)
+        with self.captureOnCommitCallbacks(execute=True):
+            poll_provider_batches(client)
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.PENDING)
+        self.assertFalse(job.deferred)
+        self.assertIsNone(job.batch_id)
+        mock_enqueue.assert_called_once_with([job.id], queue='bulk')
+
+
+@override_settings(WEBHOOK_ALLOWED_HOSTS=['example.com'])
+class WebhookTest(APITestCase):
+    """Test cases for completion webhooks."""
+    
+    def setUp(self):
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.received = []
+    
+    def _dispatcher(self, status_code=200):
+        import httpx
+        from .webhooks import WebhookDispatcher
+        
+        def handler(request):
+            self.received.append(request)
+            return httpx.Response(status_code)
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return WebhookDispatcher(concurrency=4, batch_size=10, poll_interval=0.01, client=client)
+    
+    @patch('jobs.tasks.process_guideline_task')
+    def test_terminal_jobs_schedule_one_delivery(self, mock_task):
+        """Test that a job with a callback URL is called back once it finishes."""
+        from .models import WebhookDelivery
+        from .tasks import complete_job
+        
+        url = reverse('jobs:create_job')
+        rejected = self.client.post(
+            url,
+            {'guideline_text': "Test guideline", 'callback_url': "ftp://example.com/hook"},
+            format='json'
+        )
+        response = self.client.post(
+            url,
+            {'guideline_text': "Test guideline", 'callback_url': "https://example.com/hook"},
+            format='json'
+        )
+        Job.objects.create(guideline_text="No callback", status=JobStatus.COMPLETED)
+        
+        self.assertEqual(rejected.status_code, status.HTTP_400_BAD_REQUEST)
+        job = Job.objects.get(id=response.data['event_id'])
+        self.assertFalse(WebhookDelivery.objects.exists())
+        
+        complete_job(job, "Summary", [{"item": "Item", "description": "Description"}])
+        complete_job(job, "Summary", [{"item": "Item", "description": "Description"}])
+        
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual(delivery.job_id, job.id)
+        self.assertEqual(delivery.url, "https://example.com/hook")
+    
+    def test_cached_result_schedules_delivery_at_creation(self):
+        """Test that a job completed from the result cache is called back too."""
+        from .models import WebhookDelivery
+        from .result_cache import compute_content_hash
+        
+        Job.objects.create(
+            guideline_text="Cached guideline",
+            content_hash=compute_content_hash("Cached guideline"),
+            status=JobStatus.COMPLETED,
+            summary="Summary",
+            checklist=[{"item": "Item", "description": "Description"}]
+        )
+        
+        response = self.client.post(
+            reverse('jobs:create_jobs_batch'),
+            [{'guideline_text': "Cached guideline", 'callback_url': "https://example.com/hook"}],
+            format='json'
+        )
+        
+        self.assertEqual(response.data[0]['status'], JobStatus.COMPLETED)
+        self.assertEqual(WebhookDelivery.objects.get().job_id, response.data[0]['event_id'])
+    
+    @override_settings(WEBHOOK_SIGNING_SECRET='secret')
+    async def test_dispatcher_delivers_signed_status_response(self):
+        """Test that the dispatcher POSTs the job's status response and records it."""
+        import hashlib
+        import hmac
+        from .models import WebhookDelivery, WebhookDeliveryStatus
+        
+        job = await Job.objects.acreate(guideline_text="Guideline", status=JobStatus.FAILED, error_message="Boom")
+        delivery = await WebhookDelivery.objects.acreate(job=job, url="https://example.com/hook")
+        
+        self.assertEqual(await self._dispatcher().run_once(), 1)
+        
+        request = self.received[0]
+        body = json.loads(request.content)
+        self.assertEqual(body['event_id'], str(job.id))
+        self.assertEqual(body['status'], JobStatus.FAILED)
+        self.assertEqual(request.headers['X-Webhook-Event'], 'job.failed')
+        expected = hmac.new(b'secret', request.content, hashlib.sha256).hexdigest()
+        self.assertEqual(request.headers['X-Webhook-Signature'], f'sha256={expected}')
+        await delivery.arefresh_from_db()
+        self.assertEqual(delivery.status, WebhookDeliveryStatus.DELIVERED)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.last_status_code, 200)
+    
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2)
+    async def test_failed_attempts_back_off_then_give_up(self):
+        """Test that non-2xx answers are retried later and abandoned after the last attempt."""
+        from django.utils import timezone
+        from .models import WebhookDelivery, WebhookDeliveryStatus
+        
+        job = await Job.objects.acreate(guideline_text="Guideline", status=JobStatus.COMPLETED)
+        delivery = await WebhookDelivery.objects.acreate(job=job, url="https://example.com/hook")
+        dispatcher = self._dispatcher(status_code=503)
+        
+        await dispatcher.run_once()
+        await delivery.arefresh_from_db()
+        self.assertEqual(delivery.status, WebhookDeliveryStatus.PENDING)
+        self.assertEqual(delivery.last_error, "HTTP 503")
+        self.assertGreater(delivery.next_attempt_at, timezone.now())
+        self.assertEqual(await dispatcher.run_once(), 0)
+        
+        await WebhookDelivery.objects.filter(id=delivery.id).aupdate(next_attempt_at=timezone.now())
+        await dispatcher.run_once()
+        await delivery.arefresh_from_db()
+        self.assertEqual(delivery.status, WebhookDeliveryStatus.FAILED)
+        self.assertEqual(delivery.attempts, 2)
+    
+    @patch('jobs.tasks.process_guideline_task')
+    def test_internal_callback_hosts_are_rejected(self, mock_task):
+        """Test that callback URLs resolving to non-public addresses are refused unless allowed."""
+        url = reverse('jobs:create_job')
+        
+        for callback_url in (
+            "http://169.254.169.254/latest/meta-data/",
+            "http://127.0.0.1:8000/hook",
+            "http://10.0.0.5/hook",
+            "http://[::ffff:192.168.1.1]/hook",
+            "http://localhost/hook",
+        ):
+            response = self.client.post(url, {'guideline_text': "Guideline", 'callback_url': callback_url}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, callback_url)
+            self.assertIn('callback_url', response.data)
+        
+        public = self.client.post(
+            url, {'guideline_text': "Guideline", 'callback_url': "https://93.184.216.34/hook"}, format='json'
+        )
+        self.assertEqual(public.status_code, status.HTTP_201_CREATED)
+        with self.settings(WEBHOOK_ALLOWED_HOSTS=['127.0.0.0/8']):
+            local = self.client.post(
+                url, {'guideline_text': "Guideline", 'callback_url': "http://127.0.0.1:8000/hook"}, format='json'
+            )
+        self.assertEqual(local.status_code, status.HTTP_201_CREATED)
+    
+    async def test_delivery_connects_to_the_checked_address(self):
+        """Test that deliveries go to the address just checked and are refused once the host rebinds inward."""
+        from .models import WebhookDelivery, WebhookDeliveryStatus
+        
+        job = await Job.objects.acreate(guideline_text="Guideline", status=JobStatus.COMPLETED)
+        delivery = await WebhookDelivery.objects.acreate(job=job, url="https://hooks.example.org:8443/hook")
+        dispatcher = self._dispatcher()
+        
+        with patch('jobs.callback_urls.aresolve', return_value=['93.184.216.34']):
+            await dispatcher.run_once()
+        request = self.received[0]
+        self.assertEqual(str(request.url), "https://93.184.216.34:8443/hook")
+        self.assertEqual(request.headers['Host'], "hooks.example.org:8443")
+        self.assertEqual(request.extensions['sni_hostname'], "hooks.example.org")
+        
+        rebound = await WebhookDelivery.objects.acreate(
+            job=await Job.objects.acreate(guideline_text="Guideline", status=JobStatus.COMPLETED),
+            url="https://hooks.example.org/hook"
+        )
+        with patch('jobs.callback_urls.aresolve', return_value=['169.254.169.254']):
+            await dispatcher.run_once()
+        self.assertEqual(len(self.received), 1)
+        await rebound.arefresh_from_db()
+        self.assertEqual(rebound.status, WebhookDeliveryStatus.PENDING)
+        self.assertIn("non-public address 169.254.169.254", rebound.last_error)
+
+
+class AsyncViewsTest(TestCase):
+    """Test cases for the async API views served under ASGI."""
+    
+    def setUp(self):
+        from unittest.mock import AsyncMock
+        
+        self.redis = MagicMock()
+        self.redis.hmget = AsyncMock(return_value=[None, None])
+        self.redis.pipeline.return_value.execute = AsyncMock()
+        self.redis.pubsub.return_value.subscribe = AsyncMock()
+        self.redis.pubsub.return_value.aclose = AsyncMock()
+        sync_redis = MagicMock()
+        sync_redis.hmget.return_value = [None, None]
+        for target, value in (('jobs.events.get_redis_client', sync_redis),
+                              ('jobs.events.get_async_redis_client', self.redis)):
+            patcher = patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def _factory(self):
+        from django.test import AsyncRequestFactory
+        
+        return AsyncRequestFactory()
+    
+    @patch('jobs.tasks.process_guideline_task')
+    async def test_create_job_matches_sync_view(self, mock_task):
+        """Test that the async create view validates, saves and enqueues like the DRF view."""
+        from asgiref.sync import sync_to_async
+        from . import async_views
+        
+        factory = self._factory()
+        url = reverse('jobs:create_job')
+        response = await async_views.create_job(
+            factory.post(url, {'guideline_text': "Async guideline"}, content_type='application/json')
+        )
+        invalid = await async_views.create_job(
+            factory.post(url, {'guideline_text': "   "}, content_type='application/json')
+        )
+        unsupported = await async_views.create_job(
+            factory.post(url, "guideline_text=x", content_type='application/x-www-form-urlencoded')
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job = await Job.objects.select_related('payload').aget(id=json.loads(response.content)['event_id'])
+        self.assertEqual(job.guideline_text, "Async guideline")
+        mock_task.apply_async.assert_called_once_with((str(job.id),), queue=job.queue)
+        
+        sync_invalid = await sync_to_async(self.client.post)(
+            url, {'guideline_text': "   "}, content_type='application/json'
+        )
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(invalid.content, sync_invalid.content)
+        self.assertEqual(unsupported.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    
+    @patch('jobs.tasks.process_guideline_task')
+    async def test_create_job_checks_parent_off_the_event_loop(self, mock_task):
+        """Test that the async create view accepts a live parent_event_id and rejects an unknown one."""
+        from asgiref.sync import sync_to_async
+        from . import async_views
+        
+        parent = await sync_to_async(Job.objects.create)(guideline_text="Version one")
+        factory = self._factory()
+        url = reverse('jobs:create_job')
+        response = await async_views.create_job(factory.post(
+            url, {'guideline_text': "Version two", 'parent_event_id': str(parent.id)}, content_type='application/json'
+        ))
+        unknown = {'guideline_text': "Version two", 'parent_event_id': str(uuid.uuid4())}
+        invalid = await async_views.create_job(factory.post(url, unknown, content_type='application/json'))
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job = await Job.objects.aget(id=json.loads(response.content)['event_id'])
+        self.assertEqual(job.parent_id, parent.id)
+        
+        sync_invalid = await sync_to_async(self.client.post)(url, unknown, content_type='application/json')
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(invalid.content, sync_invalid.content)
+    
+    async def test_job_status_matches_sync_view(self):
+        """Test that the async status view returns the same body, ETag, 304 and 404."""
+        from asgiref.sync import sync_to_async
+        from . import async_views
+        
+        job = await Job.objects.acreate(
+            guideline_text="Guideline",
+            status=JobStatus.COMPLETED,
+            summary="Summary",
+            checklist=[{"item": "Item", "description": "Description"}]
+        )
+        url = reverse('jobs:get_job_status', kwargs={'event_id': job.id})
+        factory = self._factory()
+        
+        sync_response = await sync_to_async(self.client.get)(url)
+        response = await async_views.get_job_status(factory.get(url), event_id=job.id)
+        not_modified = await async_views.get_job_status(
+            factory.get(url, headers={'If-None-Match': response['ETag']}),
+            event_id=job.id
+        )
+        missing = await async_views.get_job_status(factory.get(url), event_id=uuid.uuid4())
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, sync_response.content)
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        self.redis.pipeline.return_value.execute.assert_awaited()
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(missing.content), {'detail': 'Not found.'})
+    
+    async def test_cached_status_is_served_without_query(self):
+        """Test that a status cache hit is answered from Redis alone."""
+        from . import async_views
+        
+        event_id = uuid.uuid4()
+        self.redis.hmget.return_value = [b'"1.0"', b'{"status":"completed"}']
+        
+        response = await async_views.get_job_status(self._factory().get('/'), event_id=event_id)
+        
+        self.assertEqual(response.content, b'{"status":"completed"}')
+        self.assertEqual(response['ETag'], '"1.0"')
+    
+    async def test_event_stream_is_async(self):
+        """Test that the SSE view streams an async iterator that ASGI servers can send incrementally."""
+        from . import async_views
+        
+        job = await Job.objects.acreate(guideline_text="Guideline", status=JobStatus.FAILED)
+        
+        response = await async_views.stream_job_events(self._factory().get('/'), event_id=job.id)
+        
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertIn(b'"status": "failed"', b''.join(chunks))
+        self.redis.pubsub.return_value.aclose.assert_awaited_once()
+
+
+@override_settings(NEAR_DUPLICATE_MODE='flag', NEAR_DUPLICATE_THRESHOLD=0.8)
+@patch('jobs.views.enqueue_jobs')
+class NearDuplicateTest(APITestCase):
+    """Test cases for near-duplicate detection across guideline revisions."""
+    
+    original = (
+        "Effective 1 March 2024 all clinical staff must perform hand hygiene before and after every "
+        "patient contact. Sterile equipment is checked before each procedure and any defect is reported "
+        "to the ward manager within one hour. Incidents are documented in the electronic record and "
+        "reviewed at the weekly audit meeting. Training on the protocol is repeated every twelve months "
+        "and attendance is recorded by the education team."
+    )
+    revision = original.replace("1 March 2024", "1 April 2025").replace("within one hour", "within two hours")
+    
+    def setUp(self):
+        patcher = patch('jobs.events.get_redis_client')
+        patcher.start().return_value.hmget.return_value = [None, None]
+        self.addCleanup(patcher.stop)
+    
+    def _completed_original(self, text=None):
+        from .tasks import complete_job
+        
+        response = self.client.post(reverse('jobs:create_job'), {'guideline_text': text or self.original}, format='json')
+        job = Job.objects.get(id=response.data['event_id'])
+        complete_job(job, "Hygiene summary", [{"item": "Hand hygiene", "description": "Before contact"}])
+        return job
+    
+    def test_signatures_estimate_similarity(self, mock_enqueue):
+        """Test that a light revision scores high, shares band keys and unrelated text does not."""
+        from . import minhash
+        
+        original = minhash.signature(self.original)
+        revision = minhash.signature(self.revision)
+        unrelated = minhash.signature("Visitors sign in at reception and wear a badge at all times on site.")
+        
+        self.assertGreater(minhash.similarities(original, revision[None, :])[0], 0.8)
+        self.assertLess(minhash.similarities(original, unrelated[None, :])[0], 0.2)
+        self.assertTrue(set(minhash.band_keys(original)) & set(minhash.band_keys(revision)))
+        np_bytes = minhash.to_bytes(original)
+        self.assertEqual(len(np_bytes), minhash.NUM_PERM * 4)
+        self.assertTrue((minhash.from_bytes(np_bytes) == original).all())
+    
+    def test_flag_mode_records_match_and_still_processes(self, mock_enqueue):
+        """Test that a revision is flagged with its near-duplicate but runs its own chain."""
+        original = self._completed_original()
+        
+        response = self.client.post(reverse('jobs:create_job'), {'guideline_text': self.revision}, format='json')
+        
+        self.assertEqual(response.data['status'], JobStatus.PENDING)
+        job = Job.objects.get(id=response.data['event_id'])
+        self.assertEqual(job.near_duplicate_of_id, original.id)
+        self.assertGreater(job.near_duplicate_similarity, 0.8)
+        self.assertIsNone(job.source_job)
+        self.assertEqual(mock_enqueue.call_count, 2)
+        self.assertEqual(job.signature.bands.count(), 16)
+        
+        status_response = self.client.get(reverse('jobs:get_job_status', kwargs={'event_id': job.id}))
+        self.assertEqual(status_response.data['near_duplicate_of'], str(original.id))
+    
+    @override_settings(NEAR_DUPLICATE_MODE='reuse')
+    def test_reuse_mode_takes_over_result(self, mock_enqueue):
+        """Test that reuse mode completes a revision from its near-duplicate unless caching is off."""
+        from .models import JobSignature
+        
+        original = self._completed_original()
+        url = reverse('jobs:create_jobs_batch')
+        
+        response = self.client.post(
+            url,
+            [{'guideline_text': self.revision}, {'guideline_text': self.revision + " Extra.", 'use_cache': False}],
+            format='json'
+        )
+        
+        reused = Job.objects.get(id=response.data[0]['event_id'])
+        self.assertEqual(reused.status, JobStatus.COMPLETED)
+        self.assertEqual(reused.source_job, original)
+        self.assertEqual(reused.summary, "Hygiene summary")
+        self.assertFalse(JobSignature.objects.filter(job=reused).exists())
+        uncached = Job.objects.get(id=response.data[1]['event_id'])
+        self.assertEqual(uncached.status, JobStatus.PENDING)
+        self.assertEqual(uncached.near_duplicate_of_id, original.id)
+    
+    @override_settings(NEAR_DUPLICATE_MAX_CANDIDATES=1)
+    def test_candidate_cap_applies_per_text(self, mock_enqueue):
+        """Test that each text of a batch gets its own candidates rather than sharing one capped set."""
+        other = (
+            "From 1 June 2024 every visitor to the intensive care unit signs the register at reception and "
+            "wears a visible badge. Children under twelve are accompanied by an adult at all times. Flowers "
+            "and food parcels are left at the nurses' station and checked by the nurse in charge. Visiting "
+            "ends at eight in the evening unless the consultant has agreed an exception in writing."
+        )
+        original = self._completed_original()
+        other_original = self._completed_original(other)
+        
+        response = self.client.post(
+            reverse('jobs:create_jobs_batch'),
+            [{'guideline_text': self.revision}, {'guideline_text': other.replace("1 June 2024", "1 July 2025")}],
+            format='json'
+        )
+        
+        self.assertEqual(Job.objects.get(id=response.data[0]['event_id']).near_duplicate_of_id, original.id)
+        self.assertEqual(Job.objects.get(id=response.data[1]['event_id']).near_duplicate_of_id, other_original.id)
+    
+    @override_settings(NEAR_DUPLICATE_MAX_CANDIDATES=1)
+    def test_candidate_cap_counts_only_reusable_jobs(self, mock_enqueue):
+        """Test that newer unfinished jobs sharing the band keys do not use up a key's candidates."""
+        original = self._completed_original()
+        self.client.post(
+            reverse('jobs:create_job'), {'guideline_text': self.original, 'use_cache': False}, format='json'
+        )
+        
+        response = self.client.post(reverse('jobs:create_job'), {'guideline_text': self.revision}, format='json')
+        
+        self.assertEqual(Job.objects.get(id=response.data['event_id']).near_duplicate_of_id, original.id)
+    
+    @override_settings(NEAR_DUPLICATE_MAX_CANDIDATES=1, NEAR_DUPLICATE_MAX_SCAN=1)
+    def test_scan_cap_bounds_bands_read_per_key(self, mock_enqueue):
+        """Test that only the most recent bands of a key are read, reusable or not."""
+        self._completed_original()
+        self.client.post(
+            reverse('jobs:create_job'), {'guideline_text': self.original, 'use_cache': False}, format='json'
+        )
+        
+        response = self.client.post(reverse('jobs:create_job'), {'guideline_text': self.revision}, format='json')
+        
+        self.assertIsNone(Job.objects.get(id=response.data['event_id']).near_duplicate_of_id)
+    
+    @override_settings(NEAR_DUPLICATE_MODE='off')
+    def test_off_mode_does_not_index(self, mock_enqueue):
+        """Test that nothing is signed or matched when detection is off."""
+        from .models import JobSignature
+        
+        self._completed_original()
+        response = self.client.post(reverse('jobs:create_job'), {'guideline_text': self.revision}, format='json')
+        
+        self.assertFalse(JobSignature.objects.exists())
+        self.assertIsNone(Job.objects.get(id=response.data['event_id']).near_duplicate_of_id)
+
+
+@override_settings(GPT_CHUNK_THRESHOLD_CHARS=100, GPT_CHUNK_SIZE_CHARS=60)
+class GuidelineRevisionTest(APITestCase):
+    """Test cases for incremental reprocessing of revised guidelines."""
+    
+    def setUp(self):
+        # Two paragraphs fit in a chunk
+        self.paragraphs = [f"Rule {i} applies to ward {i}." for i in range(8)]
+        self.text = "\n\n".join(self.paragraphs)
+        revised = list(self.paragraphs)
+        revised.insert(2, "New rule for ward 9.")
+        self.revision = "\n\n".join(revised)
+    
+    def _mock_client(self, mock_openai):
+        """Answer chunk prompts with their first line, reduce prompts with 'final'."""
+        def create(**kwargs):
+            prompt = kwargs['messages'][1]['content']
+            response = MagicMock()
+            if prompt.startswith("Please combine"):
+                response.choices[0].message.content = "final"
+            else:
+                response.choices[0].message.content = prompt.split(":\n\n")[1].split("\n")[0]
+            return response
+        mock_openai.return_value.chat.completions.create.side_effect = create
+        return mock_openai.return_value.chat.completions.create
+    
+    def test_split_revision_keeps_unchanged_chunks(self):
+        """Test that an insertion does not shift the chunks after it."""
+        from .chunking import split_into_chunks, split_revision
+        
+        previous = split_into_chunks(self.text, 60)
+        repacked = split_into_chunks(self.revision, 60)
+        chunks = split_revision(previous, self.revision, 60)
+        
+        self.assertEqual(len(set(previous) & set(repacked)), 1)
+        self.assertEqual(set(previous) - set(chunks), set())
+        self.assertIn("New rule for ward 9.", chunks)
+        self.assertEqual("\n\n".join(chunks), self.revision)
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_revision_only_summarizes_changed_chunks(self, mock_openai):
+        """Test that a revision reuses its parent's chunk summaries and stores them as its own."""
+        from .chunking import JobChunkStore
+        from .models import JobChunk
+        
+        create = self._mock_client(mock_openai)
+        parent = Job.objects.create(guideline_text=self.text)
+        GPTChainProcessor().summarize_guideline(self.text, chunk_store=JobChunkStore(parent))
+        self.assertEqual(create.call_count, 5)
+        
+        create.reset_mock()
+        job = Job.objects.create(guideline_text=self.revision, parent=parent)
+        result = GPTChainProcessor().summarize_guideline(self.revision, chunk_store=JobChunkStore(job))
+        
+        self.assertEqual(result, "final")
+        # The inserted paragraph and the reduce pass
+        self.assertEqual(create.call_count, 2)
+        summaries = list(JobChunk.objects.filter(job=job).order_by('index').values_list('summary', flat=True))
+        self.assertEqual(len(summaries), 5)
+        self.assertEqual(summaries[1], "New rule for ward 9.")
+        self.assertEqual(summaries[2], "Rule 2 applies to ward 2.")
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_revision_of_a_revision_reuses_its_actual_chunks(self, mock_openai):
+        """Test that a revision's own chunks, not a fresh split of its text, are reused by the next revision."""
+        from .chunking import JobChunkStore
+        
+        create = self._mock_client(mock_openai)
+        parent = Job.objects.create(guideline_text=self.text)
+        GPTChainProcessor().summarize_guideline(self.text, chunk_store=JobChunkStore(parent))
+        revision = Job.objects.create(guideline_text=self.revision, parent=parent)
+        GPTChainProcessor().summarize_guideline(self.revision, chunk_store=JobChunkStore(revision))
+        
+        create.reset_mock()
+        third = self.revision.replace("Rule 6 applies", "Rule 6 no longer applies")
+        job = Job.objects.create(guideline_text=third, parent=revision)
+        store = JobChunkStore(job)
+        GPTChainProcessor().summarize_guideline(third, chunk_store=store)
+        
+        self.assertEqual(store.previous_chunks()[1], "New rule for ward 9.")
+        # The two paragraphs of the edited chunk, which no longer fit together, and the reduce pass
+        self.assertEqual(create.call_count, 3)
+    
+    @patch('jobs.views.enqueue_jobs')
+    def test_api_records_parent(self, mock_enqueue):
+        """Test that parent_event_id is stored, returned and must name an existing job."""
+        parent = Job.objects.create(guideline_text=self.text)
+        url = reverse('jobs:create_job')
+        
+        response = self.client.post(
+            url,
+            {'guideline_text': self.revision, 'parent_event_id': str(parent.id)},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job = Job.objects.get(id=response.data['event_id'])
+        self.assertEqual(job.parent, parent)
+        
+        with patch('jobs.events.get_redis_client') as mock_redis:
+            mock_redis.return_value.hmget.return_value = [None, None]
+            status_response = self.client.get(reverse('jobs:get_job_status', kwargs={'event_id': job.id}))
+        self.assertEqual(status_response.data['parent_event_id'], str(parent.id))
+        
+        response = self.client.post(
+            url,
+            {'guideline_text': self.revision, 'parent_event_id': str(uuid.uuid4())},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parent_event_id', response.data)
+    
+    @patch('jobs.views.enqueue_jobs')
+    def test_batch_checks_parents_with_one_query(self, mock_enqueue):
+        """Test that the parents of a whole batch are looked up at once and errors point at the items."""
+        from .serializers import missing_parent_errors
+        
+        parent = Job.objects.create(guideline_text=self.text)
+        items = [
+            {'guideline_text': self.revision, 'parent_event_id': parent.id},
+            {'guideline_text': self.revision},
+            {'guideline_text': self.revision, 'parent_event_id': uuid.uuid4()},
+        ]
+        with self.assertNumQueries(1):
+            errors = missing_parent_errors(items)
+        self.assertEqual(errors, [{}, {}, {'parent_event_id': ["No job with this event_id."]}])
+        with self.assertNumQueries(1):
+            self.assertIsNone(missing_parent_errors(items[:2]))
+        
+        response = self.client.post(
+            reverse('jobs:create_jobs_batch'),
+            [{**item, 'parent_event_id': str(item['parent_event_id'])} if 'parent_event_id' in item else item
+             for item in items],
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[2], errors[2])
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class HedgedRequestTest(TestCase):
+    """Test cases for hedging slow GPT calls."""
+    
+    request = {'model': 'gpt-3.5-turbo', 'max_tokens': 300, 'messages': []}
+    
+    def _hedger(self, budget_ratio=1.0, burst=1.0, model='gpt-4o-mini'):
+        from .hedging import HedgeBudget, Hedger, LatencyTracker, latency_key
+        
+        tracker = LatencyTracker(window=10, min_samples=3)
+        for _ in range(3):
+            tracker.record(latency_key(self.request), 0.01)
+        return Hedger(
+            percentile=95, min_delay=0, model=model, tracker=tracker,
+            budget=HedgeBudget(budget_ratio, burst), threads=4
+        )
+    
+    def sample(self, outcome):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value('guideline_gpt_hedges_total', {'outcome': outcome}) or 0
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_slow_call_is_hedged_to_fallback_model(self, mock_openai):
+        """Test that a call slower than the tracked percentile is answered by its hedge."""
+        import threading
+        
+        release = threading.Event()
+        self.addCleanup(release.set)
+        
+        def create(**kwargs):
+            response = MagicMock()
+            if kwargs['model'] == 'gpt-3.5-turbo':
+                release.wait(5)
+                response.choices[0].message.content = "primary"
+            else:
+                response.choices[0].message.content = "hedge"
+            return response
+        mock_openai.return_value.chat.completions.create.side_effect = create
+        won = self.sample('hedge_won')
+        
+        processor = GPTChainProcessor(hedger=self._hedger())
+        content = processor._complete(processor.build_chunk_summary_request("Text", 0, 2))
+        
+        self.assertEqual(content, "hedge")
+        self.assertEqual(self.sample('hedge_won'), won + 1)
+    
+    @patch('jobs.tasks.get_openai_client')
+    def test_sync_loser_frees_its_slot_when_the_hedge_wins(self, mock_openai):
+        """Test that a losing sync request gives its slot back at once and settles its tokens when done."""
+        import threading
+        from contextlib import contextmanager
+        
+        answer = threading.Event()
+        self.addCleanup(answer.set)
+        events = []
+        
+        @contextmanager
+        def slot(tokens):
+            lease = MagicMock()
+            try:
+                yield lease
+            finally:
+                events.append(('released', lease))
+        limiter = MagicMock()
+        limiter.slot.side_effect = slot
+        limiter.free_slot.side_effect = lambda lease: events.append(('freed', lease))
+        
+        def create(**kwargs):
+            if kwargs['model'] == 'gpt-3.5-turbo':
+                answer.wait(5)
+            response = MagicMock()
+            response.choices[0].message.content = kwargs['model']
+            return response
+        mock_openai.return_value.chat.completions.create.side_effect = create
+        hedger = self._hedger()
+        
+        processor = GPTChainProcessor(limiter=limiter, hedger=hedger)
+        content = processor._complete(processor.build_chunk_summary_request("Text", 0, 2))
+        
+        self.assertEqual(content, "gpt-4o-mini")
+        (_, hedge_lease), (freed, primary_lease) = events
+        self.assertEqual(freed, 'freed')
+        self.assertIsNot(primary_lease, hedge_lease)
+        answer.set()
+        hedger.executor.shutdown(wait=True)
+        self.assertEqual(events[2], ('released', primary_lease))
+    
+    def test_sync_loser_waiting_for_a_slot_is_not_sent(self):
+        """Test that a request that lost while still waiting for its slot never calls the API."""
+        import threading
+        from contextlib import contextmanager
+        
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        acquiring = []
+        
+        @contextmanager
+        def slot(tokens):
+            acquiring.append(tokens)
+            if len(acquiring) == 1:
+                gate.wait(5)
+            yield MagicMock()
+        limiter = MagicMock()
+        limiter.slot.side_effect = slot
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices[0].message.content = "answer"
+        hedger = self._hedger()
+        
+        processor = GPTChainProcessor(client=client, limiter=limiter, hedger=hedger)
+        self.assertEqual(processor._complete(processor.build_chunk_summary_request("Text", 0, 2)), "answer")
+        gate.set()
+        hedger.executor.shutdown(wait=True)
+        
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+        self.assertEqual(client.chat.completions.create.call_args.kwargs['model'], 'gpt-4o-mini')
+    
+    def test_fast_call_and_empty_budget_are_not_hedged(self):
+        """Test that no duplicate is sent for fast calls or once the budget is spent."""
+        import time
+        
+        sent = []
+        
+        def send(request):
+            sent.append(request['model'])
+            time.sleep(0.4 if len(sent) > 1 else 0)
+            return "answer"
+        
+        hedger = self._hedger(budget_ratio=0, burst=0)
+        hedger.min_delay = 0.2
+        no_budget = self.sample('no_budget')
+        
+        self.assertEqual(hedger.run(self.request, send), "answer")
+        self.assertEqual(hedger.run(self.request, send), "answer")
+        
+        self.assertEqual(sent, ['gpt-3.5-turbo', 'gpt-3.5-turbo'])
+        self.assertEqual(self.sample('no_budget'), no_budget + 1)
+    
+    def test_failed_primary_falls_back_to_hedge(self):
+        """Test that the hedge answers when the primary fails, and the primary's error surfaces if both do."""
+        import time
+        
+        def send(request):
+            if request['model'] == 'gpt-3.5-turbo':
+                time.sleep(0.05)
+                raise ValueError("primary failed")
+            return "hedge"
+        
+        self.assertEqual(self._hedger().run(self.request, send), "hedge")
+        
+        def send_failing(request):
+            time.sleep(0.05)
+            raise ValueError(f"{request['model']} failed")
+        
+        with self.assertRaisesMessage(ValueError, "gpt-3.5-turbo failed"):
+            self._hedger().run(self.request, send_failing)
+    
+    def test_async_hedge_cancels_loser(self):
+        """Test that the async path takes the first answer and cancels the slow request."""
+        import asyncio
+        
+        calls = []
+        cancelled = []
+        
+        async def send(request):
+            # Without a fallback model the hedge repeats the request; only the first is slow
+            calls.append(request['model'])
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(request['model'])
+                    raise
+                return "primary"
+            return "hedge"
+        
+        self.assertEqual(asyncio.run(self._hedger(model='').arun(self.request, send)), "hedge")
+        self.assertEqual(calls, ['gpt-3.5-turbo', 'gpt-3.5-turbo'])
+        self.assertEqual(cancelled, ['gpt-3.5-turbo'])
+
+
+class JobExportTest(APITestCase):
+    """Test cases for the NDJSON export of completed jobs."""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        self.start = timezone.now() - timedelta(hours=1)
+        self.jobs = []
+        for i in range(3):
+            job = Job.objects.create(
+                guideline_text=f"Guideline {i}",
+                status=JobStatus.COMPLETED,
+                summary=f"Summary {i}",
+                checklist=[{"item": f"Item {i}", "description": "Do it"}]
+            )
+            # Updated in reverse creation order
+            Job.objects.filter(id=job.id).update(updated_at=self.start + timedelta(minutes=3 - i))
+            self.jobs.append(job)
+        Job.objects.create(guideline_text="Still running", status=JobStatus.PROCESSING)
+    
+    def _lines(self, content):
+        return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+    
+    @patch('jobs.export.BUFFER_BYTES', 10)
+    def test_export_streams_completed_jobs_in_update_order(self):
+        """Test that only completed jobs are exported, oldest update first, shaped like status responses."""
+        response = self.client.get(reverse('jobs:export_jobs'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        lines = self._lines(b''.join(response.streaming_content))
+        self.assertEqual([line['event_id'] for line in lines], [str(job.id) for job in reversed(self.jobs)])
+        self.assertEqual(lines[0]['status'], 'completed')
+        self.assertEqual(lines[0]['result']['summary'], "Summary 2")
+        self.assertEqual(lines[0]['result']['checklist'][0]['item'], "Item 2")
+    
+    @override_settings(JOB_EXPORT_WATERMARK_OVERLAP=0)
+    def test_watermarks_and_gzip(self):
+        """Test that updated_after is inclusive and the stream is gzip-encoded when accepted."""
+        import gzip
+        
+        first = self.client.get(reverse('jobs:export_jobs'))
+        watermark = self._lines(b''.join(first.streaming_content))[1]['updated_at']
+        
+        response = self.client.get(
+            reverse('jobs:export_jobs'),
+            {'updated_after': watermark},
+            HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = self._lines(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual([line['event_id'] for line in lines], [str(self.jobs[1].id), str(self.jobs[0].id)])
+        
+        response = self.client.get(reverse('jobs:export_jobs'), {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('created_after', response.json())
+    
+    @override_settings(JOB_EXPORT_WATERMARK_OVERLAP=45)
+    def test_watermark_overlap_sends_late_commits(self):
+        """Test that a job committed after a pull, with an earlier updated_at, is sent by the next pull."""
+        from datetime import timedelta
+        
+        first = self.client.get(reverse('jobs:export_jobs'))
+        watermark = self._lines(b''.join(first.streaming_content))[-1]['updated_at']
+        late = Job.objects.create(guideline_text="Late", status=JobStatus.COMPLETED, summary="Late", checklist=[])
+        Job.objects.filter(id=late.id).update(updated_at=self.start + timedelta(minutes=2, seconds=30))
+        
+        response = self.client.get(reverse('jobs:export_jobs'), {'updated_after': watermark})
+        
+        lines = self._lines(b''.join(response.streaming_content))
+        self.assertEqual([line['event_id'] for line in lines], [str(late.id), str(self.jobs[0].id)])
+    
+    async def test_async_export(self):
+        """Test that the async view streams the same lines through an async iterator."""
+        from django.test import AsyncRequestFactory
+        from . import async_views
+        
+        response = await async_views.export_jobs(AsyncRequestFactory().get('/api/jobs/export/'))
+        lines = self._lines(b''.join([chunk async for chunk in response.streaming_content]))
+        
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[-1]['event_id'], str(self.jobs[0].id))
+    
+    def test_export_command(self):
+        """Test that the management command writes a gzip file and reports the watermark."""
+        import gzip
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.ndjson.gz')
+            stderr = io.StringIO()
+            call_command('export_jobs', '--output', path, '--gzip', stderr=stderr)
+            with gzip.open(path) as f:
+                lines = self._lines(f.read())
+        
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Exported 3 jobs", stderr.getvalue())
+        self.assertIn(Job.objects.get(id=self.jobs[0].id).updated_at.isoformat(), stderr.getvalue())
+
+
+class CorpusIngestTest(TestCase):
+    """Test cases for the bulk corpus ingest command."""
+    
+    def _write(self, directory, name, text):
+        import os
+        
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+    
+    @patch('jobs.ingest.enqueue_jobs')
+    def test_directory_ingest_creates_and_queues_jobs(self, mock_enqueue):
+        """Test that each valid file becomes a bulk job with a stable id and duplicates follow the first."""
+        import io
+        import tempfile
+        from django.core.management import call_command
+        from .ingest import ingest_job_id
+        
+        with tempfile.TemporaryDirectory() as directory:
+            self._write(directory, 'a.txt', "Wash hands before surgery.")
+            self._write(directory, 'b.txt', "Wash hands before surgery.")
+            self._write(directory, 'c.txt', "   ")
+            self._write(directory, 'notes.md', "Not a guideline")
+            stdout = io.StringIO()
+            call_command(
+                'ingest_corpus', directory,
+                '--pattern', '*.txt', '--corpus', 'client-a', '--state', f'{directory}/state.json',
+                '--chunk-size', '2', '--enqueue-rate', '0', '--max-queue-depth', '0',
+                stdout=stdout
+            )
+        
+        first = Job.objects.get(id=ingest_job_id('client-a', 'a.txt'))
+        second = Job.objects.get(id=ingest_job_id('client-a', 'b.txt'))
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(first.queue, 'bulk')
+        self.assertEqual(first.guideline_text, "Wash hands before surgery.")
+        self.assertEqual(second.source_job_id, first.id)
+        mock_enqueue.assert_called_once_with([first.id], queue='bulk')
+        self.assertIn("Ingested 3 items", stdout.getvalue())
+        self.assertIn("1 invalid; 1 queued", stdout.getvalue())
+    
+    def test_resume_skips_checkpointed_items_and_requeues_interrupted_chunk(self):
+        """Test that a rerun creates nothing twice and queues the jobs the interrupted chunk never queued."""
+        import json as json_module
+        import os
+        import tempfile
+        from .ingest import CorpusIngest, EnqueueThrottle, ingest_job_id, ndjson_items
+        
+        with tempfile.TemporaryDirectory() as directory:
+            source = self._write(directory, 'corpus.ndjson', ''.join(
+                json_module.dumps({'key': f'g{i}', 'guideline_text': f"Guideline {i}"}) + '\n'
+                for i in range(4)
+            ))
+            state = os.path.join(directory, 'state.json')
+            
+            def run():
+                return CorpusIngest(
+                    ndjson_items(source), corpus='c', state_path=state, chunk_size=2,
+                    throttle=EnqueueThrottle(rate=0, max_queue_depth=0)
+                ).run()
+            
+            # The broker goes away after the first chunk is queued
+            with patch('jobs.ingest.enqueue_jobs', side_effect=[None, RuntimeError("broker down")]):
+                with self.assertRaises(RuntimeError):
+                    run()
+            self.assertEqual(Job.objects.count(), 4)
+            
+            with patch('jobs.ingest.enqueue_jobs') as mock_enqueue:
+                report = run()
+        
+        self.assertEqual(Job.objects.count(), 4)
+        self.assertEqual((report.created, report.existing), (0, 4))
+        mock_enqueue.assert_called_once()
+        self.assertEqual(
+            set(mock_enqueue.call_args.args[0]),
+            {ingest_job_id('c', 'key:g2'), ingest_job_id('c', 'key:g3')}
+        )
+    
+    @patch('jobs.ingest.enqueue_jobs')
+    def test_repeated_ndjson_keys_are_skipped(self, mock_enqueue):
+        """Test that items repeating an earlier key, in the same chunk or a later one, are reported as invalid."""
+        import io
+        import json as json_module
+        import tempfile
+        from django.core.management import call_command
+        from .ingest import ingest_job_id
+        
+        with tempfile.TemporaryDirectory() as directory:
+            source = self._write(directory, 'corpus.ndjson', ''.join(
+                json_module.dumps({'key': key, 'guideline_text': f"Guideline {i}"}) + '\n'
+                for i, key in enumerate(['a', 'a', 'b', 'a'])
+            ))
+            stdout = io.StringIO()
+            call_command(
+                'ingest_corpus', source, '--corpus', 'c', '--chunk-size', '2',
+                '--enqueue-rate', '0', '--max-queue-depth', '0', stdout=stdout
+            )
+        
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(Job.objects.get(id=ingest_job_id('c', 'key:a')).guideline_text, "Guideline 0")
+        self.assertIn("2 jobs created", stdout.getvalue())
+        self.assertIn("2 invalid", stdout.getvalue())
+    
+    def test_copy_rows_use_copy_text_format(self):
+        """Test that COPY rows escape text, mark nulls and hex-encode bytea columns."""
+        from .ingest import copy_rows
+        from .models import JobPayload
+        from .payloads import compress_text
+        
+        job = Job(guideline_text="Line one\nLine two", error_message="tab\there\\")
+        columns, data = copy_rows(Job, [job])
+        row = dict(zip(columns, data.read().rstrip('\n').split('\t')))
+        
+        self.assertEqual(row['id'], str(job.id))
+        self.assertEqual(row['status'], 'pending')
+        self.assertEqual(row['deferred'], 'f')
+        self.assertEqual(row['error_message'], 'tab\\there\\\\')
+        self.assertEqual(row['partial_result'], '\\N')
+        self.assertIsNotNone(job.created_at)
+        
+        columns, data = copy_rows(JobPayload, [job.build_payload()])
+        row = dict(zip(columns, data.read().rstrip('\n').split('\t')))
+        self.assertEqual(row['job_id'], str(job.id))
+        self.assertEqual(bytes.fromhex(row['compressed_text'][3:]), compress_text("Line one\nLine two"))
+    
+    @patch('jobs.ingest.enqueue_jobs')
+    def test_enqueue_throttle_paces_chunks_and_waits_for_queue(self, mock_enqueue):
+        """Test that tasks are published in chunks at the set rate, after the queue drains below the limit."""
+        from .ingest import QUEUE_DEPTH_POLL_INTERVAL, EnqueueThrottle
+        
+        sleeps = []
+        throttle = EnqueueThrottle(chunk_size=2, rate=10, max_queue_depth=5, sleep=sleeps.append)
+        depths = iter([{'bulk': 7}, {'bulk': 1}, {'bulk': 1}, {'bulk': 1}])
+        with patch.object(throttle._depth_reader, 'queue_depth', side_effect=lambda: next(depths)):
+            queued = throttle.publish(['a', 'b', 'c', 'd', 'e'], 'bulk')
+        
+        self.assertEqual(queued, 5)
+        self.assertEqual([call.args[0] for call in mock_enqueue.call_args_list], [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertEqual(sleeps[0], QUEUE_DEPTH_POLL_INTERVAL)
+        # Two jobs at 10 per second: a chunk every 0.2s (the fake sleep does not advance the clock)
+        self.assertEqual(len(sleeps), 3)
+        self.assertAlmostEqual(sleeps[1], 0.2, places=2)
+        self.assertAlmostEqual(sleeps[2], 0.4, places=2)
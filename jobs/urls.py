@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'jobs'
 
+# Under an ASGI server the hot and streaming endpoints are served by their async variants
+hot_views = async_views if settings.API_ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('jobs/', views.create_job, name='create_job'),
-    path('jobs/<uuid:event_id>/', views.get_job_status, name='get_job_status'),
+    path('jobs/', hot_views.create_job, name='create_job'),
+    path('jobs/batch/', views.create_jobs_batch, name='create_jobs_batch'),
+    path('jobs/export/', hot_views.export_jobs, name='export_jobs'),
+    path('jobs/<uuid:event_id>/', hot_views.get_job_status, name='get_job_status'),
+    path('jobs/<uuid:event_id>/wait/', views.wait_for_job_status, name='wait_for_job_status'),
+    path('jobs/<uuid:event_id>/events/', hot_views.stream_job_events, name='stream_job_events'),
 ]
\ No newline at end of file
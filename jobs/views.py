@@ -1,22 +1,104 @@
 """
 Django views for the guideline ingest API.
 """
+import json
+import logging
+
+import redis
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, OpenApiResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
 
-from .models import Job, JobStatus
+from .events import (
+    TERMINAL_STATUSES,
+    cache_job_status,
+    get_cached_job_status,
+    iter_job_events,
+    next_job_event,
+    serialize_job_event,
+    subscribe,
+)
+from .export import JobExport, accepts_gzip, export_response, stream_export
+from .metrics import render_metrics
+from .models import Job, JobArchive, JobStatus
+from .pagination import InvalidCursor, keyset_page
 from .serializers import (
     JobCreateSerializer, 
     JobCreateResponseSerializer,
+    JobExportQuerySerializer,
+    JobListItemSerializer,
+    JobListQuerySerializer,
+    JobListResponseSerializer,
     JobStatusResponseSerializer,
-    JobSerializer
+    JobSerializer,
+    missing_parent_errors
 )
-from .tasks import process_guideline_task
+from .result_cache import (
+    apply_result_cache,
+    apply_result_cache_bulk,
+    index_signatures,
+    needs_processing,
+    resolve_late_followers
+)
+from .routing import PRIORITY_LOW, PRIORITY_NORMAL, classify_job
+from .status_cache import etag_matches, job_etag
+from .tasks import enqueue_jobs
+from .webhooks import schedule_webhooks
+
+logger = logging.getLogger(__name__)
+
+
+def build_job(data: dict, default_priority: str) -> Job:
+    """Return an unsaved pending job for validated JobCreateSerializer data."""
+    return Job(
+        guideline_text=data['guideline_text'],
+        status=JobStatus.PENDING,
+        queue=classify_job(data['guideline_text'], data.get('priority', default_priority), data['deferred']),
+        pipeline=data.get('pipeline', settings.GPT_PIPELINE_MODE),
+        deferred=data['deferred'],
+        callback_url=data.get('callback_url'),
+        parent_id=data.get('parent_event_id')
+    )
 
+
+def save_new_job(data: dict) -> Job:
+    """Create a single job, reusing an identical job's result if possible."""
+    job = build_job(data, PRIORITY_NORMAL)
+    apply_result_cache(job, use_cache=data['use_cache'])
+    job.save()
+    index_signatures([job])
+    resolve_late_followers([job])
+    # A cached result completes the job at once
+    schedule_webhooks([job])
+    return job
+
+
+@extend_schema(
+    methods=['GET'],
+    operation_id='jobs_list',
+    parameters=[JobListQuerySerializer],
+    responses={
+        200: OpenApiResponse(
+            response=JobListResponseSerializer,
+            description="One page of jobs, newest first"
+        ),
+        400: OpenApiResponse(description="Invalid filters or cursor"),
+    },
+    summary="List jobs",
+    description=(
+        "Lists jobs newest first, optionally filtered by status and creation time. "
+        "Pass next_cursor back as cursor to fetch the following page."
+    )
+)
 @extend_schema(
+    methods=['POST'],
     request=JobCreateSerializer,
     responses={
         201: OpenApiResponse(
@@ -28,13 +110,17 @@ from .tasks import process_guideline_task
     summary="Create a new guideline ingest job",
     description="Creates a new job to process guideline text through GPT chain analysis"
 )
-@api_view(['POST'])
+@api_view(['GET', 'POST'])
 def create_job(request):
     """
     Create a new guideline ingest job.
     
     Places a job on the queue for processing and returns an event_id.
+    GET requests list jobs instead.
     """
+    if request.method == 'GET':
+        return list_jobs(request)
+    
     serializer = JobCreateSerializer(data=request.data)
     
     if not serializer.is_valid():
@@ -42,15 +128,16 @@ def create_job(request):
             serializer.errors, 
             status=status.HTTP_400_BAD_REQUEST
         )
+    errors = missing_parent_errors([serializer.validated_data])
+    if errors:
+        return Response(errors[0], status=status.HTTP_400_BAD_REQUEST)
     
-    # Create job in database
-    job = Job.objects.create(
-        guideline_text=serializer.validated_data['guideline_text'],
-        status=JobStatus.PENDING
-    )
+    job = save_new_job(serializer.validated_data)
     
-    # Queue the processing task
-    process_guideline_task.delay(str(job.id))
+    # Queue the processing task unless the result is cached or in flight;
+    # deferred jobs wait for the next provider batch instead
+    if needs_processing(job) and not job.deferred:
+        enqueue_jobs([job.id], queue=job.queue)
     
     # Return response
     response_data = {
@@ -63,29 +150,302 @@ def create_job(request):
         status=status.HTTP_201_CREATED
     )
 
+
+@extend_schema(
+    request=JobCreateSerializer(many=True),
+    responses={
+        201: OpenApiResponse(
+            response=JobCreateResponseSerializer(many=True),
+            description="Jobs created successfully"
+        ),
+        400: OpenApiResponse(description="Invalid request data"),
+    },
+    summary="Create guideline ingest jobs in bulk",
+    description=(
+        "Creates one job per guideline text with a single insert and a single "
+        "grouped queue publish. Returns event_ids in request order."
+    )
+)
+@api_view(['POST'])
+def create_jobs_batch(request):
+    """
+    Create a batch of guideline ingest jobs.
+    
+    Accepts an array of job payloads and returns an array of event_ids.
+    """
+    serializer = JobCreateSerializer(
+        data=request.data,
+        many=True,
+        allow_empty=False,
+        max_length=settings.JOB_BATCH_MAX_SIZE
+    )
+    
+    if not serializer.is_valid():
+        return Response(
+            serializer.errors, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    errors = missing_parent_errors(serializer.validated_data)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Create all jobs with a single insert per table
+    jobs = [build_job(item, PRIORITY_LOW) for item in serializer.validated_data]
+    apply_result_cache_bulk(
+        jobs,
+        [item['use_cache'] for item in serializer.validated_data]
+    )
+    Job.bulk_create_with_payloads(jobs)
+    index_signatures(jobs)
+    resolve_late_followers(jobs)
+    schedule_webhooks(jobs)
+    
+    # Queue every job that has to run its own chain, one publish per queue
+    by_queue = {}
+    for job in jobs:
+        if needs_processing(job) and not job.deferred:
+            by_queue.setdefault(job.queue, []).append(job.id)
+    for queue, job_ids in by_queue.items():
+        enqueue_jobs(job_ids, queue=queue)
+    
+    response_data = [
+        {'event_id': job.id, 'status': job.status}
+        for job in jobs
+    ]
+    
+    return Response(
+        response_data,
+        status=status.HTTP_201_CREATED
+    )
+
+
+def list_jobs(request):
+    """
+    List jobs with keyset pagination.
+    
+    Only the narrow job columns are read; payloads are never loaded.
+    """
+    query = JobListQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    params = query.validated_data
+    
+    jobs = Job.objects.only('id', 'status', 'created_at', 'updated_at')
+    if 'status' in params:
+        jobs = jobs.filter(status=params['status'])
+    if 'created_after' in params:
+        jobs = jobs.filter(created_at__gte=params['created_after'])
+    if 'created_before' in params:
+        jobs = jobs.filter(created_at__lt=params['created_before'])
+    
+    limit = min(params.get('limit', settings.JOB_LIST_PAGE_SIZE), settings.JOB_LIST_MAX_PAGE_SIZE)
+    try:
+        page, next_cursor = keyset_page(jobs, params.get('cursor'), limit)
+    except InvalidCursor as e:
+        return Response({'cursor': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(
+        {
+            'results': JobListItemSerializer(page, many=True).data,
+            'next_cursor': next_cursor
+        },
+        status=status.HTTP_200_OK
+    )
+
+
 @extend_schema(
     responses={
         200: OpenApiResponse(
             response=JobStatusResponseSerializer,
             description="Job status retrieved successfully"
         ),
+        304: OpenApiResponse(description="Job unchanged since the ETag sent in If-None-Match"),
         404: OpenApiResponse(description="Job not found"),
     },
     summary="Get job status and results",
-    description="Retrieves the current status and results (if available) for a job"
+    description=(
+        "Retrieves the current status and results (if available) for a job. "
+        "Responses carry an ETag; send it back in If-None-Match to get 304 while the job is unchanged."
+    )
 )
 @api_view(['GET'])
 def get_job_status(request, event_id):
     """
     Get the status and results of a job.
     
-    Returns job status and result data if the job is completed.
+    Returns job status and result data if the job is completed. Terminal jobs
+    are served from the status cache without a database query.
     """
-    job = get_object_or_404(Job, id=event_id)
+    if_none_match = request.headers.get('If-None-Match')
+    
+    cached = get_cached_job_status(event_id)
+    if cached is not None:
+        etag, body = cached
+        if etag_matches(if_none_match, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return HttpResponse(body, content_type='application/json', headers={'ETag': etag})
+    
+    job = Job.objects.filter(id=event_id).first()
+    if job is None:
+        # Jobs retired by the retention task are still served, read-only
+        job = JobArchive.objects.filter(id=event_id).first()
+    if job is None:
+        raise Http404("Job not found")
+    etag = job_etag(job)
+    if etag_matches(if_none_match, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
     
     serializer = JobSerializer(job)
+    cache_job_status(job, serializer.data)
     
     return Response(
         serializer.data,
-        status=status.HTTP_200_OK
-    )
\ No newline at end of file
+        status=status.HTTP_200_OK,
+        headers={'ETag': etag}
+    )
+
+
+def _subscribe_or_none(event_id):
+    """Subscribe to a job's events, or return None if Redis is unavailable."""
+    try:
+        return subscribe(event_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not subscribe to events for job {event_id}: {str(e)}")
+        return None
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'status',
+            OpenApiTypes.STR,
+            description="Last status seen by the client; the request is held until it changes"
+        ),
+        OpenApiParameter(
+            'timeout',
+            OpenApiTypes.FLOAT,
+            description="Seconds to wait for a change (capped by the server)"
+        ),
+    ],
+    responses={
+        200: OpenApiResponse(
+            response=JobStatusResponseSerializer,
+            description="Job status after a change or after the timeout"
+        ),
+        400: OpenApiResponse(description="Invalid timeout"),
+        404: OpenApiResponse(description="Job not found"),
+    },
+    summary="Long-poll for a job status change",
+    description=(
+        "Holds the request open until the job's status differs from the given "
+        "status or the timeout expires, then returns the job status"
+    )
+)
+@api_view(['GET'])
+def wait_for_job_status(request, event_id):
+    """
+    Long-poll for the next status transition of a job.
+    
+    Returns immediately if the job is finished or already differs from the
+    status the client last saw.
+    """
+    max_timeout = settings.JOB_EVENTS_LONG_POLL_MAX_TIMEOUT
+    try:
+        timeout = float(request.query_params.get('timeout', max_timeout))
+    except ValueError:
+        return Response(
+            {'timeout': ['A valid number is required.']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    timeout = max(0.0, min(timeout, max_timeout))
+    
+    # Subscribe before reading the job so no transition can be missed
+    pubsub = _subscribe_or_none(event_id)
+    try:
+        job = get_object_or_404(Job, id=event_id)
+        data = serialize_job_event(job)
+        known_status = request.query_params.get('status', job.status)
+        
+        if pubsub is None or job.status in TERMINAL_STATUSES or known_status != job.status:
+            return Response(data, status=status.HTTP_200_OK)
+        
+        event = next_job_event(pubsub, timeout)
+        return Response(event or data, status=status.HTTP_200_OK)
+    finally:
+        if pubsub is not None:
+            pubsub.close()
+
+
+def _format_sse(event) -> str:
+    """Format a job event as a Server-Sent Events message."""
+    return f"event: status\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _job_event_stream(pubsub, initial_event):
+    """Yield the current job state, then every transition until it finishes."""
+    try:
+        yield 'retry: 2000\n\n'
+        yield _format_sse(initial_event)
+        if pubsub is None or initial_event['status'] in TERMINAL_STATUSES:
+            return
+        
+        events = iter_job_events(
+            pubsub,
+            heartbeat=settings.JOB_EVENTS_HEARTBEAT_INTERVAL,
+            max_duration=settings.JOB_EVENTS_STREAM_MAX_DURATION
+        )
+        for event in events:
+            yield _format_sse(event) if event else ': keep-alive\n\n'
+    finally:
+        if pubsub is not None:
+            pubsub.close()
+
+
+@require_GET
+def stream_job_events(request, event_id):
+    """
+    Stream job status transitions as Server-Sent Events.
+    
+    Sends the current state first, then one event per transition, and closes
+    the stream once the job is completed or failed.
+    """
+    pubsub = _subscribe_or_none(event_id)
+    try:
+        job = get_object_or_404(Job, id=event_id)
+    except Exception:
+        if pubsub is not None:
+            pubsub.close()
+        raise
+    
+    response = StreamingHttpResponse(
+        _job_event_stream(pubsub, serialize_job_event(job)),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def export_jobs(request):
+    """
+    Stream completed job results as NDJSON, see jobs.export.
+    
+    Accepts the created_after, created_before, updated_after and
+    updated_before watermarks, and gzip-encodes the stream for clients
+    that accept it.
+    """
+    query = JobExportQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    compress = accepts_gzip(request)
+    return export_response(stream_export(JobExport(**query.validated_data), compress), compress)
+
+
+@require_GET
+def metrics(request):
+    """Prometheus metrics for job processing, see jobs.metrics."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,209 @@
+"""
+Completion webhooks.
+
+A job created with a ``callback_url`` gets one delivery row when it reaches
+a terminal status. Rows are written where job events are published, so
+every path that finishes a job (workers, followers, provider batches and
+result cache hits) schedules its callback. A dedicated dispatcher process
+claims due deliveries in batches, POSTs them concurrently over one pooled
+HTTP client and writes the outcomes back in bulk, retrying failures with
+backoff. It never runs on the GPT workers, so slow receivers cannot hold
+up job processing.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .callback_urls import UnsafeCallbackURL, pin_callback_url
+from .metrics import WEBHOOK_ATTEMPTS
+from .models import Job, WebhookDelivery, WebhookDeliveryStatus
+from .serializers import JobSerializer
+from .status_cache import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Outcome of one attempt: the receiver's status code, or None and a transport error
+Outcome = Tuple[Optional[int], Optional[str]]
+
+
+def schedule_webhooks(jobs: Iterable[Job]) -> int:
+    """
+    Create the pending delivery of each terminal job with a callback URL.
+    
+    A job is only ever called back once, so publishing the same terminal
+    state again does not schedule a second delivery. Returns the number of
+    deliveries offered; no query is made when no job has a callback URL.
+    """
+    deliveries = [
+        WebhookDelivery(job=job, url=job.callback_url)
+        for job in jobs
+        if job.callback_url and job.status in TERMINAL_STATUSES
+    ]
+    if deliveries:
+        WebhookDelivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+    return len(deliveries)
+
+
+def webhook_backoff(attempts: int) -> float:
+    """Return the jittered delay after failed attempt number ``attempts`` (1-based)."""
+    ceiling = min(settings.WEBHOOK_BACKOFF_MAX, settings.WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def sign_payload(body: bytes) -> Optional[str]:
+    """Return the X-Webhook-Signature value of a body, if a signing secret is set."""
+    if not settings.WEBHOOK_SIGNING_SECRET:
+        return None
+    digest = hmac.new(settings.WEBHOOK_SIGNING_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return f'sha256={digest}'
+
+
+def render_payload(job: Job) -> bytes:
+    """Return the callback body: the job's status response."""
+    return json.dumps(JobSerializer(job).data, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def claim_due_deliveries(limit: int, concurrency: Optional[int] = None) -> List[Tuple[WebhookDelivery, bytes]]:
+    """
+    Claim up to ``limit`` due deliveries and render their payloads.
+    
+    Claimed rows are leased by pushing ``next_attempt_at`` past the time a
+    round can take, so a dispatcher that dies mid-round only delays them.
+    Rows locked by another dispatcher are skipped.
+    """
+    close_old_connections()
+    now = timezone.now()
+    rounds = -(-limit // (concurrency or settings.WEBHOOK_CONCURRENCY))
+    lease = timedelta(seconds=settings.WEBHOOK_TIMEOUT * (rounds + 1))
+    
+    with transaction.atomic():
+        deliveries = list(
+            WebhookDelivery.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('job__payload')
+            .filter(status=WebhookDeliveryStatus.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:limit]
+        )
+        WebhookDelivery.objects.filter(id__in=[delivery.id for delivery in deliveries]).update(
+            next_attempt_at=now + lease,
+            updated_at=now
+        )
+    return [(delivery, render_payload(delivery.job)) for delivery in deliveries]
+
+
+def record_outcomes(results: List[Tuple[WebhookDelivery, Outcome]]) -> None:
+    """Write the outcome of a round of attempts back in one bulk update."""
+    now = timezone.now()
+    for delivery, (status_code, error) in results:
+        delivery.attempts += 1
+        delivery.last_status_code = status_code
+        delivery.last_error = error
+        delivery.updated_at = now
+        if error is None:
+            delivery.status = WebhookDeliveryStatus.DELIVERED
+            delivery.delivered_at = now
+            outcome = 'delivered'
+        elif delivery.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            delivery.status = WebhookDeliveryStatus.FAILED
+            outcome = 'failed'
+            logger.error(f"Giving up on webhook of job {delivery.job_id} after {delivery.attempts} attempts: {error}")
+        else:
+            delivery.next_attempt_at = now + timedelta(seconds=webhook_backoff(delivery.attempts))
+            outcome = 'retry'
+        WEBHOOK_ATTEMPTS.labels(outcome).inc()
+    
+    WebhookDelivery.objects.bulk_update(
+        [delivery for delivery, _ in results],
+        ['status', 'attempts', 'next_attempt_at', 'last_status_code', 'last_error', 'delivered_at', 'updated_at'],
+        batch_size=500
+    )
+
+
+class WebhookDispatcher:
+    """Delivers due webhooks concurrently over a pooled keep-alive client."""
+    
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        client: Optional[httpx.AsyncClient] = None
+    ):
+        self.concurrency = concurrency or settings.WEBHOOK_CONCURRENCY
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.WEBHOOK_POLL_INTERVAL
+        self.client = client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency
+            ),
+            timeout=httpx.Timeout(settings.WEBHOOK_TIMEOUT)
+        )
+        self._slots = asyncio.Semaphore(self.concurrency)
+    
+    async def deliver(self, delivery: WebhookDelivery, body: bytes) -> Outcome:
+        """
+        POST one payload; any non-2xx answer counts as a failed attempt.
+        
+        The host is resolved and checked again for each attempt, and the
+        request goes to the checked address.
+        """
+        try:
+            url, pinned_headers, extensions = await pin_callback_url(delivery.url)
+        except UnsafeCallbackURL as e:
+            return None, str(e)
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Webhook-Event': f'job.{delivery.job.status}',
+            'X-Webhook-Attempt': str(delivery.attempts + 1),
+        }
+        signature = sign_payload(body)
+        if signature:
+            headers['X-Webhook-Signature'] = signature
+        headers.update(pinned_headers)
+        
+        async with self._slots:
+            try:
+                response = await self.client.post(url, content=body, headers=headers, extensions=extensions)
+            except httpx.HTTPError as e:
+                return None, f"{type(e).__name__}: {str(e)}"
+        if not response.is_success:
+            return response.status_code, f"HTTP {response.status_code}"
+        return response.status_code, None
+    
+    async def run_once(self) -> int:
+        """Claim one batch of due deliveries, attempt them all and record the outcomes."""
+        claimed = await sync_to_async(claim_due_deliveries)(self.batch_size, self.concurrency)
+        if not claimed:
+            return 0
+        outcomes = await asyncio.gather(*(self.deliver(delivery, body) for delivery, body in claimed))
+        await sync_to_async(record_outcomes)([
+            (delivery, outcome) for (delivery, _), outcome in zip(claimed, outcomes)
+        ])
+        return len(claimed)
+    
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Deliver webhooks until ``stop_event`` is set."""
+        logger.info(f"Webhook dispatcher started with concurrency {self.concurrency}")
+        try:
+            while not stop_event.is_set():
+                # A full batch suggests a backlog, so claim the next one straight away
+                if await self.run_once() < self.batch_size:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self.client.aclose()
+        logger.info("Webhook dispatcher stopped")